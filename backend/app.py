@@ -1,9 +1,34 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from flask_cors import CORS
 import os
 import json
-import glob
 import logging
+import time
+
+try:
+    from backend import config
+    from backend.block_dag import BlockDAG
+    from backend.column_store import NO_TIMESTAMP, STATUSES, ColumnStore
+    from backend.metrics import CONTENT_TYPE, INGEST_METRICS_FILE, REGISTRY, Counter, Gauge, Histogram
+    from backend.response_cache import ResponseCache
+    from backend.slot_encoding import JSON_MIMETYPE, dumps, negotiate, parse_fields, project, slot_payload
+    from backend.slot_index import SLOT_INDEX_CAPACITY, add_listener, get_index, start_watcher
+    from backend.slot_rollups import ROLLUP_DEFAULT_COUNT, ROLLUP_RETENTION, ROLLUP_TIERS, load_rollups, rollup_paths
+    from backend.slot_snapshot import SNAPSHOT_FILE, SnapshotReader
+    from backend.slot_stats import STATS_FILE
+    from backend.slot_stream import SlotBroadcaster, sse_frame
+except ImportError:  # Running as a script from inside the backend directory
+    import config
+    from block_dag import BlockDAG
+    from column_store import NO_TIMESTAMP, STATUSES, ColumnStore
+    from metrics import CONTENT_TYPE, INGEST_METRICS_FILE, REGISTRY, Counter, Gauge, Histogram
+    from response_cache import ResponseCache
+    from slot_encoding import JSON_MIMETYPE, dumps, negotiate, parse_fields, project, slot_payload
+    from slot_index import SLOT_INDEX_CAPACITY, add_listener, get_index, start_watcher
+    from slot_rollups import ROLLUP_DEFAULT_COUNT, ROLLUP_RETENTION, ROLLUP_TIERS, load_rollups, rollup_paths
+    from slot_snapshot import SNAPSHOT_FILE, SnapshotReader
+    from slot_stats import STATS_FILE
+    from slot_stream import SlotBroadcaster, sse_frame
 
 # Configure the static folder path to point to the frontend build directory
 static_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend/build')
@@ -12,28 +37,123 @@ app = Flask(__name__, static_folder=static_folder, static_url_path='')
 # Enable CORS for all routes and origins
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Configure logging; LOG_LEVEL=DEBUG turns on the per-request logs
+logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = app.logger
 
-NETWORKS = ["mainnet", "sepolia", "holesky"]
-# Use absolute path for DATA_DIR, with special handling for Heroku
-if os.environ.get('DYNO'):  # We're on Heroku
-    DATA_DIR = "/app/data"
-else:  # We're running locally
-    # Use absolute path to avoid nested directories
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    parent_dir = os.path.dirname(current_dir)
-    DATA_DIR = os.path.join(parent_dir, "data")
+REQUEST_SECONDS = Histogram("api_request_duration_seconds",
+                            "Time to handle an API request until the response starts, by route", ["endpoint"])
+REQUESTS = Counter("api_requests_total", "API requests, by route and status code", ["endpoint", "status"])
+RESPONSE_BYTES = Counter("api_response_bytes_total", "Bytes of response bodies sent, by route", ["endpoint"])
+INDEX_SLOTS = Gauge("slot_index_slots", "Slots held in memory by the slot index, by network", ["network"])
+INDEX_VERSION = Gauge("slot_index_version", "Version of the slot index, bumped on every change, by network", ["network"])
+
+# Networks and data directory are shared with the ingest, see config.py
+NETWORKS = config.NETWORKS
+DATA_DIR = config.get_data_dir()
 logger.info(f"Using data directory: {DATA_DIR}")
 DEFAULT_SLOT_COUNT = 20  # Increased from 10 to ensure we have enough data
+HISTORY_MAX_SLOTS = int(os.environ.get("HISTORY_MAX_SLOTS", 7200))  # widest range /api/history serves
+# Bytes a /api/slots/<network>/range response buffers before handing them to the server
+RANGE_BUFFER_BYTES = int(os.environ.get("RANGE_BUFFER_BYTES", 64 * 1024))
+# Distinct cursor responses kept per worker; pollers at the head all share one per projection
+CURSOR_CACHE_ENTRIES = int(os.environ.get("CURSOR_CACHE_ENTRIES", 256))
+
+# Serialized and precompressed slot responses, rebuilt only when a new slot lands
+slot_response_cache = ResponseCache()
+# Serialized and precompressed responses to version and since cursors, which change with every slot
+cursor_response_cache = ResponseCache(max_entries=CURSOR_CACHE_ENTRIES)
+# Latest-slots bodies published by the ingest, mapped by every worker
+snapshots = {network: SnapshotReader(os.path.join(DATA_DIR, network, SNAPSHOT_FILE)) for network in NETWORKS}
+# Push channels for /api/stream/<network>, one per requested field projection (None = all fields)
+broadcasters = {network: {None: SlotBroadcaster()} for network in NETWORKS}
+# Distinct projections streamed per network; each one is serialized separately for every update
+STREAM_PROJECTIONS = 8
+# Memory-mapped columnar history written by the ingest
+column_stores = {network: ColumnStore(os.path.join(DATA_DIR, network, "columns")) for network in NETWORKS}
+
+def publish_slots(index, changed):
+    """
+    Push every new or rewritten slot to the subscribers of its network
+    """
+    for slot in sorted(changed):
+        data = index.get(slot)
+        if data is not None:
+            for fields, broadcaster in list(broadcasters[index.network].items()):
+                broadcaster.publish("slot", project({"slot": slot, "data": data}, fields))
+
+# Fork view of every network, built from the roots of the indexed slots
+block_dags = {network: BlockDAG(network) for network in NETWORKS}
+
+def update_block_dag(index, changed):
+    """
+    Feed every new or rewritten slot into the block DAG of its network
+    """
+    dag = block_dags[index.network]
+    for slot in sorted(changed):
+        data = index.get(slot)
+        if data is not None:
+            dag.add_slot(slot, data)
+
+# Keep the newest slots of every network in memory so requests never hit the disk
+add_listener(publish_slots)
+add_listener(update_block_dag)
+start_watcher(DATA_DIR, NETWORKS)
+for network in NETWORKS:
+    index = get_index(network)
+    if index is not None:
+        update_block_dag(index, [entry["slot"] for entry in index.latest(SLOT_INDEX_CAPACITY)])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    """
+    Record the latency, status and body size of every request. Bodies that are
+    streamed have no length up front and count their bytes as they are sent.
+    """
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - g.request_started)
+    REQUESTS.labels(endpoint, str(response.status_code)).inc()
+    if response.content_length:
+        RESPONSE_BYTES.labels(endpoint).inc(response.content_length)
+    return response
+
+def send_cached(cached):
+    """
+    Send a CachedBody in the best encoding the client accepts, or an empty
+    304 response if the client already holds the current representation.
+    """
+    offered = [e for e in ('br', 'gzip') if e in cached.encodings]
+    encoding = request.accept_encodings.best_match(offered, default='identity')
+    body, etag = cached.representation(encoding)
+    return send_body(body, etag, encoding, cached.mimetype)
+
+def send_body(body, etag, encoding, mimetype=JSON_MIMETYPE):
+    """
+    Send a serialized body in the given content encoding, or an empty 304
+    response if the client already holds this representation.
+    """
+    if request.if_none_match.contains_raw(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.headers['ETag'] = etag
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Let browsers keep the body but revalidate it on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/')
 def serve():
     """
     Serve the frontend application
     """
-    logger.info("Serving index.html")
+    logger.debug("Serving index.html")
     return app.send_static_file('index.html')
 
 @app.route('/static/<path:path>')
@@ -41,178 +161,438 @@ def serve_static(path):
     """
     Serve static files
     """
-    logger.info(f"Serving static file: {path}")
+    logger.debug(f"Serving static file: {path}")
     return send_from_directory(os.path.join(static_folder, 'static'), path)
 
 @app.route('/api/slots/<network>', methods=['GET'])
 def get_latest_slots(network):
     """
-    Get the latest slots for the specified network
+    Get the latest slots for the specified network.
+    
+    With a `since` slot and/or `version` cursor, only the slots newer than `since`
+    or changed after `version` are returned, as {"version": ..., "slots": [...]}.
+    Clients pass the returned version back as the cursor of their next request.
+    
+    `fields` is an optional comma-separated list of the client fields to return
+    (e.g. status,seconds_in_slot). The Accept header selects the format: JSON,
+    columnar JSON (application/vnd.slots.columnar+json) or MessagePack
+    (application/msgpack).
     """
     # Get the number of slots to return from query parameter, default to DEFAULT_SLOT_COUNT
     count = request.args.get('count', default=DEFAULT_SLOT_COUNT, type=int)
+    since_slot = request.args.get('since', type=int)
+    since_version = request.args.get('version', type=int)
     
-    logger.info(f"[API] Received request for {count} slots in network: {network}")
+    logger.debug(f"[API] Received request for {count} slots in network: {network}")
     
     if network not in NETWORKS:
         logger.warning(f"[API] Invalid network requested: {network}")
         return jsonify({"error": f"Invalid network. Choose from {NETWORKS}"}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    mimetype = negotiate(request.accept_mimetypes)
     
-    # Get all JSON files in the network directory
-    network_dir = os.path.join(DATA_DIR, network)
-    logger.info(f"[API] Looking for data in directory: {network_dir}")
+    cursor = since_slot is not None or since_version is not None
+    snapshot = None
+    if mimetype == JSON_MIMETYPE:
+        # Served from the snapshot the ingest shares with every worker when it has these fields
+        if cursor:
+            snapshot = read_snapshot_changes(network, count, since_slot, since_version, fields)
+        else:
+            snapshot = read_snapshot(network, count, fields)
     
-    # Log the absolute path for debugging
-    abs_network_dir = os.path.abspath(network_dir)
-    logger.info(f"[API] Absolute path: {abs_network_dir}")
+    index = get_index(network)
+    if snapshot is not None:
+        response = send_body(*snapshot)
+    elif cursor:
+        if index is None:
+            payload = {"version": 0, "slots": slot_payload([], fields, mimetype)}
+            response = Response(dumps(payload, mimetype), mimetype=mimetype)
+        else:
+            response = send_cached(get_cached_changes(index, count, since_slot, since_version, fields, mimetype))
+    elif index is None:
+        response = Response(dumps(slot_payload([], fields, mimetype), mimetype), mimetype=mimetype)
+    else:
+        response = send_cached(get_cached_slots(index, count, fields, mimetype))
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    return response
+
+def read_snapshot(network, count, fields=None):
+    """
+    Read the latest `count` slots with only `fields` kept from the snapshot the
+    ingest shares with every worker, in the best encoding the client accepts,
+    or return None if there is no snapshot of those fields to serve.
+    """
+    accepted = sorted((e for e in ('br', 'gzip') if request.accept_encodings[e]),
+                      key=lambda e: -request.accept_encodings[e])
+    count = min(max(count, 0), SLOT_INDEX_CAPACITY)
+    snapshot = snapshots[network].read(count, accepted, fields)
+    if snapshot is None or snapshot[2] != 'identity' or not accepted:
+        return snapshot
+    # Counts the ingest does not precompress are compressed once per body by each worker
+    body, etag, _ = snapshot
+    cached = slot_response_cache.get(("snapshot", network, count, fields), etag, lambda: body, dumps=bytes)
+    encoding = next((e for e in accepted if e in cached.encodings), 'identity')
+    return (*cached.representation(encoding), encoding)
+
+def read_snapshot_changes(network, count, since_slot=None, since_version=None, fields=None):
+    """
+    Read the response to a `since` and/or `version` cursor from the snapshot
+    the ingest shares with every worker, as (body, etag, encoding) in the best
+    encoding the client accepts, or return None if there is no snapshot of
+    `fields` to serve. Each worker compresses a body once per snapshot generation.
+    """
+    count = min(max(count, 0), SLOT_INDEX_CAPACITY)
+    changes = snapshots[network].changes(count, since_slot, since_version, fields)
+    if changes is None:
+        return None
+    body, generation = changes
+    cached = cursor_response_cache.get(("snapshot", network, count, since_slot, since_version, fields),
+                                       generation, lambda: body, dumps=bytes)
+    offered = [e for e in ('br', 'gzip') if e in cached.encodings]
+    encoding = request.accept_encodings.best_match(offered, default='identity')
+    return (*cached.representation(encoding), encoding)
+
+def get_cached_changes(index, count, since_slot=None, since_version=None, fields=None, mimetype=JSON_MIMETYPE):
+    """
+    Get the serialized response body to a `since` and/or `version` cursor:
+    {"version": ..., "slots": [...]} with the changed slots among the latest
+    `count`, projected to `fields` and serialized as `mimetype`
+    """
+    count = min(max(count, 0), SLOT_INDEX_CAPACITY)
+    version = index.version
+
+    def build():
+        # Read the revision first so a concurrent refresh can only make the
+        # client see a change twice, never miss one
+        revision = index.revision
+        slots_data = index.changes(count, since_slot, since_version)
+        logger.debug(f"[API] Returning {len(slots_data)} changed slots for network {index.network}")
+        return {"version": revision, "slots": slot_payload(slots_data, fields, mimetype)}
+    return cursor_response_cache.get((index.network, count, since_slot, since_version, fields, mimetype), version,
+                                     build, mimetype, lambda payload: dumps(payload, mimetype))
+
+def get_cached_slots(index, count, fields=None, mimetype=JSON_MIMETYPE):
+    """
+    Get the serialized response body for the latest `count` slots of an index,
+    projected to `fields` and serialized as `mimetype`
+    """
+    count = min(max(count, 0), SLOT_INDEX_CAPACITY)
+    version = index.version
+    if fields is None and mimetype == JSON_MIMETYPE:
+        return slot_response_cache.get((index.network, count), version, lambda: index.latest(count))
+    return slot_response_cache.get((index.network, count, fields, mimetype), version,
+                                   lambda: slot_payload(index.latest(count), fields, mimetype),
+                                   mimetype, lambda payload: dumps(payload, mimetype))
+
+@app.route('/api/slots/<network>/range', methods=['GET'])
+def get_slot_range(network):
+    """
+    Stream the stored slots in [from, to] as newline-delimited JSON, one
+    {"slot": ..., "data": {...}} object per line in ascending slot order.
     
-    # Check if the directory exists
-    if not os.path.exists(network_dir):
-        logger.warning(f"[API] No data directory found for network: {network}")
-        return jsonify([]), 200
+    `clients` is an optional comma-separated list of client names (matched
+    case-insensitively); other clients are left out of each slot and slots
+    without any of them are skipped. `fields` restricts the client fields as
+    for /api/slots/<network>. Slots are read from the segment store
+    one at a time, so memory per request stays within RANGE_BUFFER_BYTES
+    plus a single slot however large the range is.
+    """
+    start = request.args.get('from', type=int)
+    end = request.args.get('to', type=int)
+    clients = request.args.get('clients')
     
-    # List all files in the directory for debugging
+    if network not in NETWORKS:
+        logger.warning(f"[API] Invalid network requested: {network}")
+        return jsonify({"error": f"Invalid network. Choose from {NETWORKS}"}), 400
+    if start is None or end is None or start < 0 or end < start:
+        return jsonify({"error": "Invalid range, from and to are required and from must not exceed to"}), 400
     try:
-        all_files = os.listdir(network_dir)
-        logger.info(f"[API] Directory contains {len(all_files)} files")
-        logger.info(f"[API] First 5 files: {all_files[:5] if len(all_files) >= 5 else all_files}")
-    except Exception as e:
-        logger.error(f"[API] Error listing directory: {str(e)}")
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if clients is not None:
+        clients = {client.lower() for client in clients.split(',') if client}
     
-    # Get all JSON files
-    json_files = glob.glob(os.path.join(network_dir, "*.json"))
+    index = get_index(network)
+    if index is None:
+        return Response(b"", mimetype='application/x-ndjson')
+    store = index.store
+    logger.debug(f"[API] Streaming slots {start}-{end} of {network}, clients: {clients}")
     
-    if not json_files:
-        logger.warning(f"[API] No slot files found for network: {network}")
-        return jsonify([]), 200
+    sent_bytes = RESPONSE_BYTES.labels(request.url_rule.rule)
+    
+    def generate():
+        buffer = []
+        size = 0
+        for slot, body in store.iter_range(start, end):
+            if clients is not None or fields is not None:
+                data = {client: value for client, value in json.loads(body).items()
+                        if clients is None or client.lower() in clients}
+                if not data:
+                    continue
+                data = project({"slot": slot, "data": data}, fields)["data"]
+                body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+            line = b'{"slot":%d,"data":' % slot + body + b'}\n'
+            buffer.append(line)
+            size += len(line)
+            if size >= RANGE_BUFFER_BYTES:
+                sent_bytes.inc(size)
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            sent_bytes.inc(size)
+            yield b"".join(buffer)
     
-    logger.info(f"[API] Found {len(json_files)} slot files for network {network}")
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/stream/<network>', methods=['GET'])
+def stream_slots(network):
+    """
+    Stream slots for the specified network as Server-Sent Events: a 'snapshot'
+    event with the latest slots, then a 'slot' event for every new or updated slot.
+    `fields` restricts the client fields of both, as for /api/slots/<network>.
+    """
+    count = request.args.get('count', default=DEFAULT_SLOT_COUNT, type=int)
     
+    if network not in NETWORKS:
+        logger.warning(f"[API] Invalid network requested: {network}")
+        return jsonify({"error": f"Invalid network. Choose from {NETWORKS}"}), 400
     try:
-        # Sort files by slot number (descending) to get the highest slots first
-        json_files.sort(key=lambda x: int(os.path.basename(x).split('.')[0]), reverse=True)
-        highest_slot = os.path.basename(json_files[0]).split('.')[0] if json_files else 'N/A'
-        logger.info(f"[API] Sorted files, highest slot: {highest_slot}")
-        
-        # Log the top 5 highest slots for debugging
-        top_slots = [os.path.basename(f).split('.')[0] for f in json_files[:5]] if len(json_files) >= 5 else [os.path.basename(f).split('.')[0] for f in json_files]
-        logger.info(f"[API] Top 5 highest slots: {top_slots}")
-        
-        # Take the latest 'count' files, but don't try to take more than exist
-        latest_files = json_files[:min(count, len(json_files))]
-        logger.info(f"[API] Selected {len(latest_files)} files out of {len(json_files)} available")
-        
-        # Log the selected file names for debugging
-        logger.info(f"[API] Selected files: {[os.path.basename(f) for f in latest_files]}")
-        
-        # Load the data from each file
-        slots_data = []
-        for file_path in latest_files:
-            try:
-                slot_number = int(os.path.basename(file_path).split('.')[0])
-                logger.info(f"[API] Loading slot {slot_number} from {file_path}")
-                
-                # Read the file content as a string first
-                with open(file_path, 'r') as f:
-                    file_content = f.read()
-                
-                # Replace NaN values with null (which is valid JSON)
-                file_content = file_content.replace('NaN', 'null')
-                
-                # Parse the modified JSON
-                slot_data = json.loads(file_content)
-                
-                # Check if the slot data is valid
-                if not slot_data:
-                    logger.warning(f"[API] Empty data in file {file_path}")
-                    continue
-                    
-                # Log the clients found in this slot
-                logger.info(f"[API] Slot {slot_number} has data for clients: {list(slot_data.keys())}")
-                
-                # Add the slot number to the data
-                slots_data.append({
-                    "slot": slot_number,
-                    "data": slot_data
-                })
-            except Exception as e:
-                logger.error(f"[API] Error loading file {file_path}: {str(e)}")
-        
-        # Double-check the slots are sorted by slot number (descending)
-        slots_data.sort(key=lambda x: x["slot"], reverse=True)
-        
-        if slots_data:
-            slot_numbers = [slot["slot"] for slot in slots_data]
-            logger.info(f"[API] Returning {len(slots_data)} slots for network {network}")
-            logger.info(f"[API] Slot numbers: {slot_numbers}")
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    broadcaster = broadcasters[network].get(fields)
+    if broadcaster is None:
+        if len(broadcasters[network]) > STREAM_PROJECTIONS:
+            return jsonify({"error": "Too many distinct fields streamed for this network"}), 400
+        broadcaster = broadcasters[network].setdefault(fields, SlotBroadcaster())
+    index = get_index(network)
+    
+    def snapshot():
+        shared = snapshots[network].read(min(max(count, 0), SLOT_INDEX_CAPACITY), fields=fields)
+        if shared is not None:
+            body = shared[0]
         else:
-            logger.warning(f"[API] No valid slot data found for network {network}")
-        
-        return jsonify(slots_data)
-    except Exception as e:
-        logger.error(f"[API] Unexpected error processing slots for {network}: {str(e)}")
-        return jsonify([]), 200
+            body = get_cached_slots(index, count, fields).body if index is not None else b"[]"
+        return sse_frame("snapshot", body)
+    
+    response = Response(broadcaster.subscribe(snapshot), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Ask reverse proxies not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/history/<network>', methods=['GET'])
+def get_history(network):
+    """
+    Get the columnar history of the slots in [from, to] (default: the latest
+    DEFAULT_SLOT_COUNT slots), optionally restricted to a comma-separated list
+    of clients. Rows are returned as parallel arrays ordered by slot and client;
+    client and status are codes into "clients" and "statuses" (1-based), hash
+    and parent_hash are indexes into "roots".
+    """
+    if network not in NETWORKS:
+        logger.warning(f"[API] Invalid network requested: {network}")
+        return jsonify({"error": f"Invalid network. Choose from {NETWORKS}"}), 400
+    
+    store = column_stores[network]
+    end = request.args.get('to', type=int)
+    if end is None:
+        index = get_index(network)
+        latest = index.latest(1) if index is not None else []
+        if not latest:
+            # Nothing stored yet: an empty history rather than an error
+            return jsonify(history_payload(store, None, None, store.read(0, -1)))
+        end = latest[0]["slot"]
+    # The default range stops at slot 0 for histories shorter than DEFAULT_SLOT_COUNT
+    start = request.args.get('from', default=max(0, end - DEFAULT_SLOT_COUNT + 1), type=int)
+    if start < 0 or end < start or end - start + 1 > HISTORY_MAX_SLOTS:
+        return jsonify({"error": f"Invalid range, from and to must span 1 to {HISTORY_MAX_SLOTS} slots"}), 400
+    clients = request.args.get('clients')
+    if clients is not None:
+        clients = [client for client in clients.split(',') if client]
+    
+    rows = store.read(start, end, clients)
+    logger.debug(f"[API] Returning {len(rows['slot'])} history rows for {network} slots {start}-{end}")
+    return jsonify(history_payload(store, start, end, rows))
+
+def history_payload(store, start, end, rows):
+    """
+    Build the /api/history response of `rows` as returned by ColumnStore.read
+    """
+    return {
+        "from": start,
+        "to": end,
+        "clients": store.clients,
+        "statuses": list(STATUSES),
+        "slot": rows["slot"].tolist(),
+        "client": rows["client"].tolist(),
+        "status": rows["status"].tolist(),
+        "ms_in_slot": [None if ms == NO_TIMESTAMP else ms for ms in rows["ms_in_slot"].tolist()],
+        "hash": rows["hash"].tolist(),
+        "parent_hash": rows["parent_hash"].tolist(),
+        "roots": rows["roots"],
+    }
+
+@app.route('/api/stats/<network>', methods=['GET'])
+def get_stats(network):
+    """
+    Get the rolling per-client statistics of a network: seconds_in_slot
+    quantiles and missed/reorged counts for each window, as published by the
+    ingest. The file is only read again when the ingest replaces it.
+    """
+    if network not in NETWORKS:
+        logger.warning(f"[API] Invalid network requested: {network}")
+        return jsonify({"error": f"Invalid network. Choose from {NETWORKS}"}), 400
+    
+    stats_path = os.path.join(DATA_DIR, network, STATS_FILE)
+    try:
+        version = os.stat(stats_path).st_mtime_ns
+    except FileNotFoundError:
+        return jsonify({"error": f"No statistics available yet for {network}"}), 404
+    
+    def load_stats():
+        with open(stats_path, 'r') as f:
+            return json.load(f)
+    
+    return send_cached(slot_response_cache.get((network, "stats"), version, load_stats))
+
+@app.route('/api/rollups/<network>', methods=['GET'])
+def get_rollups(network):
+    """
+    Get the newest `count` buckets of a rollup tier ('epoch' or 'hour'), oldest
+    first: per-client produced, missed and reorged counts and seconds_in_slot
+    quantiles, as published by the ingest. Buckets whose slots can still change
+    are marked "final": false.
+    """
+    tier = request.args.get('tier', default='epoch')
+    
+    if network not in NETWORKS:
+        logger.warning(f"[API] Invalid network requested: {network}")
+        return jsonify({"error": f"Invalid network. Choose from {NETWORKS}"}), 400
+    if tier not in ROLLUP_TIERS:
+        return jsonify({"error": f"Invalid tier. Choose from {list(ROLLUP_TIERS)}"}), 400
+    
+    count = request.args.get('count', default=ROLLUP_DEFAULT_COUNT[tier], type=int)
+    count = min(max(count, 0), ROLLUP_RETENTION[tier])
+    network_dir = os.path.join(DATA_DIR, network)
+    version = []
+    for path in rollup_paths(network_dir, tier):
+        try:
+            version.append(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            version.append(None)
+    if version == [None, None]:
+        return jsonify({"error": f"No rollups available yet for {network}"}), 404
+    
+    return send_cached(slot_response_cache.get((network, "rollups", tier, count), tuple(version),
+                                               lambda: load_rollups(network_dir, tier, count)))
+
+@app.route('/api/forks/<network>', methods=['GET'])
+def get_forks(network):
+    """
+    Get the fork view of a network: the head, the newest `count` slots on which
+    clients saw different blocks and the newest `count` orphaned blocks
+    """
+    count = request.args.get('count', default=DEFAULT_SLOT_COUNT, type=int)
+    
+    if network not in NETWORKS:
+        logger.warning(f"[API] Invalid network requested: {network}")
+        return jsonify({"error": f"Invalid network. Choose from {NETWORKS}"}), 400
+    
+    dag = block_dags[network]
+    count = min(max(count, 0), SLOT_INDEX_CAPACITY)
+    version = dag.version
+    return send_cached(slot_response_cache.get((network, "forks", count), version, lambda: dag.summary(count)))
 
 @app.route('/api/networks', methods=['GET'])
 def get_networks():
     """
-    Get a list of available networks
+    Get a list of available networks: those the ingest has published data for.
+    
+    With `details=1`, the manifest of each available network is returned
+    instead (clients with the newest slot each saw a block in, stored slot
+    range, row counts of the latest run and update time), as {"networks": [...]}.
+    Both are served from the manifests the slot index keeps in memory.
     """
-    logger.info("Received request for available networks")
+    logger.debug("Received request for available networks")
     
     available_networks = []
+    manifests = []
     for network in NETWORKS:
-        network_dir = os.path.join(DATA_DIR, network)
-        if os.path.exists(network_dir) and os.listdir(network_dir):
-            available_networks.append(network)
+        index = get_index(network)
+        if index is None:
+            continue
+        manifest = index.manifest
+        if manifest is None and len(index) == 0:
+            continue
+        available_networks.append(network)
+        manifests.append(manifest if manifest is not None else {"network": network})
     
-    logger.info(f"Available networks: {available_networks}")
+    logger.debug(f"Available networks: {available_networks}")
+    if request.args.get('details', type=int):
+        return jsonify({"networks": manifests})
     return jsonify(available_networks)
 
 @app.route('/api/clients', methods=['GET'])
 def get_clients():
     """
-    Get a list of all clients across all networks
+    Get a list of all clients ever seen across all networks
     """
-    logger.info("Received request for available clients")
+    logger.debug("Received request for available clients")
     
     clients = set()
     
     for network in NETWORKS:
-        network_dir = os.path.join(DATA_DIR, network)
-        if not os.path.exists(network_dir):
+        index = get_index(network)
+        if index is None:
             continue
         
-        # Get the first JSON file to extract client names
-        json_files = glob.glob(os.path.join(network_dir, "*.json"))
-        if json_files:
-            try:
-                # Read the file content as a string first
-                with open(json_files[0], 'r') as f:
-                    file_content = f.read()
-                
-                # Replace NaN values with null (which is valid JSON)
-                file_content = file_content.replace('NaN', 'null')
-                
-                # Parse the modified JSON
-                slot_data = json.loads(file_content)
-                
-                for client in slot_data.keys():
-                    clients.add(client)
-            except Exception as e:
-                logger.error(f"Error loading file {json_files[0]}: {str(e)}")
-    
-    client_list = list(clients)
-    logger.info(f"Available clients: {client_list}")
+        if index.manifest is not None:
+            clients.update(index.manifest.get("clients", ()))
+        else:
+            # No manifest published yet, take the client names from the newest slot
+            latest = index.latest(1)
+            if latest:
+                clients.update(latest[0]["data"].keys())
+    
+    client_list = sorted(clients)
+    logger.debug(f"Available clients: {client_list}")
     return jsonify(client_list)
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Expose the API metrics in the Prometheus text format, followed by the
+    ingest metrics the scheduler publishes next to the slot data
+    """
+    for network in NETWORKS:
+        index = get_index(network)
+        if index is not None:
+            INDEX_SLOTS.labels(network).set(len(index))
+            INDEX_VERSION.labels(network).set(index.version)
+    body = REGISTRY.render()
+    try:
+        with open(os.path.join(DATA_DIR, INGEST_METRICS_FILE), 'r') as f:
+            body += f.read()
+    except FileNotFoundError:
+        pass
+    return Response(body, content_type=CONTENT_TYPE)
+
 # Catch-all route to serve the React app for any other routes
 @app.route('/<path:path>')
 def catch_all(path):
     """
     Catch-all route to serve the React app
     """
-    logger.info(f"Catch-all route: {path}")
+    logger.debug(f"Catch-all route: {path}")
     return app.send_static_file('index.html')
 
 if __name__ == '__main__':
@@ -0,0 +1,358 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+try:
+    from backend import config, xatu_data_prep
+    from backend.column_store import COLUMN_RETENTION_SLOTS
+    from backend.manifest import MANIFEST_FILE, load_manifest, update_manifest
+    from backend.slot_files import write_file_atomic, writer_lock
+    from backend.slot_rollups import SlotRollups
+    from backend.slot_stats import STATS_WINDOWS
+except ImportError:  # Running as a script from inside the backend directory
+    import config
+    import xatu_data_prep
+    from column_store import COLUMN_RETENTION_SLOTS
+    from manifest import MANIFEST_FILE, load_manifest, update_manifest
+    from slot_files import write_file_atomic, writer_lock
+    from slot_rollups import SlotRollups
+    from slot_stats import STATS_WINDOWS
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_FILE = "backfill.json"
+# Slots queried per chunk (an hour) and chunks queried at once
+BACKFILL_CHUNK_SLOTS = int(os.environ.get("BACKFILL_CHUNK_SLOTS", 300))
+BACKFILL_PARALLEL = int(os.environ.get("BACKFILL_PARALLEL", 4))
+# Slots queried on each side of a chunk, so gaps and reorgs at its edges are
+# judged from the same rows as the slots in its middle
+BACKFILL_MARGIN_SLOTS = 32
+# Attempts per chunk before it is left for the next run
+BACKFILL_ATTEMPTS = 3
+
+
+def chunk_ranges(first_slot, last_slot, chunk_slots):
+    """
+    Split the slots [first_slot, last_slot] into (first, last) chunks of
+    `chunk_slots` slots, newest first, so an interrupted backfill has filled
+    the most recent history.
+    """
+    return [(start, min(start + chunk_slots - 1, last_slot))
+            for start in range(first_slot, last_slot + 1, chunk_slots)][::-1]
+
+
+def slot_at(timestamp):
+    """
+    Return the slot running at `timestamp` (anything pd.Timestamp accepts, UTC).
+    """
+    ms = pd.Timestamp(timestamp).value // 10 ** 6
+    return max((ms - xatu_data_prep.SLOT_0_TIMESTAMP_MS) // xatu_data_prep.SLOT_DURATION_MS, 0)
+
+
+class Checkpoint:
+    """
+    Progress of the backfill of one network: the chunks of a slot range that
+    were written, persisted next to the slot data after every chunk so an
+    interrupted backfill resumes without fetching them again. A checkpoint of
+    another range or chunk size belongs to another backfill and is replaced.
+    """
+
+    def __init__(self, path, network, first_slot, last_slot, chunk_slots):
+        self.path = path
+        self.network = network
+        self.first_slot = first_slot
+        self.last_slot = last_slot
+        self.chunk_slots = chunk_slots
+        self.completed = set()  # first slot of every written chunk
+        self.slots_written = 0
+
+    @classmethod
+    def load(cls, path, network, first_slot, last_slot, chunk_slots):
+        """
+        Load the progress of the backfill of [first_slot, last_slot] from
+        `path`, or start it afresh.
+        """
+        checkpoint = cls(path, network, first_slot, last_slot, chunk_slots)
+        try:
+            with open(path, 'r') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return checkpoint
+        except (OSError, ValueError) as e:
+            logger.error(f"[BACKFILL] Error reading {path}, starting over: {e}")
+            return checkpoint
+        if (saved.get("first_slot"), saved.get("last_slot"), saved.get("chunk_slots")) != \
+                (first_slot, last_slot, chunk_slots):
+            logger.info(f"[BACKFILL] {path} is for slots {saved.get('first_slot')}-{saved.get('last_slot')} "
+                        f"in chunks of {saved.get('chunk_slots')}; starting over")
+            return checkpoint
+        checkpoint.completed = set(saved.get("completed", []))
+        checkpoint.slots_written = saved.get("slots_written", 0)
+        return checkpoint
+
+    def complete(self, chunk_start, slots_written):
+        """
+        Record a written chunk and save the checkpoint.
+        """
+        self.completed.add(chunk_start)
+        self.slots_written += slots_written
+        write_file_atomic(self.path, json.dumps({
+            "network": self.network,
+            "first_slot": self.first_slot,
+            "last_slot": self.last_slot,
+            "chunk_slots": self.chunk_slots,
+            "completed": sorted(self.completed),
+            "slots_written": self.slots_written,
+            "updated_at": int(time.time() * 1000),
+        }).encode('utf-8'))
+
+
+def fetch_chunk(xatu, network, first_slot, last_slot, margin=BACKFILL_MARGIN_SLOTS):
+    """
+    Query the slots [first_slot, last_slot] of a network and run them through
+    the gap-filling, reorg and timing steps of the ingest.
+
+    Returns:
+        pd.DataFrame: Rows of the chunk with the columns produced by the
+                      pipeline, empty if xatu holds no blocks for it.
+    """
+    bounds = {"first_slot": max(first_slot - margin, 0), "last_slot": last_slot + margin}
+    reorgs = xatu_data_prep.reorg_table(xatu_data_prep.fetch_table(xatu, "reorgs", network, **bounds))
+    df = xatu_data_prep.fetch_table(xatu, "block_events", network, **bounds).drop(columns=['updated_date_time'])
+    info = xatu_data_prep.fetch_table(xatu, "beacon_blocks", network, **bounds).drop(columns=['updated_date_time'])
+    if len(df) == 0:
+        return df
+    df["status"] = "produced"
+    df = xatu_data_prep.fill_missing_slots(df)
+    df = xatu_data_prep.update_status(df, reorgs)
+    df = df.sort_values(by=['network', 'client', 'slot']).reset_index(drop=True)
+    df = xatu_data_prep.add_roots_and_timings(df, info)
+    return df[(df['slot'] >= first_slot) & (df['slot'] <= last_slot)]
+
+
+def fetch_with_retries(xatu, network, first_slot, last_slot, attempts=BACKFILL_ATTEMPTS):
+    """
+    Run `fetch_chunk`, retrying with a growing pause when a query fails.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return fetch_chunk(xatu, network, first_slot, last_slot)
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            logger.warning(f"[BACKFILL] Chunk {first_slot}-{last_slot} of {network} failed "
+                           f"(attempt {attempt} of {attempts}): {e}")
+            time.sleep(2 ** attempt)
+
+
+def write_chunk(network, first_slot, last_slot, df, overwrite=False):
+    """
+    Write the rows of one chunk to the segment store and the column history
+    of a network in one batch each. Unless `overwrite` is set, only slots a
+    store does not hold yet are written to it, so the backfill fills gaps
+    and leaves what the ingest wrote alone.
+
+    Returns:
+        int: Number of slots written to the segment store.
+    """
+    network_dir = os.path.join(xatu_data_prep.get_data_dir(), network)
+    with writer_lock(network_dir):
+        store = xatu_data_prep.get_segment_store(network_dir)
+        store.refresh()  # pick up what the scheduler wrote since the last chunk
+        columns = xatu_data_prep.get_column_store(network)
+        slots = df['slot']
+        if overwrite:
+            segment_df, column_df = df, df
+        else:
+            segment_df = df[~slots.isin(store.slots_between(first_slot, last_slot))]
+            column_df = df[~slots.isin(np.unique(columns.read(first_slot, last_slot)['slot']))]
+        # Slots older than the retention window of the segment store would be deleted right away
+        newest = max(store.newest() or last_slot, last_slot)
+        segment_df = segment_df[segment_df['slot'] > newest - store.retention_slots]
+
+        written = 0
+        if len(segment_df) > 0:
+            written = xatu_data_prep.save_data_to_files(xatu_data_prep.serialize_slots(segment_df), network)
+        if len(column_df) > 0:
+            rows = xatu_data_prep.column_rows(column_df)
+            xatu_data_prep.save_columns(rows, network)
+            # The scheduler may have published a manifest since, so start from the one on disk
+            manifest = update_manifest(load_manifest(network_dir)[0], network, store,
+                                       rows['client'], rows['status'], rows['slot'].tolist())
+            write_file_atomic(os.path.join(network_dir, MANIFEST_FILE), xatu_data_prep.dumps(manifest))
+    logger.info(f"[BACKFILL] Wrote slots {first_slot}-{last_slot} of {network}: "
+                f"{written} slots, {len(column_df)} history rows")
+    return written
+
+
+def finish(network, first_slot, last_slot, wrote_slots):
+    """
+    Bring the derived files of a network up to date with the backfilled
+    slots: the finalized rollups over them, the rolling statistics if they
+    reach into their windows and, if slots were written to the segment store,
+    the shared snapshot of the newest slots. The scheduler rebuilds its
+    statistics from the column history once it sees stats.json republished.
+    """
+    network_dir = os.path.join(xatu_data_prep.get_data_dir(), network)
+    with writer_lock(network_dir):
+        store = xatu_data_prep.get_segment_store(network_dir)
+        store.refresh()
+        columns = xatu_data_prep.get_column_store(network)
+        newest = max(store.newest() or last_slot, last_slot)
+        rollups = SlotRollups(network, network_dir)
+        rollups.resummarize(columns, first_slot, last_slot)
+        rollups.update(columns, newest)
+        if last_slot > newest - max(STATS_WINDOWS.values()):
+            xatu_data_prep.publish_stats(xatu_data_prep.rebuild_stats(network, newest), network)
+        if wrote_slots:
+            xatu_data_prep.save_snapshot(network)
+
+
+def backfill(create_source, networks, first_slot, last_slot, chunk_slots=BACKFILL_CHUNK_SLOTS,
+             parallel=BACKFILL_PARALLEL, overwrite=False, restart=False):
+    """
+    Backfill the slots [first_slot, last_slot] of `networks` from xatu.
+
+    The range is split into chunks of `chunk_slots` slots that are queried
+    `parallel` at a time, each through the same gap-filling and reorg steps as
+    the ingest; the results are written by this thread alone, one chunk per
+    batch, and checkpointed per network. Chunks completed by an earlier,
+    interrupted backfill of the same range are skipped unless `restart` is set.
+
+    Slots the column history would expire as soon as they are written (older
+    than COLUMN_RETENTION_SLOTS before `last_slot`) are not backfilled. Of the
+    rest, the segment store only takes the ones within its own retention; the
+    older ones reach the API through /api/history and the rollups.
+
+    Parameters:
+        create_source (callable): Returns a new SlotSource, called once by
+                                  every query thread so no client is shared
+                                  between threads. See xatu_source.py.
+        networks (list): Networks to backfill.
+        first_slot, last_slot (int): Slot range, inclusive.
+        chunk_slots (int): Slots per chunk.
+        parallel (int): Chunks queried at once.
+        overwrite (bool): Rewrite slots the stores already hold.
+        restart (bool): Ignore the checkpoints of an earlier backfill.
+
+    Returns:
+        dict: { network: { 'first_slot', 'chunks', 'resumed', 'failed', 'slots_written' } }
+    """
+    oldest = max(last_slot - COLUMN_RETENTION_SLOTS + 1, 0)
+    if first_slot < oldest:
+        logger.warning(f"[BACKFILL] Slots before {oldest} are older than the column history keeps "
+                       f"(COLUMN_RETENTION_SLOTS); backfilling slots {oldest}-{last_slot} only")
+        first_slot = oldest
+    checkpoints = {}
+    results = {}
+    pending = []
+    for network in networks:
+        path = os.path.join(xatu_data_prep.get_data_dir(), network, BACKFILL_FILE)
+        checkpoint = Checkpoint(path, network, first_slot, last_slot, chunk_slots) if restart else \
+            Checkpoint.load(path, network, first_slot, last_slot, chunk_slots)
+        checkpoints[network] = checkpoint
+        chunks = chunk_ranges(first_slot, last_slot, chunk_slots)
+        remaining = [(network, start, end) for start, end in chunks if start not in checkpoint.completed]
+        results[network] = {"first_slot": first_slot, "chunks": len(chunks), "resumed": len(chunks) - len(remaining), "failed": 0,
+                            "slots_written": 0}
+        pending.extend(remaining)
+        logger.info(f"[BACKFILL] {network}: {len(remaining)} of {len(chunks)} chunks of slots "
+                    f"{first_slot}-{last_slot} to fetch")
+    # Newest chunks of every network first
+    pending.sort(key=lambda chunk: -chunk[1])
+
+    # Clients are not safe to share between threads, so each query thread opens its own
+    local = threading.local()
+
+    def open_source():
+        local.source = create_source()
+
+    def fetch(network, start, end):
+        return fetch_with_retries(local.source, network, start, end)
+
+    queue = iter(pending)
+    running = {}
+    with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="backfill",
+                            initializer=open_source) as pool:
+        def submit():
+            chunk = next(queue, None)
+            if chunk is not None:
+                running[pool.submit(fetch, *chunk)] = chunk
+
+        # Keep a few results ready for the writer but never the whole range in memory
+        for _ in range(2 * parallel):
+            submit()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                network, start, end = running.pop(future)
+                try:
+                    df = future.result()
+                except Exception as e:
+                    logger.error(f"[BACKFILL] Giving up on slots {start}-{end} of {network} for this run: {e}")
+                    results[network]["failed"] += 1
+                else:
+                    if len(df) == 0:
+                        logger.warning(f"[BACKFILL] xatu holds no blocks of {network} in slots {start}-{end}")
+                    written = write_chunk(network, start, end, df, overwrite) if len(df) > 0 else 0
+                    checkpoints[network].complete(start, written)
+                    results[network]["slots_written"] += written
+                submit()
+
+    for network in networks:
+        finish(network, first_slot, last_slot, results[network]["slots_written"] > 0)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill a slot or time range of history from xatu.")
+    parser.add_argument("--networks", default=",".join(xatu_data_prep.NETWORKS), help="comma-separated networks")
+    start = parser.add_mutually_exclusive_group(required=True)
+    start.add_argument("--from-slot", type=int, help="first slot to backfill")
+    start.add_argument("--since", help="backfill from this UTC time, e.g. 2024-05-01T00:00")
+    end = parser.add_mutually_exclusive_group()
+    end.add_argument("--to-slot", type=int, help="last slot to backfill (default: the current slot)")
+    end.add_argument("--until", help="backfill up to this UTC time")
+    parser.add_argument("--chunk-slots", type=int, default=BACKFILL_CHUNK_SLOTS, help="slots per query")
+    parser.add_argument("--parallel", type=int, default=BACKFILL_PARALLEL, help="chunks queried at once")
+    parser.add_argument("--overwrite", action="store_true", help="rewrite slots that are already stored")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an earlier run")
+    args = parser.parse_args()
+
+    networks = [network.strip().lower() for network in args.networks.split(",") if network.strip()]
+    for network in networks:
+        # Names become directory names and query literals, so only configured ones are accepted
+        if not config.NETWORK_NAME.match(network):
+            parser.error(f"invalid network name: {network!r}")
+        if network not in xatu_data_prep.NETWORKS:
+            parser.error(f"unknown network {network!r}; configured networks: {','.join(xatu_data_prep.NETWORKS)}")
+    first_slot = args.from_slot if args.from_slot is not None else slot_at(args.since)
+    if args.to_slot is not None:
+        last_slot = args.to_slot
+    else:
+        last_slot = slot_at(args.until if args.until else pd.Timestamp.now(tz="UTC").tz_localize(None))
+    if last_slot < first_slot:
+        parser.error(f"the range ends (slot {last_slot}) before it starts (slot {first_slot})")
+
+    started = time.perf_counter()
+    results = backfill(xatu_data_prep.create_client, networks, first_slot, last_slot,
+                       args.chunk_slots, max(args.parallel, 1), args.overwrite, args.restart)
+    print(json.dumps({
+        "first_slot": first_slot,
+        "last_slot": last_slot,
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "networks": results,
+    }, indent=2))
+    if any(result["failed"] for result in results.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+Benchmarks of the API and ingest hot paths, compared against tracked baselines.
+
+    python -m backend.benchmark                 # run and compare, exit 1 on a regression
+    python -m backend.benchmark --update        # record the results as the new baselines
+    python -m backend.benchmark --sizes 100,1000000 --only api.
+
+Each benchmark reports the fastest wall time of `--repeat` runs and the peak
+traced memory of one extra run. Times are also recorded relative to a fixed
+calibration workload timed in the same session, and regressions are judged
+on those ratios, so baselines recorded on one machine can be checked on
+another. The absolute seconds in the baselines only hold for the machine
+described under "machine". A benchmark regresses when it is slower or uses
+more memory than its baseline by more than the tolerance; differences below
+a small absolute floor are treated as noise.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+try:
+    from backend import config, xatu_data_prep
+    from backend.segment_store import SEGMENT_SLOTS, SegmentStore
+    from backend.slot_index import SlotIndex
+    from backend.xatu_source import SyntheticSource, synthetic_clients
+except ImportError:  # Running as a script from inside the backend directory
+    import config
+    import xatu_data_prep
+    from segment_store import SEGMENT_SLOTS, SegmentStore
+    from slot_index import SlotIndex
+    from xatu_source import SyntheticSource, synthetic_clients
+
+logger = logging.getLogger(__name__)
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+# Allowed slowdown and memory growth over the baseline, as a fraction
+TIME_TOLERANCE = float(os.environ.get("BENCHMARK_TIME_TOLERANCE", 0.5))
+MEMORY_TOLERANCE = float(os.environ.get("BENCHMARK_MEMORY_TOLERANCE", 0.2))
+# Differences smaller than these never count as a regression
+MIN_TIME_DELTA = 0.002
+MIN_MEMORY_DELTA = 1 << 20
+
+# Slots in the store behind the API benchmarks; 1000000 is supported but takes a few GB of disk
+API_SIZES = [100, 1000, 10000, 100000]
+API_COUNTS = [1, 20, 128]
+# Slots the frontend's list view polls, and the fields it asks for
+POLL_COUNT = 20
+POLL_FIELDS = "status,seconds_in_slot"
+# Newest slots of an API data set appended one commit each, so version cursors have revisions to poll
+POLL_TAIL_SLOTS = 3
+# (networks, clients per network, slots) of the ingest stage benchmarks
+INGEST_SCALES = {
+    "small": (1, 6, 64),
+    "medium": (3, 6, 1024),
+    "large": (3, 12, 7200),
+}
+SYNTHETIC_HEAD_SLOT = 10_000_000
+# Slots written to the segment store per append while building an API data set
+BUILD_BATCH_SLOTS = 10000
+
+
+def measure(run, setup=None, repeat=5):
+    """
+    Time `run(*setup())` `repeat` times and trace the peak memory of one more
+    call. `setup` runs outside the measurement and defaults to no arguments.
+    The fastest run is reported: slower ones only add scheduling noise.
+
+    Returns:
+        dict: 'seconds' (fastest run) and 'peak_bytes'.
+    """
+    if setup is None:
+        setup = tuple
+    durations = []
+    for _ in range(repeat):
+        args = setup()
+        started = time.perf_counter()
+        run(*args)
+        durations.append(time.perf_counter() - started)
+    args = setup()
+    tracemalloc.start()
+    try:
+        run(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(min(durations), 6), "peak_bytes": peak}
+
+
+def calibrate(repeat):
+    """
+    Time a fixed workload of sorting, JSON and gzip, the kind of work the
+    benchmarked paths do, to express results as multiples of it.
+    """
+    values = np.random.default_rng(0).random(200000)
+    document = [{"slot": i, "data": {"status": "produced", "seconds_in_slot": i * 0.001}} for i in range(2000)]
+
+    def work():
+        np.sort(values)
+        gzip.compress(json.dumps(json.loads(json.dumps(document))).encode('utf-8'), compresslevel=6)
+    return measure(work, repeat=repeat)["seconds"]
+
+
+def synthetic_frames(networks, clients, slots):
+    """
+    Return the block event, reorg and beacon block frames of a synthetic
+    source holding `slots` slots of `networks` x `clients`.
+    """
+    source = SyntheticSource([f"net{i}" for i in range(networks)], synthetic_clients(clients),
+                             head_slot=SYNTHETIC_HEAD_SLOT, window_slots=slots, reorg_rate=0.01)
+    # Let the newest slot finish so every row of the window exists
+    source.advance(1)
+    return source.frame("block_events"), source.frame("reorgs"), source.frame("beacon_blocks")
+
+
+def ingest_benchmarks(scales, repeat, data_dir):
+    """
+    Benchmark each stage of the ingest pipeline on synthetic frames, feeding
+    every stage the output of the previous one as `run` does.
+    """
+    results = {}
+    for scale in scales:
+        networks, clients, slots = INGEST_SCALES[scale]
+        events, reorgs, blocks = synthetic_frames(networks, clients, slots)
+        events = events.drop(columns=["updated_date_time"]).assign(status="produced")
+        reorgs = reorgs[["network", "client", "slot"]]
+        blocks = blocks.drop(columns=["updated_date_time"])
+        label = f"[scale={scale}]"
+        logger.warning(f"[BENCH] ingest {scale}: {len(events)} block events over {networks} x {clients} x {slots}")
+
+        results["ingest.fill_missing_slots" + label] = measure(
+            xatu_data_prep.fill_missing_slots, lambda: (events.copy(),), repeat)
+        filled = xatu_data_prep.fill_missing_slots(events.copy())
+
+        results["ingest.update_status" + label] = measure(
+            xatu_data_prep.update_status, lambda: (filled.copy(), reorgs), repeat)
+        df = xatu_data_prep.update_status(filled.copy(), reorgs)
+        df = df.sort_values(by=['network', 'client', 'slot']).reset_index(drop=True)
+
+        results["ingest.timestamps" + label] = measure(
+            xatu_data_prep.add_roots_and_timings, lambda: (df.copy(), blocks), repeat)
+        df = xatu_data_prep.add_roots_and_timings(df, blocks)
+
+        network_frames = [df[df['network'] == network] for network in df['network'].unique()]
+        results["ingest.serialize_slots" + label] = measure(
+            lambda: [xatu_data_prep.serialize_slots(frame) for frame in network_frames], repeat=repeat)
+        serialized = {frame['network'].iloc[0]: xatu_data_prep.serialize_slots(frame) for frame in network_frames}
+
+        def fresh_output():
+            # Every measured save starts from an empty store, as the first run after a deploy does
+            shutil.rmtree(data_dir, ignore_errors=True)
+            xatu_data_prep._stores.clear()
+            return ()
+
+        def save_all():
+            for network, slots_data in serialized.items():
+                xatu_data_prep.save_data_to_files(slots_data, network)
+        results["ingest.save_data_to_files" + label] = measure(save_all, fresh_output, repeat)
+        fresh_output()
+    return results
+
+
+def build_api_data(data_dir, network, size):
+    """
+    Write `size` slots of realistic content to the segment store of `network`.
+    """
+    events, _, blocks = synthetic_frames(1, 6, 256)
+    df = events.drop(columns=["updated_date_time"]).assign(status="produced")
+    df = xatu_data_prep.add_roots_and_timings(xatu_data_prep.fill_missing_slots(df),
+                                              blocks.drop(columns=["updated_date_time"]))
+    templates = sorted(xatu_data_prep.serialize_slots(df).items())
+
+    # Wider segments than the ingest writes keep the open files of the largest stores in check
+    store = SegmentStore(os.path.join(data_dir, network), segment_slots=max(SEGMENT_SLOTS, size // 64),
+                         retention_slots=size)
+
+    def body(slot):
+        template_slot, template = templates[slot % len(templates)]
+        return template.replace(b'"slot":%d' % template_slot, b'"slot":%d' % slot)
+
+    bulk = max(size - POLL_TAIL_SLOTS, 0)
+    for start in range(0, bulk, BUILD_BATCH_SLOTS):
+        store.append({slot: body(slot) for slot in range(start, min(start + BUILD_BATCH_SLOTS, bulk))})
+    # The newest slots land one commit at a time, as they do from the ingest
+    for slot in range(bulk, size):
+        store.append({slot: body(slot)})
+
+
+def api_benchmarks(sizes, counts, repeat, data_dir):
+    """
+    Benchmark loading the slot index and the /api/slots and /api/clients
+    endpoints, with one network per store size: full responses built from
+    the index, the frontend's version-cursor poll of projected fields, and
+    full responses and polls served from the shared snapshot once it is published.
+    """
+    networks = {size: f"bench{size}" for size in sizes}
+    for size, network in networks.items():
+        logger.warning(f"[BENCH] api: writing {size} slots")
+        build_api_data(data_dir, network, size)
+
+    results = {}
+    for size, network in networks.items():
+        network_dir = os.path.join(data_dir, network)
+        results[f"api.index_load[slots={size}]"] = measure(
+            lambda: SlotIndex(network, network_dir).refresh(), repeat=repeat)
+
+    # The app reads its configuration once, at import
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["NETWORKS"] = ",".join(networks.values())
+    config.NETWORKS = config.get_networks()
+    try:
+        from backend import app as api
+        from backend.response_cache import ResponseCache
+    except ImportError:  # Running as a script from inside the backend directory
+        import app as api
+        from response_cache import ResponseCache
+    logging.getLogger().setLevel(logging.WARNING)
+    api.logger.setLevel(logging.WARNING)
+    client = api.app.test_client()
+
+    def get(url, headers=None):
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, f"{url}: {response.status_code}"
+
+    def clear_cache():
+        api.slot_response_cache = ResponseCache()
+        api.cursor_response_cache = ResponseCache(max_entries=api.CURSOR_CACHE_ENTRIES)
+        return ()
+
+    for size, network in networks.items():
+        for count in counts:
+            url = f"/api/slots/{network}?count={count}"
+            results[f"api.get_latest_slots[slots={size},count={count}]"] = measure(
+                get, lambda: clear_cache() + (url,), repeat)
+            results[f"api.get_latest_slots_cached[slots={size},count={count}]"] = measure(
+                get, lambda: (url,), repeat)
+
+    # The list view polls with the cursor of its previous response and accepts gzip, as browsers do.
+    # The first poll after a new slot builds the response, the others of the same cursor reuse it.
+    browser = {"Accept-Encoding": "gzip, deflate, br"}
+    for size, network in networks.items():
+        index = api.get_index(network)
+        index.refresh()
+        latest = index.store.latest_slots(POLL_TAIL_SLOTS)
+        cursors = {"unchanged": index.revision, "behind": index.store.revision(latest[-1])}
+        for name, cursor in cursors.items():
+            url = f"/api/slots/{network}?count={POLL_COUNT}&version={cursor}&fields={POLL_FIELDS}"
+            results[f"api.poll_latest_slots_uncached[slots={size},cursor={name}]"] = measure(
+                get, lambda: clear_cache() + (url, browser), repeat)
+            results[f"api.poll_latest_slots[slots={size},cursor={name}]"] = measure(
+                get, lambda: (url, browser), repeat)
+
+    for size, network in networks.items():
+        def publish():
+            xatu_data_prep._snapshots.clear()
+            xatu_data_prep.save_snapshot(network)
+        results[f"api.publish_snapshot[slots={size}]"] = measure(publish, repeat=repeat)
+        for count in counts:
+            url = f"/api/slots/{network}?count={count}"
+            results[f"api.get_latest_slots_snapshot[slots={size},count={count}]"] = measure(
+                get, lambda: (url, browser), repeat)
+        index = api.get_index(network)
+        url = f"/api/slots/{network}?count={POLL_COUNT}&version={index.revision}&fields={POLL_FIELDS}"
+        results[f"api.poll_latest_slots_snapshot[slots={size}]"] = measure(get, lambda: (url, browser), repeat)
+    results[f"api.get_clients[networks={len(networks)}]"] = measure(get, lambda: ("/api/clients",), repeat)
+    return results
+
+
+def compare(results, baselines, calibration_seconds):
+    """
+    Compare results to their baselines. Times are compared relative to the
+    calibration workload, with the baseline scaled to this machine for the
+    absolute noise floor.
+
+    Returns:
+        list: (name, result, baseline, regressions) of every benchmark, where
+              regressions lists 'time' and/or 'memory'.
+    """
+    rows = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        regressions = []
+        if baseline is not None:
+            expected_seconds = baseline["relative"] * calibration_seconds
+            if (result["relative"] > baseline["relative"] * (1 + TIME_TOLERANCE)
+                    and result["seconds"] - expected_seconds > MIN_TIME_DELTA):
+                regressions.append("time")
+            if (result["peak_bytes"] > baseline["peak_bytes"] * (1 + MEMORY_TOLERANCE)
+                    and result["peak_bytes"] - baseline["peak_bytes"] > MIN_MEMORY_DELTA):
+                regressions.append("memory")
+        rows.append((name, result, baseline, regressions))
+    return rows
+
+
+def print_report(rows):
+    width = max((len(row[0]) for row in rows), default=0)
+    print(f"{'benchmark':<{width}}  {'ms':>10} {'relative':>10} {'base rel':>10}  "
+          f"{'peak MiB':>9} {'base MiB':>9}  status")
+    for name, result, baseline, regressions in rows:
+        base_relative = f"{baseline['relative']:10.3f}" if baseline else f"{'-':>10}"
+        base_mib = f"{baseline['peak_bytes'] / (1 << 20):9.2f}" if baseline else f"{'-':>9}"
+        status = ("REGRESSED " + "+".join(regressions)) if regressions else ("ok" if baseline else "new")
+        print(f"{name:<{width}}  {result['seconds'] * 1000:10.3f} {result['relative']:10.3f} {base_relative}  "
+              f"{result['peak_bytes'] / (1 << 20):9.2f} {base_mib}  {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API and ingest hot paths against tracked baselines.")
+    parser.add_argument("--update", action="store_true", help="record the results as the new baselines")
+    parser.add_argument("--only", default="", help="run only benchmarks whose name starts with this prefix")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--sizes", default=",".join(map(str, API_SIZES)), help="slots in the API stores")
+    parser.add_argument("--scales", default=",".join(INGEST_SCALES), help="ingest scales to run")
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    scales = [scale for scale in args.scales.split(",") if scale]
+
+    calibration_seconds = calibrate(args.repeat)
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        if "ingest.".startswith(args.only) or args.only.startswith("ingest."):
+            previous = os.environ.get("DATA_DIR")
+            os.environ["DATA_DIR"] = os.path.join(work_dir, "ingest")
+            try:
+                results.update(ingest_benchmarks(scales, args.repeat, os.environ["DATA_DIR"]))
+            finally:
+                if previous is None:
+                    del os.environ["DATA_DIR"]
+                else:
+                    os.environ["DATA_DIR"] = previous
+        if "api.".startswith(args.only) or args.only.startswith("api."):
+            results.update(api_benchmarks(sizes, API_COUNTS, args.repeat, os.path.join(work_dir, "api")))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    results = {name: dict(result, relative=round(result["seconds"] / calibration_seconds, 4))
+               for name, result in results.items() if name.startswith(args.only)}
+
+    baselines = {"machine": {}, "benchmarks": {}}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, "r") as f:
+            baselines = json.load(f)
+
+    if args.update:
+        baselines["benchmarks"].update(results)
+        baselines["benchmarks"] = dict(sorted(baselines["benchmarks"].items()))
+        # Where the absolute seconds were measured; the relative times do not depend on it
+        baselines["machine"] = {
+            "calibration_seconds": calibration_seconds,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.machine(),
+        }
+        with open(args.baselines, "w") as f:
+            json.dump(baselines, f, indent=2)
+            f.write("\n")
+        print_report(compare(results, {}, calibration_seconds))
+        print(f"Recorded {len(results)} baselines in {args.baselines}")
+        return 0
+
+    rows = compare(results, baselines["benchmarks"], calibration_seconds)
+    print_report(rows)
+    regressed = [row[0] for row in rows if row[3]]
+    if regressed:
+        print(f"{len(regressed)} of {len(rows)} benchmarks regressed beyond the tolerance "
+              f"(time +{TIME_TOLERANCE:.0%}, memory +{MEMORY_TOLERANCE:.0%})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import os
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# How many slots behind the newest block are kept in the DAG
+DAG_RETENTION_SLOTS = int(os.environ.get("DAG_RETENTION_SLOTS", 256))
+
+
+class Block:
+    __slots__ = ("root", "slot", "parent_root", "children", "clients")
+
+    def __init__(self, root, slot, parent_root):
+        self.root = root
+        self.slot = slot
+        self.parent_root = parent_root
+        self.children = set()
+        self.clients = set()  # clients whose view of the slot is this block
+
+
+class BlockDAG:
+    """
+    Blocks of one network keyed by root and linked through their parent root,
+    built from the per-client `hash`/`parent_hash` of every slot.
+
+    The head is the block of the newest slot that most clients saw. Blocks on
+    the chain from the head back are canonical, all others are orphaned. A slot
+    is divergent when clients saw different roots for it.
+
+    Adding a block that extends the head, or any block off the canonical chain,
+    costs O(1); only a switch of the head to another branch walks the chain
+    again, which is what a reorg is. Where a parent was never seen, the walk
+    continues with the majority block of the nearest earlier slot, found by
+    bisecting the occupied slots.
+    """
+
+    def __init__(self, network, retention_slots=DAG_RETENTION_SLOTS):
+        self.network = network
+        self.retention_slots = retention_slots
+        self._lock = threading.Lock()
+        self._blocks = {}       # root -> Block
+        self._waiting = {}      # parent root not seen yet -> set of child roots
+        self._views = {}        # slot -> { client: root }
+        self._by_slot = {}      # slot -> set of roots
+        self._slots = []        # slots in _by_slot, ascending
+        self._majority = {}     # slot -> root most clients saw
+        self._newest_slot = None
+        self._pruned_to = None  # highest slot removed by retention so far
+        self._divergent = set()  # slots whose clients disagree on the root
+        self._canonical = set()  # roots on the chain ending in the head
+        self._orphaned = set()   # all other roots
+        self.head = None
+        self.version = 0        # bumped every time the DAG changes
+
+    def add_slot(self, slot, data):
+        """
+        Add the views of every client of one slot ({ client: slot data }, as
+        stored by the ingest). Clients that missed the slot have no view of it.
+        """
+        with self._lock:
+            changed = False
+            for client, view in data.items():
+                if not isinstance(view, dict) or view.get("status") == "missed" or not view.get("hash"):
+                    continue
+                changed |= self._add(slot, client, view["hash"], view.get("parent_hash"))
+            if changed:
+                self._prune()
+                self.version += 1
+            return changed
+
+    def _add(self, slot, client, root, parent_root):
+        if self._pruned_to is not None and slot <= self._pruned_to:
+            return False
+        views = self._views.setdefault(slot, {})
+        previous = views.get(client)
+        if previous == root:
+            return False
+        views[client] = root
+        if previous is not None and previous in self._blocks:
+            self._blocks[previous].clients.discard(client)
+        if len(set(views.values())) > 1:
+            self._divergent.add(slot)
+        else:
+            self._divergent.discard(slot)
+
+        block = self._blocks.get(root)
+        if block is None:
+            block = self._blocks[root] = Block(root, slot, parent_root)
+            if slot not in self._by_slot:
+                bisect.insort(self._slots, slot)
+            self._by_slot.setdefault(slot, set()).add(root)
+            if self._newest_slot is None or slot > self._newest_slot:
+                self._newest_slot = slot
+            parent = self._blocks.get(parent_root)
+            if parent is not None:
+                parent.children.add(root)
+            elif parent_root:
+                self._waiting.setdefault(parent_root, set()).add(root)
+            block.children = self._waiting.pop(root, set())
+            block.clients.add(client)
+            self._update_majority(slot)
+            self._classify(block)
+        else:
+            block.clients.add(client)
+            self._update_majority(slot)
+        self._choose_head()
+        return True
+
+    def _classify(self, block):
+        if any(child in self._canonical for child in block.children):
+            # Fills a gap in the canonical chain; what lies behind it may change too
+            self._rebuild_canonical()
+        elif self.head is not None:
+            self._orphaned.add(block.root)
+
+    def _choose_head(self):
+        """
+        Move the head to the block of the newest slot seen by most clients.
+        """
+        head = self._blocks.get(self.head)
+        best = head
+        for root in self._by_slot.get(self._newest_slot, ()):
+            candidate = self._blocks[root]
+            if best is None or (candidate.slot, len(candidate.clients)) > (best.slot, len(best.clients)):
+                best = candidate
+        if best is head:
+            return
+        self.head = best.root
+        if head is not None and best.parent_root == head.root:
+            self._canonical.add(best.root)
+            self._orphaned.discard(best.root)
+        else:
+            if head is not None:
+                logger.info(f"[DAG] {self.network}: head switched from slot {head.slot} {head.root} "
+                            f"to slot {best.slot} {best.root}")
+            self._rebuild_canonical()
+
+    def _rebuild_canonical(self):
+        canonical = set()
+        block = self._blocks.get(self.head)
+        while block is not None:
+            canonical.add(block.root)
+            parent = self._blocks.get(block.parent_root)
+            if parent is None:
+                # The parent was never seen (e.g. no root was stored for its
+                # slot); continue with the block most clients saw before it
+                parent = self._majority_before(block.slot)
+            block = parent
+        self._canonical = canonical
+        self._orphaned = set(self._blocks) - canonical
+
+    def _update_majority(self, slot):
+        self._majority[slot] = max(self._by_slot[slot], key=lambda root: len(self._blocks[root].clients))
+
+    def _majority_before(self, slot):
+        i = bisect.bisect_left(self._slots, slot)
+        if i == 0:
+            return None
+        return self._blocks[self._majority[self._slots[i - 1]]]
+
+    def _prune(self):
+        if self._newest_slot is None:
+            return
+        cutoff = self._newest_slot - self.retention_slots
+        if self._pruned_to is not None and cutoff <= self._pruned_to:
+            return
+        if self._pruned_to is None or cutoff - self._pruned_to > self.retention_slots:
+            expired = [slot for slot in self._views if slot <= cutoff]
+        else:
+            expired = range(self._pruned_to + 1, cutoff + 1)
+        self._pruned_to = cutoff
+        del self._slots[:bisect.bisect_right(self._slots, cutoff)]
+        for slot in expired:
+            self._views.pop(slot, None)
+            self._divergent.discard(slot)
+            self._majority.pop(slot, None)
+            for root in self._by_slot.pop(slot, ()):
+                block = self._blocks.pop(root)
+                self._canonical.discard(root)
+                self._orphaned.discard(root)
+                parent = self._blocks.get(block.parent_root)
+                if parent is not None:
+                    parent.children.discard(root)
+                waiting = self._waiting.get(block.parent_root)
+                if waiting is not None:
+                    waiting.discard(root)
+                    if not waiting:
+                        del self._waiting[block.parent_root]
+
+    def _describe(self, block):
+        return {
+            "slot": block.slot,
+            "root": block.root,
+            "parent_root": block.parent_root,
+            "clients": sorted(block.clients),
+        }
+
+    def summary(self, count):
+        """
+        Return the head, the newest `count` divergent slots and the newest
+        `count` orphaned blocks, newest first.
+        """
+        with self._lock:
+            head = self._blocks.get(self.head)
+            divergent = []
+            for slot in sorted(self._divergent, reverse=True)[:count]:
+                roots = {}
+                for client, root in sorted(self._views[slot].items()):
+                    roots.setdefault(root, []).append(client)
+                divergent.append({
+                    "slot": slot,
+                    "roots": [{"root": root, "canonical": root in self._canonical, "clients": clients}
+                              for root, clients in roots.items()],
+                })
+            orphaned = sorted((self._blocks[root] for root in self._orphaned),
+                              key=lambda block: block.slot, reverse=True)[:count]
+            return {
+                "network": self.network,
+                "head": self._describe(head) if head is not None else None,
+                "blocks": len(self._blocks),
+                "divergent_slots": divergent,
+                "orphaned_blocks": [self._describe(block) for block in orphaned],
+            }
@@ -0,0 +1,404 @@
+import os
+import json
+import logging
+import mmap
+import threading
+import time
+
+import numpy as np
+
+try:
+    from backend.slot_files import write_file_atomic
+except ImportError:  # Running as a script from inside the backend directory
+    from slot_files import write_file_atomic
+
+logger = logging.getLogger(__name__)
+
+# Number of consecutive slots stored in one chunk file (7200 slots = one day)
+COLUMN_CHUNK_SLOTS = int(os.environ.get("COLUMN_CHUNK_SLOTS", 7200))
+# How many slots behind the newest one are kept before whole chunks are deleted (two weeks)
+COLUMN_RETENTION_SLOTS = int(os.environ.get("COLUMN_RETENTION_SLOTS", 100800))
+# Rows reserved per slot in a new chunk, one per client; client codes are stable
+# across chunks, and a chunk is widened when the client dictionary outgrows it
+CLIENT_LANES = 8
+# Client codes are stored as uint8, 0 marking an empty row
+MAX_CLIENTS = 255
+# Reads retried while the ingest is rewriting the rows they cover
+READ_ATTEMPTS = 100
+# Distinct roots a chunk can hold: a hash and a parent hash per slot at most
+ROOTS_PER_SLOT = 2
+
+STATUSES = ("produced", "missed", "reorged")  # status code = position + 1
+NO_TIMESTAMP = np.iinfo(np.int32).min          # ms_in_slot of a row without timestamp
+
+CHUNK_MAGIC = b"SLOTCOL1"
+CHUNK_SUFFIX = ".col"
+CLIENTS_FILE = "clients.json"
+HEADER = np.dtype([
+    ("magic", "S8"),
+    ("first_slot", "<i8"),
+    ("chunk_slots", "<i8"),
+    ("lanes", "<i8"),
+    ("root_capacity", "<i8"),
+    ("root_count", "<i8"),
+    ("generation", "<u8"),  # odd while rows are being rewritten
+])
+HEADER_SIZE = 64
+# Column sections in file order; wider types first so every section stays aligned
+COLUMNS = (
+    ("slot", "<i8"),
+    ("ms_in_slot", "<i4"),
+    ("hash", "<u4"),         # root id in the chunk's root table, 0 = none
+    ("parent_hash", "<u4"),
+    ("client", "u1"),        # client code, 0 = empty row
+    ("status", "u1"),
+)
+
+
+def parse_chunk_filename(name):
+    """
+    Return the first slot of a '<first_slot>.col' file name, or None if the
+    name does not look like a chunk file.
+    """
+    stem, ext = os.path.splitext(name)
+    if ext != CHUNK_SUFFIX or not stem.isdigit():
+        return None
+    return int(stem)
+
+
+def chunk_layout(chunk_slots, lanes, root_capacity):
+    """
+    Return ({ column: (offset, dtype) }, roots offset, file size) of a chunk.
+    """
+    rows = chunk_slots * lanes
+    offset = HEADER_SIZE
+    columns = {}
+    for name, dtype in COLUMNS:
+        columns[name] = (offset, np.dtype(dtype))
+        offset += rows * np.dtype(dtype).itemsize
+    offset = (offset + 7) // 8 * 8
+    return columns, offset, offset + root_capacity * 32
+
+
+class Chunk:
+    """
+    A memory-mapped chunk file. Its columns and root table are numpy views on
+    the mapping, so reading a slot range copies nothing until rows are selected.
+
+    Row (slot - first_slot) * lanes + (client code - 1) holds one client's view
+    of one slot, which makes every write an in-place update at a known position.
+    Rows are rewritten under a sequence lock: the generation in the header is
+    odd during a write, so readers can tell a copy that overlapped one.
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        with open(path, 'r+b' if writable else 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+            self.inode = os.fstat(f.fileno()).st_ino
+        self.header = np.frombuffer(self.map, HEADER, count=1)
+        if self.header["magic"][0] != CHUNK_MAGIC:
+            raise ValueError(f"{path} is not a slot column chunk")
+        self.first_slot = int(self.header["first_slot"][0])
+        self.chunk_slots = int(self.header["chunk_slots"][0])
+        self.lanes = int(self.header["lanes"][0])
+        self.root_capacity = int(self.header["root_capacity"][0])
+        layout, roots_offset, _ = chunk_layout(self.chunk_slots, self.lanes, self.root_capacity)
+        rows = self.chunk_slots * self.lanes
+        self.columns = {name: np.frombuffer(self.map, dtype, count=rows, offset=offset)
+                        for name, (offset, dtype) in layout.items()}
+        self.roots = np.frombuffer(self.map, np.uint8, count=self.root_capacity * 32,
+                                   offset=roots_offset).reshape(self.root_capacity, 32)
+        self._root_ids = None  # root bytes -> id, built by the writer on first use
+        if writable and self.generation & 1:
+            # Left odd by a writer that died mid-write; its rows are as good as they get
+            self.header["generation"] = self.generation + 1
+
+    @property
+    def generation(self):
+        return int(self.header["generation"][0])
+
+    def write_rows(self, rows, values):
+        """
+        Write { column: values } to `rows`, bracketed by the sequence lock. The
+        client code marks a row as present, so it goes last.
+        """
+        self.header["generation"] = self.generation + 1
+        for name, _ in COLUMNS:
+            if name != "client":
+                self.columns[name][rows] = values[name]
+        self.columns["client"][rows] = values["client"]
+        self.header["generation"] = self.generation + 1
+
+    def read_rows(self, lo, hi, codes=None):
+        """
+        Copy the present rows in [lo, hi) as { column: array }, keeping only
+        clients in `codes` if given. Retries a copy that overlapped a write.
+        """
+        for attempt in range(READ_ATTEMPTS):
+            generation = self.generation
+            if generation & 1 and attempt < READ_ATTEMPTS - 1:
+                time.sleep(0.001)
+                continue
+            view = {name: column[lo:hi] for name, column in self.columns.items()}
+            present = view["client"] != 0 if codes is None else np.isin(view["client"], codes)
+            rows = np.flatnonzero(present)
+            part = {name: column[rows] for name, column in view.items()}
+            if self.generation == generation:
+                return part
+        logger.warning(f"[COLUMNS] {self.path} kept changing during {READ_ATTEMPTS} reads")
+        return part
+
+    def widened(self, lanes):
+        """
+        Rewrite the chunk with `lanes` rows per slot, keeping every row and
+        root, and return the new chunk. The file is replaced atomically;
+        readers notice the new inode and map it again.
+        """
+        directory, name = os.path.split(self.path)
+        tmp_path = os.path.join(directory, f".{name}.tmp")
+        chunk = Chunk.create(tmp_path, self.first_slot, self.chunk_slots, lanes, publish=False)
+        old = np.flatnonzero(self.columns["client"] != 0)
+        new = old // self.lanes * lanes + old % self.lanes
+        for column, _ in COLUMNS:
+            chunk.columns[column][new] = self.columns[column][old]
+        chunk.roots[:self.root_count] = self.roots[:self.root_count]
+        chunk.header["root_count"] = self.root_count
+        chunk.header["generation"] = self.generation
+        chunk.map.flush()
+        os.replace(tmp_path, self.path)
+        chunk.path = self.path
+        logger.info(f"[COLUMNS] Widened {self.path} from {self.lanes} to {lanes} client lanes")
+        return chunk
+
+    @classmethod
+    def create(cls, path, first_slot, chunk_slots, lanes, publish=True):
+        """
+        Create an empty chunk file and map it for writing. The file is sized
+        up front (sparse) and renamed into place, so readers can map it once.
+        With `publish` unset it is created at `path` directly, for the caller
+        to fill and rename.
+        """
+        root_capacity = chunk_slots * ROOTS_PER_SLOT
+        header = np.zeros(1, HEADER)
+        header[0] = (CHUNK_MAGIC, first_slot, chunk_slots, lanes, root_capacity, 0, 0)
+        _, _, size = chunk_layout(chunk_slots, lanes, root_capacity)
+        directory, name = os.path.split(path)
+        tmp_path = os.path.join(directory, f".{name}.tmp") if publish else path
+        with open(tmp_path, 'wb') as f:
+            f.write(header.tobytes().ljust(HEADER_SIZE, b"\0"))
+            f.truncate(size)
+        os.chmod(tmp_path, 0o644)
+        if publish:
+            os.replace(tmp_path, path)
+        return cls(path, writable=True)
+
+    @property
+    def root_count(self):
+        return int(self.header["root_count"][0])
+
+    def encode_roots(self, values):
+        """
+        Return the root ids of `values` ('0x'-prefixed hex strings or None),
+        adding roots that are not in the table yet.
+        """
+        if self._root_ids is None:
+            self._root_ids = {self.roots[i].tobytes(): i + 1 for i in range(self.root_count)}
+        count = self.root_count
+        ids = np.zeros(len(values), np.uint32)
+        for i, value in enumerate(values):
+            if not isinstance(value, str):
+                continue
+            root = bytes.fromhex(value[2:] if value.startswith("0x") else value)
+            root_id = self._root_ids.get(root)
+            if root_id is None:
+                if count >= self.root_capacity or len(root) != 32:
+                    logger.error(f"[COLUMNS] Cannot store root {value} in {self.path}")
+                    continue
+                self.roots[count] = np.frombuffer(root, np.uint8)
+                count += 1
+                root_id = self._root_ids[root] = count
+            ids[i] = root_id
+        # Publish the new roots only after they are written
+        self.header["root_count"] = count
+        return ids
+
+    def decode_roots(self, ids):
+        """
+        Return the '0x'-prefixed hex strings of root ids (which must be non-zero).
+        """
+        return ["0x" + self.roots[root_id - 1].tobytes().hex() for root_id in ids]
+
+
+class ColumnStore:
+    """
+    Columnar history of one network: per-row int64 slot, uint8 client and
+    status codes, int32 milliseconds into the slot at which the block was seen
+    and dictionary-encoded 32-byte roots, in chunk files of `chunk_slots` slots.
+
+    The ingest writes through a writable mapping; the API maps the same files
+    read-only and selects rows straight from the mapped columns.
+    """
+
+    def __init__(self, directory, chunk_slots=COLUMN_CHUNK_SLOTS,
+                 retention_slots=COLUMN_RETENTION_SLOTS, writable=False):
+        self.directory = directory
+        self.chunk_slots = chunk_slots
+        self.retention_slots = retention_slots
+        self.writable = writable
+        self._lock = threading.Lock()
+        self._chunks = {}  # first slot -> Chunk
+        self._clients_mtime = None
+        self.clients = []  # client names, code = position + 1
+
+    def chunk_start(self, slot):
+        return slot - slot % self.chunk_slots
+
+    def refresh(self):
+        """
+        Forget chunks that were deleted or replaced by a widened file and
+        reload the client dictionary if it changed.
+        """
+        with self._lock:
+            self._forget_replaced()
+            self._load_clients()
+
+    def _forget_replaced(self):
+        for first_slot, chunk in list(self._chunks.items()):
+            try:
+                replaced = os.stat(chunk.path).st_ino != chunk.inode
+            except FileNotFoundError:
+                replaced = True
+            if replaced:
+                del self._chunks[first_slot]
+
+    def _load_clients(self):
+        path = os.path.join(self.directory, CLIENTS_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._clients_mtime:
+            return
+        with open(path, 'r') as f:
+            self.clients = json.load(f)["clients"]
+        self._clients_mtime = mtime
+
+    def _chunk(self, first_slot, create=False):
+        chunk = self._chunks.get(first_slot)
+        if chunk is not None:
+            return chunk
+        path = os.path.join(self.directory, f"{first_slot}{CHUNK_SUFFIX}")
+        if os.path.exists(path):
+            chunk = Chunk(path, writable=self.writable)
+        elif create:
+            os.makedirs(self.directory, exist_ok=True)
+            chunk = Chunk.create(path, first_slot, self.chunk_slots, max(CLIENT_LANES, len(self.clients)))
+        else:
+            return None
+        self._chunks[first_slot] = chunk
+        return chunk
+
+    def _client_codes(self, clients):
+        codes = {name: i + 1 for i, name in enumerate(self.clients)}
+        added = False
+        for name in set(clients) - set(codes):
+            if len(self.clients) >= MAX_CLIENTS:
+                raise ValueError(f"Cannot add client {name} to {self.directory}: "
+                                 f"the history holds at most {MAX_CLIENTS} clients")
+            self.clients.append(name)
+            codes[name] = len(self.clients)
+            added = True
+        if added:
+            write_file_atomic(os.path.join(self.directory, CLIENTS_FILE),
+                              json.dumps({"clients": self.clients}).encode('utf-8'))
+        return np.array([codes.get(name, 0) for name in clients], np.uint8)
+
+    def write(self, slots, clients, statuses, ms_in_slot, hashes, parent_hashes):
+        """
+        Store one row per (slot, client); all arguments are sequences of equal
+        length. Rows that already exist are overwritten in place. Chunks that
+        fall out of the retention window are deleted afterwards.
+        """
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self._forget_replaced()  # another writer (a backfill) may have widened a chunk
+            self._load_clients()
+            slots = np.asarray(slots, np.int64)
+            client_codes = self._client_codes(list(clients))
+            status_codes = np.array([STATUSES.index(s) + 1 if s in STATUSES else 0 for s in statuses], np.uint8)
+            ms_in_slot = np.asarray(ms_in_slot, np.int32)
+            starts = slots - slots % self.chunk_slots
+            for first_slot in np.unique(starts):
+                selected = np.flatnonzero((starts == first_slot) & (client_codes > 0))
+                if len(selected) == 0:
+                    continue
+                chunk = self._chunk(int(first_slot), create=True)
+                if chunk.lanes < len(self.clients):
+                    chunk = self._chunks[int(first_slot)] = chunk.widened(max(len(self.clients), 2 * chunk.lanes))
+                rows = (slots[selected] - first_slot) * chunk.lanes + (client_codes[selected] - 1)
+                chunk.write_rows(rows, {
+                    "slot": slots[selected],
+                    "ms_in_slot": ms_in_slot[selected],
+                    "hash": chunk.encode_roots([hashes[i] for i in selected]),
+                    "parent_hash": chunk.encode_roots([parent_hashes[i] for i in selected]),
+                    "status": status_codes[selected],
+                    "client": client_codes[selected],
+                })
+            if len(slots):
+                self._expire(int(slots.max()))
+
+    def _expire(self, newest):
+        cutoff = newest - self.retention_slots
+        for name in os.listdir(self.directory):
+            first_slot = parse_chunk_filename(name)
+            if first_slot is not None and first_slot + self.chunk_slots <= cutoff:
+                logger.info(f"[COLUMNS] Deleting expired chunk {name} of {self.directory}")
+                self._chunks.pop(first_slot, None)
+                os.remove(os.path.join(self.directory, name))
+
+    def read(self, start, end, clients=None):
+        """
+        Return the stored rows of slots [start, end], ordered by slot and client:
+
+            { "slot", "client", "status", "ms_in_slot": numpy arrays,
+              "hash", "parent_hash": int64 indexes into "roots" (-1 = none),
+              "roots": ['0x...', ...] }
+
+        `clients` optionally restricts the rows to the given client names.
+        """
+        self.refresh()
+        codes = None
+        if clients is not None:
+            codes = [i + 1 for i, name in enumerate(self.clients) if name in clients]
+        parts = []
+        with self._lock:
+            for first_slot in range(self.chunk_start(start), end + 1, self.chunk_slots):
+                chunk = self._chunk(first_slot)
+                if chunk is None:
+                    continue
+                lo = (max(start, first_slot) - first_slot) * chunk.lanes
+                hi = (min(end, first_slot + chunk.chunk_slots - 1) - first_slot + 1) * chunk.lanes
+                part = chunk.read_rows(lo, hi, codes)
+                if len(part["slot"]):
+                    parts.append((chunk, part))
+
+        result = {name: np.concatenate([part[name] for _, part in parts]) if parts
+                  else np.zeros(0, dtype) for name, dtype in COLUMNS}
+        # Re-encode the per-chunk root ids against one table for the whole result
+        roots = []
+        for name in ("hash", "parent_hash"):
+            result[name] = result[name].astype(np.int64) - 1
+        position = 0
+        for chunk, part in parts:
+            ids = np.union1d(part["hash"], part["parent_hash"])
+            ids = ids[ids != 0]
+            size = len(part["slot"])
+            for name in ("hash", "parent_hash"):
+                local = part[name]
+                mapped = np.searchsorted(ids, local) + len(roots)
+                result[name][position:position + size] = np.where(local != 0, mapped, -1)
+            roots.extend(chunk.decode_roots(ids))
+            position += size
+        result["roots"] = roots
+        return result
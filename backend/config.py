@@ -0,0 +1,49 @@
+import os
+import re
+
+# Networks ingested and served unless the NETWORKS environment variable says otherwise
+DEFAULT_NETWORKS = "mainnet,sepolia,holesky"
+# Network names end up in file paths and queries, so only simple names are accepted
+NETWORK_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]*$")
+# Beacon chain clock shared by the ingest and its stand-in sources
+SLOT_0_TIMESTAMP_MS = 1606824023000  # Slot 0 timestamp in milliseconds
+SLOT_DURATION_MS = 12000             # Slot duration in milliseconds
+# Level of the API and ingest logs; DEBUG adds per-request and per-slot detail
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+
+def get_networks():
+    """
+    Get the configured networks from the comma-separated NETWORKS environment
+    variable, e.g. NETWORKS=mainnet,sepolia,holesky,hoodi.
+
+    Returns:
+        list: Network names, in the configured order.
+    """
+    networks = []
+    for network in os.environ.get("NETWORKS", DEFAULT_NETWORKS).split(","):
+        network = network.strip().lower()
+        if not network or network in networks:
+            continue
+        if not NETWORK_NAME.match(network):
+            raise ValueError(f"Invalid network name in NETWORKS: {network!r}")
+        networks.append(network)
+    return networks
+
+
+def get_data_dir():
+    """
+    Get the base directory the slot data is written to and served from,
+    overridable with the DATA_DIR environment variable.
+    """
+    if os.environ.get('DATA_DIR'):
+        return os.path.abspath(os.environ['DATA_DIR'])
+    if os.environ.get('DYNO'):  # We're on Heroku
+        return "/app/data"
+    # Use absolute path to avoid nested directories
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parent_dir = os.path.dirname(current_dir)
+    return os.path.join(parent_dir, "data")
+
+
+NETWORKS = get_networks()
@@ -0,0 +1,134 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+try:
+    from backend import xatu_data_prep
+    from backend.ingest_state import IngestState
+    from backend.xatu_source import RecordingSource, ReplaySource, SyntheticSource, synthetic_clients
+except ImportError:  # Running as a script from inside the backend directory
+    import xatu_data_prep
+    from ingest_state import IngestState
+    from xatu_source import RecordingSource, ReplaySource, SyntheticSource, synthetic_clients
+
+logger = logging.getLogger(__name__)
+
+# Slot the synthetic clock starts at, so synthetic runs do not depend on the date
+SYNTHETIC_HEAD_SLOT = 10_000_000
+
+
+def replay(source, runs, networks, data_dir=None, slots_per_run=1, tick_seconds=0):
+    """
+    Run the ingest pipeline `runs` times against `source`, one run per network
+    and tick as the scheduler does, and collect the stage timings.
+
+    Parameters:
+        source: SlotSource to fetch from; sources with a clock (SyntheticSource, or a
+                RecordingSource of a live source) advance `slots_per_run`
+                slots between ticks.
+        runs (int): Number of ticks.
+        networks (list): Networks to ingest.
+        data_dir (str): Directory the output is written to; a temporary
+                        directory removed afterwards if not given.
+        slots_per_run (int): Slots between two ticks.
+        tick_seconds (float): Wall-clock seconds from the start of one tick to
+                              the next, to pace the ingest like the scheduler
+                              does; 0 runs the ticks back to back.
+
+    Returns:
+        list: { 'run', 'network', 'timings' } of every run.
+    """
+    if data_dir is None:
+        with tempfile.TemporaryDirectory(prefix="ingest-replay-") as tmp:
+            return replay(source, runs, networks, tmp, slots_per_run, tick_seconds)
+
+    previous = os.environ.get("DATA_DIR")
+    os.environ["DATA_DIR"] = data_dir
+    try:
+        states = {network: IngestState() for network in networks}
+        results = []
+        started = time.monotonic()
+        for tick in range(runs):
+            if tick_seconds:
+                time.sleep(max(started + tick * tick_seconds - time.monotonic(), 0))
+            for network in networks:
+                timings = xatu_data_prep.run(source, states[network], [network])
+                results.append({"run": tick, "network": network, "timings": timings})
+            if hasattr(source, "advance") and tick < runs - 1:
+                source.advance(slots_per_run)
+        return results
+    finally:
+        if previous is None:
+            del os.environ["DATA_DIR"]
+        else:
+            os.environ["DATA_DIR"] = previous
+
+
+def summarize(results):
+    """
+    Reduce the timings of many runs to the mean, median and maximum of each
+    stage, in seconds.
+    """
+    stages = {}
+    for result in results:
+        for stage, seconds in result["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+    summary = {}
+    for stage, values in stages.items():
+        values.sort()
+        summary[stage] = {
+            "mean": round(sum(values) / len(values), 6),
+            "p50": round(values[len(values) // 2], 6),
+            "max": round(values[-1], 6),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ingest pipeline offline against recorded or synthetic data.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--replay", metavar="PATH", help="replay a recording made with --record")
+    mode.add_argument("--record", metavar="PATH", help="run against xatu and record every result to PATH")
+    parser.add_argument("--networks", default=",".join(xatu_data_prep.NETWORKS), help="comma-separated networks")
+    parser.add_argument("--runs", type=int, default=None, help="ticks to run (default: 10, or the whole recording)")
+    parser.add_argument("--clients", type=int, default=6, help="synthetic clients per network")
+    parser.add_argument("--slots", type=int, default=100, help="slots of history the synthetic source holds")
+    parser.add_argument("--slots-per-run", type=int, default=1, help="slots the clock advances between ticks")
+    parser.add_argument("--reorg-rate", type=float, default=0.01, help="share of synthetic slots that are reorged")
+    parser.add_argument("--miss-rate", type=float, default=0.01, help="share of synthetic slots without a block")
+    parser.add_argument("--tick-seconds", type=float, default=0, help="wall-clock seconds between ticks (default: none)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=None, help="keep the output here instead of a temporary directory")
+    args = parser.parse_args()
+
+    networks = [network.strip() for network in args.networks.split(",") if network.strip()]
+    runs = args.runs
+    if args.replay:
+        source = ReplaySource(args.replay)
+        if runs is None:
+            # One recorded block event frame per network and tick
+            runs = max(source.remaining("block_events") // max(len(networks), 1), 1)
+    elif args.record:
+        source = RecordingSource(xatu_data_prep.create_client(), args.record)
+    else:
+        source = SyntheticSource(networks, synthetic_clients(args.clients), head_slot=SYNTHETIC_HEAD_SLOT,
+                                 window_slots=args.slots, reorg_rate=args.reorg_rate,
+                                 miss_rate=args.miss_rate, seed=args.seed)
+    if runs is None:
+        runs = 10
+
+    started = time.perf_counter()
+    results = replay(source, runs, networks, args.data_dir, args.slots_per_run, args.tick_seconds)
+    print(json.dumps({
+        "runs": runs,
+        "networks": networks,
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "stages": summarize(results),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class IngestState:
+    """
+    State carried between ingest runs: the rows retained from previous queries
+    and a per-network, per-table high-watermark of what has been fetched.
+
+    watermarks:     { network: { table: { 'slot': int, 'time': 'YYYY-MM-DD HH:MM:SS' } } }
+    frames:         { table: pd.DataFrame }
+    content_hashes: { network: { slot: digest } } of the slot files last written;
+                    kept in memory only, so a restarted ingest rewrites every file once
+    """
+
+    def __init__(self):
+        self.watermarks = {}
+        self.frames = {}
+        self.content_hashes = {}
+
+    def watermark(self, network, table):
+        """
+        Return the watermark of `table` for `network`, or None if nothing has
+        been fetched for it yet.
+        """
+        return self.watermarks.get(network, {}).get(table)
+
+    def frame(self, table):
+        """
+        Return the rows retained for `table`, or None before the first run.
+        """
+        return self.frames.get(table)
+
+    def advance(self, table, df, time_column):
+        """
+        Move the watermarks of `table` forward to the highest slot and time
+        of each network in the newly fetched rows. Watermarks never move back.
+        """
+        if df is None or len(df) == 0:
+            return
+        highest = df.groupby('network').agg(slot=('slot', 'max'), time=(time_column, 'max'))
+        for network, row in highest.iterrows():
+            mark = self.watermarks.setdefault(network, {}).get(table)
+            time = pd.Timestamp(row['time']).strftime('%Y-%m-%d %H:%M:%S')
+            slot = int(row['slot'])
+            if mark is not None:
+                slot = max(slot, mark['slot'])
+                time = max(time, mark['time'])
+            self.watermarks[network][table] = {'slot': slot, 'time': time}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load the state written by `save`, or return an empty state if there is
+        none or it cannot be read.
+        """
+        state = cls()
+        if not os.path.exists(path):
+            return state
+        try:
+            with open(path, 'r') as f:
+                saved = json.load(f)
+            state.watermarks = saved.get('watermarks', {})
+            for table, frame in saved.get('frames', {}).items():
+                df = pd.DataFrame(frame['data'], columns=frame['columns'])
+                for column in frame.get('datetime_columns', []):
+                    df[column] = pd.to_datetime(df[column])
+                state.frames[table] = df
+            logger.info(f"Loaded ingest state from {path}")
+        except Exception as e:
+            logger.error(f"Error loading ingest state from {path}, starting cold: {e}")
+            return cls()
+        return state
+
+    def save(self, path):
+        """
+        Write the state to `path`, replacing the previous file atomically.
+        """
+        frames = {}
+        for table, df in self.frames.items():
+            datetime_columns = [c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+            out = df.astype({c: str for c in datetime_columns})
+            frames[table] = {
+                'columns': out.columns.tolist(),
+                'datetime_columns': datetime_columns,
+                'data': out.values.tolist(),
+            }
+        tmp_path = path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump({'watermarks': self.watermarks, 'frames': frames}, f, default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error saving ingest state to {path}: {e}")
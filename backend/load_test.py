@@ -0,0 +1,392 @@
+"""
+Load test of the API with many simulated dashboards polling it the way the
+frontend does.
+
+    python -m backend.load_test --clients 500 --duration 120
+    python -m backend.load_test --clients 2000 --workers 4 --worker-class eventlet --processes 4
+    python -m backend.load_test --url http://127.0.0.1:5000 --clients 200   # an already running server
+
+By default a synthetic data tree is written to a temporary directory, the
+ingest keeps writing to it at one tick per slot while the load runs, and a
+local server (gunicorn when installed, otherwise the Flask development
+server) serves it. Each simulated dashboard loads /api/networks and
+/api/clients, then polls /api/slots of its network every 12 seconds with the
+version cursor, switches networks and reloads now and then. The results are
+printed as JSON: throughput, latency percentiles, error rate and bytes, per
+endpoint and overall.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+
+try:
+    from backend import config
+    from backend.manifest import MANIFEST_FILE
+except ImportError:  # Running as a script from inside the backend directory
+    import config
+    from manifest import MANIFEST_FILE
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Polling pattern of SlotVisualization.tsx
+POLL_SECONDS = 12
+SLOT_COUNT = 20
+LIST_FIELDS = "status,seconds_in_slot"
+# Seconds to wait for the first ingest commit and for the server to answer
+STARTUP_TIMEOUT = 120
+REQUEST_TIMEOUT = 30
+
+
+def percentile(values, q):
+    """
+    Return the q-quantile of sorted `values` (nearest rank), or None if empty.
+    """
+    if not values:
+        return None
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class Connection:
+    """
+    A keep-alive HTTP/1.1 connection of one simulated browser tab. Only what
+    the API sends is understood: Content-Length, chunked and close-delimited
+    bodies.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+    async def get(self, path):
+        """
+        Return (status, headers, body) of a GET request; the body is decoded
+        from gzip if the server compressed it.
+        """
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._writer.write((f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                            f"Accept: application/json, text/plain, */*\r\n"
+                            f"Accept-Encoding: gzip\r\n\r\n").encode("ascii"))
+        try:
+            status, headers, body = await self._read_response()
+        except Exception:
+            await self.close()
+            raise
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        if headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        return status, headers, body
+
+    async def _read_response(self):
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by the server")
+        version, status = status_line.split(b" ", 2)[:2]
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if version == b"HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive":
+            headers["connection"] = "close"
+        if "content-length" in headers:
+            body = await self._reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self._reader.readline()
+                    break
+                parts.append(await self._reader.readexactly(size))
+                await self._reader.readline()
+            body = b"".join(parts)
+        else:
+            body = await self._reader.read()
+            headers["connection"] = "close"
+        return int(status), headers, body
+
+
+async def dashboard(host, port, networks, options, started, deadline, rng, samples):
+    """
+    Simulate one dashboard until `deadline` (a time.monotonic value), appending
+    (seconds since start, endpoint, latency in seconds, status or None on a
+    connection error, body bytes) to `samples` for every request.
+    """
+    connection = Connection(host, port)
+
+    async def get(endpoint, path):
+        request_started = time.monotonic()
+        try:
+            status, _, body = await asyncio.wait_for(connection.get(path), REQUEST_TIMEOUT)
+        except Exception:
+            await connection.close()
+            samples.append((request_started - started, endpoint, time.monotonic() - request_started, None, 0))
+            return None
+        samples.append((request_started - started, endpoint, time.monotonic() - request_started, status, len(body)))
+        return body if status == 200 else None
+
+    async def load_page():
+        await get("/api/networks", "/api/networks")
+        await get("/api/clients", "/api/clients")
+
+    # Dashboards are opened at random moments, not all at once
+    await asyncio.sleep(rng.uniform(0, options["interval"]))
+    network = rng.choice(networks)
+    cursor = None
+    await load_page()
+    next_poll = time.monotonic()
+    while time.monotonic() < deadline:
+        query = {"count": SLOT_COUNT}
+        if options["cursor"]:
+            query["version"] = cursor if cursor is not None else 0
+        if options["fields"]:
+            query["fields"] = options["fields"]
+        body = await get("/api/slots/<network>", f"/api/slots/{network}?{urllib.parse.urlencode(query)}")
+        if body is not None and options["cursor"]:
+            cursor = json.loads(body)["version"]
+
+        if len(networks) > 1 and rng.random() < options["switch_rate"]:
+            # The frontend loads the new network right away, starting without a cursor
+            network = rng.choice([other for other in networks if other != network])
+            cursor = None
+            continue
+        if rng.random() < options["reload_rate"]:
+            await connection.close()
+            cursor = None
+            await load_page()
+        next_poll += options["interval"]
+        now = time.monotonic()
+        if next_poll < now:
+            next_poll = now  # fell behind; poll now rather than catching up in a burst
+        await asyncio.sleep(next_poll - now)
+    await connection.close()
+
+
+def run_dashboards(host, port, networks, options, count, seed, started_at, duration):
+    """
+    Run `count` dashboards in this process; `started_at` is a time.time() value
+    shared by all processes so their samples line up. Returns the samples.
+    """
+    async def main():
+        started = time.monotonic() - (time.time() - started_at)
+        deadline = started + duration
+        samples = []
+        rng = random.Random(seed)
+        await asyncio.gather(*(dashboard(host, port, networks, options, started, deadline,
+                                         random.Random(rng.random()), samples)
+                               for _ in range(count)))
+        return samples
+    return asyncio.run(main())
+
+
+def summarize(samples, measured_seconds, warmup):
+    """
+    Reduce the samples taken after `warmup` seconds to the request rate,
+    latency percentiles (ms), error rate and bytes, per endpoint and overall.
+    Statuses other than 200 and 304, and connection errors, count as errors.
+    """
+    by_endpoint = {}
+    for offset, endpoint, latency, status, size in samples:
+        if offset >= warmup:
+            by_endpoint.setdefault(endpoint, []).append((latency, status, size))
+    by_endpoint["all"] = [sample for endpoint_samples in list(by_endpoint.values()) for sample in endpoint_samples]
+
+    summary = {}
+    for endpoint, endpoint_samples in sorted(by_endpoint.items()):
+        latencies = sorted(latency for latency, _, _ in endpoint_samples)
+        errors = sum(1 for _, status, _ in endpoint_samples if status not in (200, 304))
+        summary[endpoint] = {
+            "requests": len(endpoint_samples),
+            "throughput_rps": round(len(endpoint_samples) / measured_seconds, 2),
+            "error_rate": round(errors / len(endpoint_samples), 4) if endpoint_samples else 0,
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+            "bytes": sum(size for _, _, size in endpoint_samples),
+        }
+    return summary
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(check, what, timeout=STARTUP_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {what}")
+
+
+def server_answers(url):
+    try:
+        with urllib.request.urlopen(f"{url}/api/networks", timeout=2) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def start_ingest(data_dir, networks, args, env):
+    """
+    Start the synthetic ingest in its own process: a first tick that writes
+    `--slots` slots of history, then one tick per slot for the whole test.
+    """
+    runs = int((args.duration + args.warmup + STARTUP_TIMEOUT) / args.tick_seconds) + 1
+    command = [sys.executable, "-m", "backend.ingest_replay", "--data-dir", data_dir,
+               "--networks", ",".join(networks), "--clients", str(args.ingest_clients),
+               "--slots", str(args.slots), "--runs", str(runs), "--tick-seconds", str(args.tick_seconds),
+               "--seed", str(args.seed)]
+    return subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL)
+
+
+def start_server(port, args, env):
+    """
+    Start the API on `port` with gunicorn, or with the Flask development
+    server when gunicorn is not installed or `--server flask` is given.
+    """
+    server = args.server
+    if server == "auto":
+        try:
+            import gunicorn  # noqa: F401
+            server = "gunicorn"
+        except ImportError:
+            server = "flask"
+    if server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "--workers", str(args.workers),
+                   "--worker-class", args.worker_class, "--bind", f"127.0.0.1:{port}",
+                   "--log-level", "warning", "backend.app:app"]
+    else:
+        if args.workers != 1:
+            logger.warning("The Flask development server runs a single process; ignoring --workers")
+        command = [sys.executable, "-c",
+                   f"from backend.app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    return server, subprocess.Popen(command, cwd=REPO_DIR, env=env,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API with simulated polling dashboards.")
+    parser.add_argument("--clients", type=int, default=100, help="simulated dashboards")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=POLL_SECONDS,
+                        help="seconds of load before measuring, while dashboards open")
+    parser.add_argument("--interval", type=float, default=POLL_SECONDS, help="seconds between polls of a dashboard")
+    parser.add_argument("--switch-rate", type=float, default=0.02, help="chance per poll to switch networks")
+    parser.add_argument("--reload-rate", type=float, default=0.005, help="chance per poll to reload the page")
+    parser.add_argument("--fields", default=LIST_FIELDS, help="fields= of the slot polls ('' for all fields)")
+    parser.add_argument("--no-cursor", action="store_true", help="poll full lists instead of version cursors")
+    parser.add_argument("--processes", type=int, default=1, help="load generator processes")
+    parser.add_argument("--url", default=None, help="load an already running server instead of starting one")
+    parser.add_argument("--server", choices=["auto", "gunicorn", "flask"], default="auto")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers")
+    parser.add_argument("--worker-class", default="sync", help="gunicorn worker class, e.g. eventlet or gthread")
+    parser.add_argument("--networks", default=",".join(config.NETWORKS), help="comma-separated networks")
+    parser.add_argument("--no-ingest", action="store_true", help="serve a static tree without the ingest writing")
+    parser.add_argument("--tick-seconds", type=float, default=POLL_SECONDS, help="seconds between ingest ticks")
+    parser.add_argument("--ingest-clients", type=int, default=6, help="synthetic clients per network")
+    parser.add_argument("--slots", type=int, default=200, help="slots of synthetic history written up front")
+    parser.add_argument("--data-dir", default=None, help="keep the synthetic tree here instead of a temporary directory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    networks = [network.strip() for network in args.networks.split(",") if network.strip()]
+    options = {
+        "interval": args.interval,
+        "switch_rate": args.switch_rate,
+        "reload_rate": args.reload_rate,
+        "fields": args.fields,
+        "cursor": not args.no_cursor,
+    }
+
+    processes = []
+    work_dir = None
+    server = "external"
+    try:
+        url = args.url
+        if url is None:
+            data_dir = args.data_dir or tempfile.mkdtemp(prefix="load-test-")
+            work_dir = None if args.data_dir else data_dir
+            env = dict(os.environ, DATA_DIR=data_dir, NETWORKS=",".join(networks), LOG_LEVEL="WARNING")
+            ingest = start_ingest(data_dir, networks, args, env)
+            processes.append(ingest)
+            wait_for(lambda: all(os.path.exists(os.path.join(data_dir, network, MANIFEST_FILE))
+                                 for network in networks), "the first ingest run")
+            if args.no_ingest:
+                ingest.terminate()
+            port = free_port()
+            server, process = start_server(port, args, env)
+            processes.append(process)
+            url = f"http://127.0.0.1:{port}"
+            wait_for(lambda: server_answers(url), f"the {server} server at {url}")
+            logger.info(f"Serving {data_dir} with {server} at {url}")
+
+        parsed = urllib.parse.urlsplit(url)
+        host, port = parsed.hostname, parsed.port or 80
+        started_at = time.time()
+        length = args.warmup + args.duration
+        shares = [args.clients // args.processes + (i < args.clients % args.processes)
+                  for i in range(args.processes)]
+        logger.info(f"Running {args.clients} dashboards for {length:.0f}s in {args.processes} processes")
+        jobs = [(host, port, networks, options, share, args.seed + i, started_at, length)
+                for i, share in enumerate(shares) if share]
+        if len(jobs) == 1:
+            results = [run_dashboards(*jobs[0])]
+        else:
+            with multiprocessing.Pool(len(jobs)) as pool:
+                results = pool.starmap(run_dashboards, jobs)
+        samples = [sample for result in results for sample in result]
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps({
+        "clients": args.clients,
+        "duration_seconds": args.duration,
+        "server": server,
+        "workers": args.workers if server == "gunicorn" else 1,
+        "worker_class": args.worker_class if server == "gunicorn" else None,
+        "ingest": args.url is None and not args.no_ingest,
+        "fields": args.fields or None,
+        "cursor": options["cursor"],
+        "expected_rps": round(args.clients / args.interval, 2),
+        "endpoints": summarize(samples, args.duration, args.warmup),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+
+
+def load_manifest(network_dir):
+    """
+    Return the manifest published in `network_dir` together with the
+    modification time of its file, or (None, None) if there is none or it
+    cannot be read.
+    """
+    path = os.path.join(network_dir, MANIFEST_FILE)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+        with open(path, 'rb') as f:
+            return json.loads(f.read()), mtime_ns
+    except FileNotFoundError:
+        return None, None
+    except (OSError, ValueError) as e:
+        logger.error(f"[MANIFEST] Error reading {path}: {e}")
+        return None, None
+
+
+def update_manifest(previous, network, store, clients, statuses, slots):
+    """
+    Build the manifest of a network after an ingest run.
+
+    Parameters:
+        previous (dict): The manifest before the run, or None.
+        network (str): Network name.
+        store (SegmentStore): The network's segment store, after the run was appended.
+        clients, statuses, slots: Equal-length sequences of the (slot, client)
+                                  rows of the run.
+
+    Returns:
+        dict: Every client ever seen with the newest slot it saw a block in,
+              the stored slot range, the rows of the run by status and the
+              time of the update (epoch ms).
+    """
+    last_seen = dict(previous.get("clients", {})) if previous else {}
+    rows = {}
+    for client, status, slot in zip(clients, statuses, slots):
+        rows[status] = rows.get(status, 0) + 1
+        seen = last_seen.get(client)
+        if status != "missed" and (seen is None or slot > seen):
+            last_seen[client] = int(slot)
+        elif client not in last_seen:
+            last_seen[client] = None
+    return {
+        "network": network,
+        "clients": dict(sorted(last_seen.items())),
+        "first_slot": store.oldest(),
+        "last_slot": store.newest(),
+        "slots": len(store),
+        "rows": rows,
+        "updated_at": int(time.time() * 1000),
+    }
@@ -0,0 +1,88 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+try:
+    from backend.metrics import Counter, Histogram
+except ImportError:  # Running as a script from inside the backend directory
+    from metrics import Counter, Histogram
+
+CACHE_REQUESTS = Counter("response_cache_requests_total", "Response cache lookups, by result", ["result"])
+CACHE_BUILD_SECONDS = Histogram("response_cache_build_seconds", "Time to serialize and compress a cached response")
+
+
+class CachedBody:
+    """
+    A serialized body together with its precompressed variants and the strong
+    ETag of each representation. Payloads are serialized as compact JSON unless
+    a `dumps` callable for another `mimetype` is given.
+    """
+
+    def __init__(self, payload, mimetype='application/json', dumps=None):
+        self.mimetype = mimetype
+        if dumps is None:
+            self.body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        else:
+            self.body = dumps(payload)
+        digest = hashlib.blake2b(self.body, digest_size=16).hexdigest()
+        self.encodings = {
+            'identity': (self.body, f'"{digest}"'),
+            'gzip': (gzip.compress(self.body, compresslevel=6, mtime=0), f'"{digest}-gzip"'),
+        }
+        if brotli is not None:
+            self.encodings['br'] = (brotli.compress(self.body), f'"{digest}-br"')
+
+    def representation(self, encoding):
+        """
+        Return (body, etag) for a content encoding, falling back to identity.
+        """
+        return self.encodings.get(encoding, self.encodings['identity'])
+
+
+class ResponseCache:
+    """
+    Keeps one CachedBody per key and rebuilds it only when the version of the
+    underlying data changes. With `max_entries`, the entries built longest ago
+    are dropped once there are more than that many keys.
+    """
+
+    def __init__(self, max_entries=None):
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (version, CachedBody), oldest build first
+        self.max_entries = max_entries
+
+    def get(self, key, version, build_payload, mimetype='application/json', dumps=None):
+        """
+        Return the CachedBody for `key`, calling `build_payload()` to produce
+        a fresh payload if the cached one is older than `version`. `mimetype`
+        and `dumps` are passed on to CachedBody.
+
+        Callers must read `version` before the data `build_payload` uses, so a
+        concurrent update can only cause an extra rebuild, never a stale body.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            CACHE_REQUESTS.labels("hit").inc()
+            return entry[1]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                CACHE_REQUESTS.labels("hit").inc()
+                return entry[1]
+            CACHE_REQUESTS.labels("miss").inc()
+            started = time.perf_counter()
+            cached = CachedBody(build_payload(), mimetype, dumps)
+            CACHE_BUILD_SECONDS.observe(time.perf_counter() - started)
+            self._entries.pop(key, None)
+            self._entries[key] = (version, cached)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+            return cached
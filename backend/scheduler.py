@@ -1,53 +1,210 @@
 import time
-import subprocess
 import logging
 import os
-import sys
+import json
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from backend import config, xatu_data_prep
+    from backend.metrics import INGEST_METRICS_FILE, INGEST_REGISTRY, STAGE_BUCKETS, Counter, Histogram
+    from backend.slot_files import write_file_atomic
+except ImportError:  # Running as a script from inside the backend directory
+    import config
+    import xatu_data_prep
+    from metrics import INGEST_METRICS_FILE, INGEST_REGISTRY, STAGE_BUCKETS, Counter, Histogram
+    from slot_files import write_file_atomic
 
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=config.LOG_LEVEL,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
-def run_xatu_data_prep():
-    """Run the xatu_data_prep.py script."""
-    try:
-        logger.info("Starting xatu_data_prep.py")
-        
-        # Check if we're running on Heroku
-        is_heroku = os.environ.get('DYNO') is not None
-        
-        # Get the current directory
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        if is_heroku:
-            # On Heroku, we need to use the full path
-            logger.info("Running on Heroku")
-            subprocess.run(["python", os.path.join(current_dir, "xatu_data_prep.py")], check=True)
-        else:
-            # Locally, we can just run the script directly
-            logger.info("Running locally")
-            subprocess.run(["python", os.path.join(current_dir, "xatu_data_prep.py")], check=True)
-            
-        logger.info("xatu_data_prep.py completed successfully")
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error running xatu_data_prep.py: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error: {e}")
+# Number of recent runs kept for the timing summary
+RUN_HISTORY = 100
+
+RUNS = Counter("ingest_runs_total", "Ingest runs, by network and result", ["network", "result"],
+               registry=INGEST_REGISTRY)
+RUN_SECONDS = Histogram("ingest_run_duration_seconds", "Duration of ingest runs including state saving, by network",
+                        ["network"], buckets=STAGE_BUCKETS, registry=INGEST_REGISTRY)
+START_DELAY_SECONDS = Histogram("ingest_start_delay_seconds", "Delay between the scheduled and actual start of runs",
+                                ["network"], buckets=STAGE_BUCKETS, registry=INGEST_REGISTRY)
+OVERRUNS = Counter("ingest_overruns_total", "Runs that took longer than the interval, by network", ["network"],
+                   registry=INGEST_REGISTRY)
+SKIPPED = Counter("ingest_skipped_ticks_total", "Ticks skipped because the previous run was still going, by network",
+                  ["network"], registry=INGEST_REGISTRY)
+
+def next_run_ms(now_ms, interval_ms, offset_ms):
+    """
+    Return the first run time (epoch ms) after `now_ms` that lies `offset_ms`
+    after a multiple of `interval_ms` counted from slot 0.
+    """
+    origin = xatu_data_prep.SLOT_0_TIMESTAMP_MS + offset_ms
+    ticks = (now_ms - origin) // interval_ms + 1
+    return origin + ticks * interval_ms
+
+class NetworkWorker:
+    """
+    Ingest of a single network. Each worker has its own PyXatu client, state
+    and run history, so a slow or failing network never holds up the others.
+    """
+
+    def __init__(self, network, interval_ms):
+        self.network = network
+        self.interval_ms = interval_ms
+        self.xatu = None
+        self.runs = collections.deque(maxlen=RUN_HISTORY)
+        self.failures = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.state_path = xatu_data_prep.get_state_path(network)
+        self.state = xatu_data_prep.IngestState.load(self.state_path)
+
+    def run_once(self, scheduled_ms):
+        """
+        Run the pipeline once for this network and record how long it took.
+        """
+        started_ms = time.time() * 1000
+        record = {
+            "scheduled_ms": scheduled_ms,
+            "start_delay_ms": round(started_ms - scheduled_ms, 1),
+            "ok": True,
+        }
+        try:
+            if self.xatu is None:
+                self.xatu = xatu_data_prep.create_client()
+            record["timings"] = xatu_data_prep.run(self.xatu, self.state, [self.network])
+            self.state.save(self.state_path)
+        except Exception as e:
+            logger.error(f"Error running ingest for {self.network}: {e}")
+            record["ok"] = False
+            record["error"] = str(e)
+            self.failures += 1
+            # Start over with a fresh client in case the connection went bad,
+            # and from the last state that was saved after a successful run
+            self.xatu = None
+            self.state = xatu_data_prep.IngestState.load(self.state_path)
+        duration_ms = time.time() * 1000 - started_ms
+        record["duration_ms"] = round(duration_ms, 1)
+        record["budget_used"] = round(duration_ms / self.interval_ms, 3)
+        if duration_ms > self.interval_ms:
+            self.overruns += 1
+            OVERRUNS.labels(self.network).inc()
+        self.runs.append(record)
+        RUNS.labels(self.network, "ok" if record["ok"] else "error").inc()
+        RUN_SECONDS.labels(self.network).observe(duration_ms / 1000)
+        START_DELAY_SECONDS.labels(self.network).observe(max(record["start_delay_ms"], 0) / 1000)
+
+        logger.info(f"Ingest run for {self.network} finished in {duration_ms / 1000:.2f}s "
+                    f"({record['budget_used'] * 100:.0f}% of the {self.interval_ms / 1000:.0f}s budget), "
+                    f"stages: { {k: round(v, 3) for k, v in record.get('timings', {}).items()} }")
+
+    def status(self):
+        """
+        Summarize the recent runs.
+        """
+        durations = sorted(run["duration_ms"] for run in self.runs)
+        summary = {
+            "runs": len(self.runs),
+            "failures": self.failures,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "last_run": self.runs[-1] if self.runs else None,
+        }
+        if durations:
+            summary["duration_ms"] = {
+                "mean": round(sum(durations) / len(durations), 1),
+                "p50": durations[len(durations) // 2],
+                "max": durations[-1],
+            }
+        return summary
+
+class IngestService:
+    """
+    Long-running ingest loop. Keeps one warm worker per network and starts
+    their runs on the slot clock instead of sleeping a fixed time after the
+    previous run finished. The networks run concurrently on a thread pool;
+    their time is mostly spent waiting on ClickHouse.
+    """
+
+    def __init__(self, interval_ms, offset_ms, networks=None):
+        if networks is None:
+            networks = xatu_data_prep.NETWORKS
+        self.interval_ms = interval_ms
+        self.offset_ms = offset_ms
+        self.workers = {network: NetworkWorker(network, interval_ms) for network in networks}
+        self.pool = ThreadPoolExecutor(max_workers=max(len(networks), 1), thread_name_prefix="ingest")
+        self.pending = {}  # network -> Future of the run in progress
+        self.status_lock = threading.Lock()
+        self.status_path = os.path.join(xatu_data_prep.get_data_dir(), "ingest_status.json")
+
+    def tick(self, scheduled_ms):
+        """
+        Start a run of every network whose previous run has finished. A network
+        that is still busy skips this tick without delaying the others.
+        """
+        for network, worker in self.workers.items():
+            future = self.pending.get(network)
+            if future is not None and not future.done():
+                worker.skipped += 1
+                SKIPPED.labels(network).inc()
+                logger.warning(f"Previous ingest run for {network} is still in progress, skipping this tick")
+                continue
+            future = self.pool.submit(worker.run_once, scheduled_ms)
+            future.add_done_callback(lambda _: self.write_status())
+            self.pending[network] = future
+
+    def status(self):
+        """
+        Summarize the recent runs of every network.
+        """
+        return {
+            "interval_ms": self.interval_ms,
+            "offset_ms": self.offset_ms,
+            "networks": {network: worker.status() for network, worker in self.workers.items()},
+        }
+
+    def write_status(self):
+        """
+        Publish the run summary next to the slot data so it can be inspected
+        without attaching to the process, along with the ingest metrics the
+        API appends to its /metrics.
+        """
+        tmp_path = self.status_path + ".tmp"
+        with self.status_lock:
+            try:
+                os.makedirs(os.path.dirname(self.status_path), exist_ok=True)
+                with open(tmp_path, 'w') as f:
+                    json.dump(self.status(), f)
+                os.replace(tmp_path, self.status_path)
+                write_file_atomic(os.path.join(os.path.dirname(self.status_path), INGEST_METRICS_FILE),
+                                  INGEST_REGISTRY.render().encode('utf-8'))
+            except Exception as e:
+                logger.error(f"Error writing ingest status: {e}")
+
+    def serve_forever(self):
+        """
+        Start the runs on every tick of the slot clock.
+        """
+        while True:
+            scheduled_ms = next_run_ms(time.time() * 1000, self.interval_ms, self.offset_ms)
+            time.sleep(max(scheduled_ms - time.time() * 1000, 0) / 1000)
+            self.tick(scheduled_ms)
 
 def main():
     """Main function to run the scheduler."""
     # Get the interval from environment variable or use default (12 seconds)
     interval = int(os.environ.get("XATU_UPDATE_INTERVAL", 12))
-    
-    logger.info(f"Starting scheduler with interval of {interval} seconds")
-    
-    while True:
-        run_xatu_data_prep()
-        logger.info(f"Sleeping for {interval} seconds")
-        time.sleep(interval)
+    # Start each run this far into the slot, once most clients have seen the block
+    offset_ms = int(os.environ.get("XATU_SLOT_OFFSET_MS", 4000))
+
+    logger.info(f"Starting scheduler with interval of {interval} seconds, {offset_ms} ms into each slot, "
+                f"networks: {xatu_data_prep.NETWORKS}")
+
+    IngestService(interval * 1000, offset_ms).serve_forever()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,363 @@
+import os
+import bisect
+import json
+import logging
+import threading
+
+try:
+    from backend.metrics import Counter
+    from backend.slot_files import COMMIT_MARKER, read_commit_marker, write_commit_marker, write_file_atomic
+except ImportError:  # Running as a script from inside the backend directory
+    from metrics import Counter
+    from slot_files import COMMIT_MARKER, read_commit_marker, write_commit_marker, write_file_atomic
+
+logger = logging.getLogger(__name__)
+
+# Number of consecutive slots stored in one segment file (256 slots ~ 51 minutes)
+SEGMENT_SLOTS = int(os.environ.get("SEGMENT_SLOTS", 256))
+# How many slots behind the newest one are kept before whole segments are deleted
+SEGMENT_RETENTION_SLOTS = int(os.environ.get("SEGMENT_RETENTION_SLOTS", 7200))
+SEGMENT_SUFFIX = ".seg"
+
+SEGMENT_READS = Counter("segment_reads_total", "Slot records read from segment files")
+SEGMENT_READ_BYTES = Counter("segment_read_bytes_total", "Bytes of slot records read from segment files")
+
+
+def parse_segment_filename(name):
+    """
+    Return the first slot of a '<first_slot>.seg' file name, or None if the name
+    does not look like a segment file.
+    """
+    stem, ext = os.path.splitext(name)
+    if ext != SEGMENT_SUFFIX or not stem.isdigit():
+        return None
+    return int(stem)
+
+
+def encode_record(slot, revision, body):
+    """
+    Encode one slot record: '<slot>\\t<revision>\\t<compact JSON body>\\n'.
+    """
+    return b"%d\t%d\t" % (slot, revision) + body + b"\n"
+
+
+class Segment:
+    """
+    One segment file as seen by the index. A segment object belongs to a
+    single inode: a compacted file replaces the object rather than updating it.
+    """
+
+    def __init__(self, first_slot, path, file, inode):
+        self.first_slot = first_slot
+        self.path = path
+        self.file = file     # kept open so reads keep working across a compaction
+        self.inode = inode
+        self.size = 0        # bytes indexed so far, always at a record boundary
+        self.records = 0     # records indexed, including superseded ones
+        self.slots = set()   # slots whose newest record lives in this segment
+
+
+class SegmentStore:
+    """
+    Append-only storage for the slots of one network.
+
+    Slots are appended as records to segment files that each cover
+    `segment_slots` consecutive slots; rewriting a slot appends a new record
+    and the newest record wins. An in-memory index maps every slot to the
+    segment, offset and length of its newest record and keeps the slot numbers
+    sorted, so reading the latest N slots or a slot range costs O(N) regardless
+    of how much history is on disk.
+
+    The index is built by reading the segments once and afterwards only reads
+    bytes appended since the previous refresh. Records are only indexed up to
+    the last complete line, so a reader never sees a partial append.
+
+    A single writer (the ingest) appends, compacts segments that hold
+    superseded records and deletes segments that fell out of the retention
+    window; any number of readers (the API workers) call `refresh`.
+    """
+
+    def __init__(self, directory, segment_slots=SEGMENT_SLOTS, retention_slots=SEGMENT_RETENTION_SLOTS):
+        self.directory = directory
+        self.segment_slots = segment_slots
+        self.retention_slots = retention_slots
+        self._lock = threading.Lock()
+        self._commit = None  # (mtime_ns, inode) of the last commit marker seen
+        self._segments = {}  # first slot -> Segment
+        self._index = {}     # slot -> (segment, offset, length, revision)
+        self._slots = []     # indexed slot numbers, ascending
+        self.highest_revision = 0  # highest record revision seen, never decreases
+
+    def __len__(self):
+        return len(self._slots)
+
+    def segment_start(self, slot):
+        return slot - slot % self.segment_slots
+
+    def newest(self):
+        """
+        Return the newest stored slot, or None if the store is empty.
+        """
+        slots = self._slots
+        return slots[-1] if slots else None
+
+    def oldest(self):
+        """
+        Return the oldest stored slot, or None if the store is empty.
+        """
+        slots = self._slots
+        return slots[0] if slots else None
+
+    def revision(self, slot):
+        """
+        Return the revision of the newest record of `slot`, or None if the slot
+        is not stored.
+        """
+        entry = self._index.get(slot)
+        return entry[3] if entry is not None else None
+
+    def latest_slots(self, count):
+        """
+        Return the newest `count` slot numbers, newest first.
+        """
+        if count <= 0:
+            return []
+        return self._slots[-count:][::-1]
+
+    def slots_between(self, start, end):
+        """
+        Return the stored slot numbers in [start, end], ascending.
+        """
+        slots = self._slots
+        return slots[bisect.bisect_left(slots, start):bisect.bisect_right(slots, end)]
+
+    def read_raw(self, slot):
+        """
+        Return the JSON bytes of `slot`, or None if it is not stored.
+        """
+        entry = self._index.get(slot)
+        if entry is None:
+            return None
+        segment, offset, length, _ = entry
+        SEGMENT_READS.inc()
+        SEGMENT_READ_BYTES.inc(length)
+        return os.pread(segment.file.fileno(), length, offset)
+
+    def iter_range(self, start, end):
+        """
+        Yield (slot, JSON bytes) for the stored slots in [start, end], ascending,
+        one slot at a time. The position is looked up again for every slot, so
+        slots added or removed by a concurrent refresh never break the iteration.
+        """
+        slot = start - 1
+        while True:
+            slots = self._slots
+            position = bisect.bisect_right(slots, slot)
+            if position >= len(slots) or slots[position] > end:
+                return
+            slot = slots[position]
+            body = self.read_raw(slot)
+            if body is not None:
+                yield slot, body
+
+    def read(self, slot):
+        """
+        Return the parsed data of `slot`, or None if it is not stored.
+        """
+        body = self.read_raw(slot)
+        return json.loads(body) if body is not None else None
+
+    def refresh(self):
+        """
+        Bring the index up to date with the directory. When the ingest has not
+        published a commit since the last refresh this is a single stat.
+
+        Returns (updated, removed): the slots whose newest record changed and
+        the slots that are no longer stored.
+        """
+        with self._lock:
+            try:
+                stat = os.stat(os.path.join(self.directory, COMMIT_MARKER))
+                commit = (stat.st_mtime_ns, stat.st_ino)  # the marker is replaced, not rewritten
+            except FileNotFoundError:
+                commit = None
+            if commit is not None and commit == self._commit:
+                return [], []
+            self._commit = commit
+            return self._scan()
+
+    def _scan(self):
+        touched = {}  # slot -> revision before this scan (None if it was not stored)
+        # Listed on every scan: scans only happen once per commit, and directory
+        # mtimes are too coarse to reliably announce a new segment
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            names = []
+        present = set()
+        for name in names:
+            first_slot = parse_segment_filename(name)
+            if first_slot is not None:
+                present.add(first_slot)
+        for first_slot in list(self._segments):
+            if first_slot not in present:
+                self._drop_segment(self._segments[first_slot], touched)
+        for first_slot in present - set(self._segments):
+            self._open_segment(first_slot)
+
+        for first_slot in list(self._segments):
+            segment = self._segments[first_slot]
+            try:
+                stat = os.stat(segment.path)
+            except FileNotFoundError:
+                self._drop_segment(segment, touched)
+                continue
+            if stat.st_ino != segment.inode or stat.st_size < segment.size:
+                # Compacted (or truncated) by the writer; index the new file from scratch
+                self._drop_segment(segment, touched)
+                segment = self._open_segment(first_slot)
+                if segment is None:
+                    continue
+            self._tail(segment, touched)
+
+        updated = []
+        removed = []
+        for slot, revision in touched.items():
+            entry = self._index.get(slot)
+            if entry is None:
+                if revision is not None:
+                    removed.append(slot)
+            elif entry[3] != revision:
+                updated.append(slot)
+        if len(self._slots) != len(self._index):
+            self._slots = [slot for slot in self._slots if slot in self._index]
+        return sorted(updated), sorted(removed)
+
+    def _open_segment(self, first_slot):
+        path = os.path.join(self.directory, f"{first_slot}{SEGMENT_SUFFIX}")
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        segment = Segment(first_slot, path, file, os.fstat(file.fileno()).st_ino)
+        self._segments[first_slot] = segment
+        return segment
+
+    def _drop_segment(self, segment, touched):
+        for slot in segment.slots:
+            touched.setdefault(slot, self._index[slot][3])
+            del self._index[slot]
+        del self._segments[segment.first_slot]
+        # The file object is closed once no reader holds an index entry for it
+
+    def _tail(self, segment, touched):
+        size = os.fstat(segment.file.fileno()).st_size
+        if size <= segment.size:
+            return
+        chunk = os.pread(segment.file.fileno(), size - segment.size, segment.size)
+        end = chunk.rfind(b"\n") + 1  # only index complete records
+        position = 0
+        while position < end:
+            line_end = chunk.index(b"\n", position)
+            try:
+                slot_field, revision_field, _ = chunk[position:line_end].split(b"\t", 2)
+                slot = int(slot_field)
+                revision = int(revision_field)
+                body_start = position + len(slot_field) + len(revision_field) + 2
+            except ValueError:
+                logger.error(f"[STORE] Skipping corrupt record in {segment.path} "
+                             f"at offset {segment.size + position}")
+                position = line_end + 1
+                continue
+            previous = self._index.get(slot)
+            touched.setdefault(slot, previous[3] if previous is not None else None)
+            if previous is None:
+                if touched[slot] is None:  # otherwise still listed from before this scan
+                    bisect.insort(self._slots, slot)
+            elif previous[0] is not segment:
+                previous[0].slots.discard(slot)
+            self._index[slot] = (segment, segment.size + body_start, line_end - body_start, revision)
+            self.highest_revision = max(self.highest_revision, revision)
+            segment.slots.add(slot)
+            segment.records += 1
+            position = line_end + 1
+        segment.size += end
+
+    def append(self, bodies, revision=None):
+        """
+        Append `bodies` ({ slot: JSON bytes }) to their segments, apply the
+        retention policy, compact segments with superseded records and publish
+        the batch with a commit marker. Only the writer calls this.
+
+        The records are stamped with `revision`, by default the sequence number
+        of this commit: one more than the previous commit and than any record
+        stored, so revisions stay small enough for clients to hold exactly.
+
+        Returns the commit sequence number, or None if there was nothing to write.
+        """
+        if not bodies:
+            return None
+        with self._lock:
+            self._scan()
+            if revision is None:
+                marker = read_commit_marker(self.directory)
+                sequence = marker[1].get("sequence", 0) if marker is not None else 0
+                revision = max(sequence, self.highest_revision) + 1
+            os.makedirs(self.directory, exist_ok=True)
+            by_segment = {}
+            for slot in sorted(bodies):
+                by_segment.setdefault(self.segment_start(slot), []).append(slot)
+            for first_slot, slots in by_segment.items():
+                path = os.path.join(self.directory, f"{first_slot}{SEGMENT_SUFFIX}")
+                segment = self._segments.get(first_slot)
+                if segment is not None and os.path.getsize(path) > segment.size:
+                    # Left over from an interrupted append; drop the partial record
+                    os.truncate(path, segment.size)
+                with open(path, 'ab') as f:
+                    f.write(b"".join(encode_record(slot, revision, bodies[slot]) for slot in slots))
+                os.chmod(path, 0o644)
+            self._scan()
+            self._expire()
+            self._compact()
+            return write_commit_marker(self.directory, list(bodies), revision)
+
+    def _expire(self):
+        """
+        Delete the segments that lie entirely outside the retention window.
+        """
+        newest = self.newest()
+        if newest is None:
+            return
+        cutoff = newest - self.retention_slots
+        expired = [segment for segment in self._segments.values()
+                   if segment.first_slot + self.segment_slots <= cutoff]
+        for segment in expired:
+            logger.info(f"[STORE] Deleting expired segment {segment.path}")
+            os.remove(segment.path)
+        if expired:
+            self._scan()
+
+    def _compact(self):
+        """
+        Rewrite the segments that hold superseded records so they keep only
+        the newest record of each slot. The segment of the newest slot is still
+        being written to and is left alone.
+        """
+        newest = self.newest()
+        if newest is None:
+            return
+        compacted = False
+        for segment in list(self._segments.values()):
+            if segment.first_slot == self.segment_start(newest) or segment.records == len(segment.slots):
+                continue
+            records = []
+            for slot in sorted(segment.slots):
+                _, offset, length, revision = self._index[slot]
+                body = os.pread(segment.file.fileno(), length, offset)
+                records.append(encode_record(slot, revision, body))
+            logger.info(f"[STORE] Compacting {segment.path}: "
+                        f"{segment.records - len(segment.slots)} superseded records")
+            write_file_atomic(segment.path, b"".join(records))
+            compacted = True
+        if compacted:
+            self._scan()
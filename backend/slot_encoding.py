@@ -0,0 +1,98 @@
+import json
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, JSON is always available
+    msgpack = None
+
+# Fields of one client's entry in a slot, as written by the ingest
+SLOT_FIELDS = (
+    "attestation_count", "attestation_percentage", "head_vote", "target_vote", "source_vote",
+    "reorg", "slot", "network", "client", "timestamp", "status", "hash", "parent_hash",
+    "timestamp_seconds", "seconds_in_slot",
+)
+# Fields every entry of a columnar response already implies through its position
+IMPLIED_FIELDS = ("slot", "network", "client")
+
+JSON_MIMETYPE = "application/json"
+# Same slots as parallel arrays: "slots", "clients" and one slot x client matrix per field
+COLUMNAR_MIMETYPE = "application/vnd.slots.columnar+json"
+MSGPACK_MIMETYPE = "application/msgpack"
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, "application/x-msgpack")
+
+
+def parse_fields(value):
+    """
+    Parse a comma-separated `fields` parameter into a tuple of field names,
+    or None if all fields were asked for. Raises ValueError on unknown fields.
+    """
+    if value is None:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in SLOT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown}. Choose from {list(SLOT_FIELDS)}")
+    return fields or None
+
+
+def negotiate(accept):
+    """
+    Return the response format preferred by a request's Accept header among
+    JSON, columnar JSON and (if installed) MessagePack. JSON wins ties.
+    """
+    offered = [JSON_MIMETYPE, COLUMNAR_MIMETYPE]
+    if msgpack is not None:
+        offered.extend(MSGPACK_MIMETYPES)
+    mimetype = accept.best_match(offered, default=JSON_MIMETYPE)
+    return MSGPACK_MIMETYPE if mimetype in MSGPACK_MIMETYPES else mimetype
+
+
+def project(entry, fields):
+    """
+    Return a {"slot", "data"} entry with only `fields` kept for every client.
+    """
+    if fields is None:
+        return entry
+    return {
+        "slot": entry["slot"],
+        "data": {client: {field: values[field] for field in fields if field in values}
+                 for client, values in entry["data"].items()},
+    }
+
+
+def to_columns(entries, fields=None):
+    """
+    Lay out {"slot", "data"} entries as columns: "slots" in the order given,
+    "clients" sorted, and for every field a list per slot of one value per
+    client, null where the client has no row in that slot.
+    """
+    clients = sorted({client for entry in entries for client in entry["data"]})
+    if fields is None:
+        fields = [field for field in SLOT_FIELDS if field not in IMPLIED_FIELDS]
+    rows = [[entry["data"].get(client) for client in clients] for entry in entries]
+    return {
+        "slots": [entry["slot"] for entry in entries],
+        "clients": clients,
+        "fields": {field: [[values.get(field) if values is not None else None for values in row]
+                           for row in rows]
+                   for field in fields},
+    }
+
+
+def slot_payload(entries, fields, mimetype):
+    """
+    Return the payload of a list of {"slot", "data"} entries for a response
+    format: the projected entries, or their columns for the columnar format.
+    """
+    if mimetype == COLUMNAR_MIMETYPE:
+        return to_columns(entries, fields)
+    return [project(entry, fields) for entry in entries]
+
+
+def dumps(payload, mimetype):
+    """
+    Serialize a payload in a response format.
+    """
+    if mimetype == MSGPACK_MIMETYPE:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
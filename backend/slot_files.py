@@ -0,0 +1,96 @@
+import os
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; writers are then not serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Written to a network directory after every ingest run that stored new records
+COMMIT_MARKER = "_commit.json"
+# Locked by a process while it writes to a network directory
+WRITER_LOCK = ".writer.lock"
+
+
+def write_file_atomic(file_path, body, mode=0o644):
+    """
+    Write `body` to a hidden temp file next to `file_path` and rename it into
+    place, so readers see either the old or the new file, never a partial one.
+    """
+    directory, name = os.path.split(file_path)
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(body)
+    try:
+        os.chmod(tmp_path, mode)
+    except Exception as e:
+        logger.error(f"Error setting permissions on file {tmp_path}: {e}")
+    os.replace(tmp_path, file_path)
+
+
+def file_version(file_path):
+    """
+    Return (mtime_ns, inode) of a file, which changes whenever it is replaced
+    by write_file_atomic, or None if there is no such file.
+    """
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_ino
+
+
+def read_commit_marker(network_dir):
+    """
+    Return (mtime_ns, marker) for the commit marker of a network directory, or
+    None if there is no readable marker.
+    """
+    marker_path = os.path.join(network_dir, COMMIT_MARKER)
+    try:
+        mtime = os.stat(marker_path).st_mtime_ns
+        with open(marker_path, 'r') as f:
+            return mtime, json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_commit_marker(network_dir, slots, sequence=None):
+    """
+    Publish the slots written by one ingest run. The marker carries a sequence
+    number that grows with every commit, by one unless the writer passes its
+    own `sequence`, so readers can tell whether they saw every commit or have
+    to rescan the directory.
+    """
+    if sequence is None:
+        previous = read_commit_marker(network_dir)
+        sequence = previous[1].get("sequence", 0) + 1 if previous is not None else 1
+    marker = {
+        "sequence": sequence,
+        "committed_at": int(time.time() * 1000),
+        "slots": sorted(slots),
+    }
+    write_file_atomic(os.path.join(network_dir, COMMIT_MARKER), json.dumps(marker).encode('utf-8'))
+    return sequence
+
+
+@contextmanager
+def writer_lock(network_dir):
+    """
+    Hold the writer lock of a network directory, so the scheduler and a
+    backfill running next to it never write to the same stores at once.
+    The stores rescan what the other process wrote before they append.
+    """
+    os.makedirs(network_dir, exist_ok=True)
+    with open(os.path.join(network_dir, WRITER_LOCK), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,213 @@
+import os
+import logging
+import threading
+import time
+
+try:
+    from backend.manifest import MANIFEST_FILE, load_manifest
+    from backend.segment_store import SegmentStore
+except ImportError:  # Running as a script from inside the backend directory
+    from manifest import MANIFEST_FILE, load_manifest
+    from segment_store import SegmentStore
+
+logger = logging.getLogger(__name__)
+
+# How many of the newest slots each network keeps in memory
+SLOT_INDEX_CAPACITY = int(os.environ.get("SLOT_INDEX_CAPACITY", 128))
+# How often (in seconds) the watcher checks the data directories for changes
+SLOT_INDEX_POLL_INTERVAL = float(os.environ.get("SLOT_INDEX_POLL_INTERVAL", 1.0))
+
+
+class SlotIndex:
+    """
+    In-memory index of the newest slots of one network.
+
+    The index holds already-parsed slot dicts sorted by slot number (descending)
+    and is refreshed from the network's segment store by `refresh`. Readers never
+    touch the filesystem: `latest` slices an immutable list that `refresh` swaps
+    in atomically, so no lock is needed on the read path.
+
+    Every slot carries a revision: the revision of the store record in which its
+    content last changed. Revisions are the commit sequence numbers of the
+    store rather than a counter of this process, so every process reading the
+    same directory agrees on them, which makes `revision` usable as a
+    client-side cursor. They stay far below 2**53, so JavaScript clients hold
+    them exactly.
+
+    `store` stays available for reads outside the in-memory window, and
+    `manifest` holds the manifest the ingest last published for the network.
+    """
+
+    def __init__(self, network, network_dir, capacity=SLOT_INDEX_CAPACITY):
+        self.network = network
+        self.network_dir = network_dir
+        self.capacity = capacity
+        self.store = SegmentStore(network_dir)
+        self._lock = threading.Lock()
+        self._data = {}      # slot -> parsed slot dict
+        self._revisions = {}  # slot -> revision of the slot
+        # ([{"slot": slot, "data": data}, ...], [revision, ...]), both newest first
+        self._view = ([], [])
+        self.version = 0     # bumped every time the content of the index changes
+        self.revision = 0    # highest slot revision seen, never decreases
+        self.manifest = None  # latest manifest.json of the network, None until one is published
+        self._manifest_mtime = None
+
+    def get(self, slot):
+        """
+        Return the parsed data of a single slot, or None if it is not indexed.
+        """
+        return self._data.get(slot)
+
+    def latest(self, count):
+        """
+        Return the newest `count` slots as a list of {"slot", "data"} dicts.
+        """
+        entries = self._view[0]
+        return entries[:max(count, 0)]
+
+    def changes(self, count, since_slot=None, since_revision=None):
+        """
+        Return the slots among the newest `count` that are newer than
+        `since_slot` or whose revision is newer than `since_revision`.
+        """
+        entries, revisions = self._view
+        count = max(count, 0)
+        return [entry for entry, revision in zip(entries[:count], revisions[:count])
+                if (since_slot is not None and entry["slot"] > since_slot)
+                or (since_revision is not None and revision > since_revision)]
+
+    def __len__(self):
+        return len(self._view[0])
+
+    def refresh_manifest(self):
+        """
+        Reload the manifest if the ingest published a new one; otherwise this
+        is a single stat. Returns whether the manifest changed.
+        """
+        try:
+            mtime_ns = os.stat(os.path.join(self.network_dir, MANIFEST_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime_ns == self._manifest_mtime:
+            return False
+        manifest, mtime_ns = load_manifest(self.network_dir)
+        if manifest is None:
+            return False
+        self.manifest, self._manifest_mtime = manifest, mtime_ns
+        return True
+
+    def refresh(self):
+        """
+        Bring the index up to date with the segment store. Only slots the store
+        reports as updated are read and parsed again. Returns the list of slot
+        numbers whose data changed.
+        """
+        self.refresh_manifest()
+        with self._lock:
+            updated, removed = self.store.refresh()
+            if not updated and not removed:
+                return []
+            updated = set(updated)
+
+            changed = []
+            data = {}
+            revisions = {}
+            for slot in self.store.latest_slots(self.capacity):
+                if slot in self._data and slot not in updated:
+                    data[slot] = self._data[slot]
+                    revisions[slot] = self._revisions[slot]
+                    continue
+                try:
+                    slot_data = self.store.read(slot)
+                except Exception as e:
+                    logger.error(f"[INDEX] Error loading slot {slot} of {self.network}: {str(e)}")
+                    slot_data = None
+                if slot_data is None:
+                    # Keep serving the previous version of the slot, if any
+                    if slot in self._data:
+                        data[slot] = self._data[slot]
+                        revisions[slot] = self._revisions[slot]
+                    continue
+                if not slot_data:
+                    continue
+                if slot_data == self._data.get(slot):
+                    # Rewritten without any change; keep the old revision
+                    data[slot] = self._data[slot]
+                    revisions[slot] = self._revisions[slot]
+                    continue
+                data[slot] = slot_data
+                revisions[slot] = self.store.revision(slot)
+                changed.append(slot)
+
+            dropped = set(self._data) - set(data)
+            if changed or dropped:
+                self._data = data
+                self._revisions = revisions
+                order = sorted(data, reverse=True)
+                self._view = ([{"slot": slot, "data": data[slot]} for slot in order],
+                              [revisions[slot] for slot in order])
+                if changed:
+                    self.revision = max(self.revision, max(revisions[slot] for slot in changed))
+                self.version += 1
+                logger.debug(f"[INDEX] {self.network}: {len(changed)} slots updated, "
+                             f"{len(dropped)} dropped, {len(order)} in memory")
+            return changed
+
+
+_indexes = {}
+_listeners = []
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def get_index(network):
+    """
+    Return the process-wide index for `network`, or None if it is not watched.
+    """
+    return _indexes.get(network)
+
+
+def add_listener(callback):
+    """
+    Register `callback(index, changed_slots)`, called from the watcher thread
+    whenever a refresh picks up new or rewritten slots.
+    """
+    _listeners.append(callback)
+
+
+def _watch(interval):
+    while True:
+        for index in list(_indexes.values()):
+            try:
+                changed = index.refresh()
+            except Exception as e:
+                logger.error(f"[INDEX] Error refreshing {index.network}: {str(e)}")
+                continue
+            if not changed:
+                continue
+            for callback in _listeners:
+                try:
+                    callback(index, changed)
+                except Exception as e:
+                    logger.error(f"[INDEX] Error in listener for {index.network}: {str(e)}")
+        time.sleep(interval)
+
+
+def start_watcher(data_dir, networks, interval=SLOT_INDEX_POLL_INTERVAL):
+    """
+    Build an index for each network, load it once and start the background
+    thread that keeps it current. Calling this again is a no-op.
+    """
+    global _watcher
+    with _watcher_lock:
+        if _watcher is not None:
+            return
+        for network in networks:
+            index = SlotIndex(network, os.path.join(data_dir, network))
+            index.refresh()
+            _indexes[network] = index
+            logger.info(f"[INDEX] Loaded {len(index)} slots for {network}")
+        _watcher = threading.Thread(target=_watch, args=(interval,),
+                                    name="slot-index-watcher", daemon=True)
+        _watcher.start()
@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+try:
+    from backend.column_store import NO_TIMESTAMP, STATUSES
+    from backend.slot_files import file_version, write_file_atomic
+    from backend.slot_stats import STATS_BIN_MS, STATS_BINS, ClientAggregate
+except ImportError:  # Running as a script from inside the backend directory
+    from column_store import NO_TIMESTAMP, STATUSES
+    from slot_files import file_version, write_file_atomic
+    from slot_stats import STATS_BIN_MS, STATS_BINS, ClientAggregate
+
+logger = logging.getLogger(__name__)
+
+# Rollup tiers and the number of slots each of their buckets covers
+ROLLUP_TIERS = {"epoch": 32, "hour": 300}
+# Finalized buckets kept per tier (a week of epochs, 90 days of hours)
+ROLLUP_RETENTION = {
+    "epoch": int(os.environ.get("ROLLUP_EPOCH_RETENTION", 1575)),
+    "hour": int(os.environ.get("ROLLUP_HOUR_RETENTION", 2160)),
+}
+# Buckets served when no count is asked for: a day of epochs, a week of hours
+ROLLUP_DEFAULT_COUNT = {"epoch": 225, "hour": 168}
+# Slots behind the newest one after which a row is no longer rewritten by the ingest
+ROLLUP_FINALITY_SLOTS = int(os.environ.get("ROLLUP_FINALITY_SLOTS", 64))
+ROLLUPS_DIR = "rollups"
+PRODUCED = STATUSES.index("produced") + 1
+
+
+def rollup_paths(network_dir, tier):
+    """
+    Return the files of a tier: (finalized buckets, buckets still open).
+    """
+    directory = os.path.join(network_dir, ROLLUPS_DIR)
+    return os.path.join(directory, f"{tier}.json"), os.path.join(directory, f"{tier}.open.json")
+
+
+def aggregate_rows(rows, clients, bucket_slots):
+    """
+    Summarize column history rows per bucket and client.
+
+    Parameters:
+        rows (dict): Rows as returned by ColumnStore.read.
+        clients (list): Client names of the store, code = position + 1.
+        bucket_slots (int): Slots per bucket.
+
+    Returns:
+        dict: { first slot of the bucket: { client: ClientAggregate.summary() } }
+    """
+    present = rows["status"] != 0
+    codes = rows["client"][present].astype(np.int64)
+    statuses = rows["status"][present].astype(np.int64)
+    ms_in_slot = rows["ms_in_slot"][present].astype(np.int64)
+    buckets = rows["slot"][present] // bucket_slots
+    groups, group_ids = np.unique(buckets * (len(clients) + 1) + codes, return_inverse=True)
+    group_ids = group_ids.reshape(-1)
+    width = len(STATUSES) + 1
+    counts = np.bincount(group_ids * width + statuses, minlength=len(groups) * width).reshape(-1, width)
+    # Same binning as ClientAggregate.add, for every produced row at once
+    seen = (statuses == PRODUCED) & (ms_in_slot != NO_TIMESTAMP)
+    bins = np.clip(ms_in_slot[seen] // STATS_BIN_MS, 0, STATS_BINS - 1)
+    histograms = np.bincount(group_ids[seen] * STATS_BINS + bins,
+                             minlength=len(groups) * STATS_BINS).reshape(-1, STATS_BINS)
+    total_ms = np.bincount(group_ids[seen], weights=ms_in_slot[seen], minlength=len(groups))
+
+    result = {}
+    for i, group in enumerate(groups.tolist()):
+        bucket, code = divmod(group, len(clients) + 1)
+        aggregate = ClientAggregate()
+        aggregate.histogram = histograms[i]
+        aggregate.total_ms = int(total_ms[i])
+        aggregate.statuses = dict(zip(STATUSES, counts[i, 1:].tolist()))
+        result.setdefault(bucket * bucket_slots, {})[clients[code - 1]] = aggregate.summary()
+    return result
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"[ROLLUP] Error reading {path}: {e}")
+        return None
+
+
+class SlotRollups:
+    """
+    Downsampled per-client summaries of one network: produced, missed and
+    reorged counts and the seconds_in_slot distribution of every epoch and
+    every hour, so long-window views are served from a few hundred rows.
+
+    A bucket is finalized once its last slot is ROLLUP_FINALITY_SLOTS behind
+    the newest one; it is then summarized once from the column history and
+    appended to the tier's file, which is only rewritten when a bucket
+    finalizes. The buckets that can still change are summarized again on
+    every run into a small separate file. After a restart the finalized
+    buckets are loaded from disk and the ones missed in between are caught up
+    from the column history. A backfill writing rows behind finalized
+    buckets summarizes them again with `resummarize`; the other process picks
+    the rewritten file up on its next update.
+    """
+
+    def __init__(self, network, network_dir, tiers=ROLLUP_TIERS, retention=ROLLUP_RETENTION,
+                 finality_slots=ROLLUP_FINALITY_SLOTS):
+        self.network = network
+        self.network_dir = network_dir
+        self.tiers = dict(tiers)
+        self.retention = dict(retention)
+        self.finality_slots = finality_slots
+        self.newest = None
+        self._final = {}  # tier -> [bucket, ...] ascending by start slot
+        self._versions = {}  # tier -> (mtime_ns, inode) of the finalized file as last read or written
+        for tier in self.tiers:
+            self._load(tier)
+
+    def _load(self, tier):
+        """
+        Read the finalized buckets of a tier unless the file is unchanged since
+        it was last read or written by this instance.
+        """
+        final_path = rollup_paths(self.network_dir, tier)[0]
+        version = file_version(final_path)
+        if tier in self._final and version == self._versions.get(tier):
+            return
+        published = _read(final_path)
+        self._final[tier] = published["buckets"] if published else []
+        self._versions[tier] = version
+
+    def _publish_final(self, tier):
+        final_path = rollup_paths(self.network_dir, tier)[0]
+        write_file_atomic(final_path, json.dumps(self._document(tier, self._final[tier])).encode('utf-8'))
+        self._versions[tier] = file_version(final_path)
+
+    def _document(self, tier, buckets):
+        return {
+            "network": self.network,
+            "tier": tier,
+            "slots": self.tiers[tier],
+            "bin_ms": STATS_BIN_MS,
+            "newest_slot": self.newest,
+            "generated_at": int(time.time() * 1000),
+            "buckets": buckets,
+        }
+
+    def update(self, store, newest):
+        """
+        Bring every tier up to date with the column history after the rows up
+        to slot `newest` were written to `store`, and publish the tiers.
+        """
+        if self.newest is not None and newest < self.newest:
+            newest = self.newest
+        self.newest = newest
+        os.makedirs(os.path.join(self.network_dir, ROLLUPS_DIR), exist_ok=True)
+        for tier, size in self.tiers.items():
+            open_path = rollup_paths(self.network_dir, tier)[1]
+            self._load(tier)
+            final = self._final[tier]
+            # First slot of the oldest bucket that can still change
+            boundary = (newest - self.finality_slots + 1) // size * size
+            start = final[-1]["start_slot"] + size if final else 0
+            start = max(start, boundary - self.retention[tier] * size)
+            if start < boundary:
+                rows = store.read(start, boundary - 1)
+                finalized = aggregate_rows(rows, store.clients, size)
+                final.extend({"start_slot": bucket, "final": True, "clients": clients}
+                             for bucket, clients in sorted(finalized.items()))
+                del final[:-self.retention[tier]]
+                self._publish_final(tier)
+                logger.debug(f"[ROLLUP] Finalized {len(finalized)} {tier} buckets of {self.network} "
+                             f"in slots {start}-{boundary - 1}")
+            pending = aggregate_rows(store.read(boundary, newest), store.clients, size)
+            buckets = [{"start_slot": bucket, "final": False, "clients": clients}
+                       for bucket, clients in sorted(pending.items())]
+            write_file_atomic(open_path, json.dumps(self._document(tier, buckets)).encode('utf-8'))
+
+    def resummarize(self, store, start, end):
+        """
+        Summarize again the finalized buckets overlapping slots [start, end]
+        after rows were written behind them, keeping the other buckets as they
+        are. Buckets that are not finalized yet are left to `update`.
+        """
+        for tier, size in self.tiers.items():
+            self._load(tier)
+            final = self._final[tier]
+            if not final:
+                continue  # update() summarizes the whole retained history
+            first = max(start // size * size, final[-1]["start_slot"] - (self.retention[tier] - 1) * size)
+            last = min(end // size * size, final[-1]["start_slot"])
+            if first > last:
+                continue
+            rows = store.read(first, last + size - 1)
+            buckets = {bucket["start_slot"]: bucket for bucket in final
+                       if not first <= bucket["start_slot"] <= last}
+            buckets.update((bucket, {"start_slot": bucket, "final": True, "clients": clients})
+                           for bucket, clients in aggregate_rows(rows, store.clients, size).items())
+            self._final[tier] = [buckets[bucket] for bucket in sorted(buckets)][-self.retention[tier]:]
+            self._publish_final(tier)
+            logger.info(f"[ROLLUP] Summarized {tier} buckets of {self.network} in slots "
+                        f"{first}-{last + size - 1} again")
+
+
+def load_rollups(network_dir, tier, count):
+    """
+    Return the newest `count` buckets of a tier, oldest first, combining the
+    finalized and the open buckets published by the ingest.
+    """
+    final_path, open_path = rollup_paths(network_dir, tier)
+    final = _read(final_path) or {}
+    pending = _read(open_path) or {}
+    buckets = {bucket["start_slot"]: bucket for bucket in pending.get("buckets", [])}
+    # A bucket can briefly be in both files while it finalizes; the final one wins
+    buckets.update((bucket["start_slot"], bucket) for bucket in final.get("buckets", []))
+    selected = [buckets[start] for start in sorted(buckets)[-count:]] if count > 0 else []
+    return {
+        "network": (pending or final).get("network"),
+        "tier": tier,
+        "slots": ROLLUP_TIERS[tier],
+        "bin_ms": STATS_BIN_MS,
+        "newest_slot": pending.get("newest_slot", final.get("newest_slot")),
+        "buckets": selected,
+    }
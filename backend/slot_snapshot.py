@@ -0,0 +1,339 @@
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+try:
+    from backend.metrics import Counter
+    from backend.slot_encoding import JSON_MIMETYPE, dumps, parse_fields, project
+    from backend.slot_files import write_file_atomic
+except ImportError:  # Running as a script from inside the backend directory
+    from metrics import Counter
+    from slot_encoding import JSON_MIMETYPE, dumps, parse_fields, project
+    from slot_files import write_file_atomic
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "snapshot.bin"
+# Initial size of a snapshot file; it is replaced by one twice as large when a snapshot does not fit
+SNAPSHOT_BYTES = int(os.environ.get("SNAPSHOT_BYTES", 4 * 1024 * 1024))
+# Slot counts whose /api/slots bodies are also published precompressed (the frontend asks for 20)
+SNAPSHOT_COUNTS = [int(count) for count in os.environ.get("SNAPSHOT_COUNTS", "20").split(",") if count.strip()]
+# Field projections published next to the full slots, separated by ';' (the frontend's list view asks for the first)
+SNAPSHOT_PROJECTIONS = [parse_fields(fields) for fields in
+                        os.environ.get("SNAPSHOT_PROJECTIONS", "status,seconds_in_slot").split(";") if fields.strip()]
+# Reads retried while the ingest is writing before falling back to the in-process index
+SNAPSHOT_READ_ATTEMPTS = 8
+
+SNAPSHOT_MAGIC = b"SLOTSNP3"
+# magic, generation, retired, payload length, entries, variants, views, revision
+HEADER = struct.Struct("<8sQQQQQQQ")
+HEADER_SIZE = 64
+GENERATION_OFFSET = 8
+RETIRED_OFFSET = 16
+# Per view of the slots: its fields joined by ',' (empty for all fields) and the
+# offset of its records in the data section
+VIEW = struct.Struct("<256sQ")
+# Per slot of a view, newest first: slot number, revision, end of its record in
+# the view's records and the digest of the body of the newest slots up to it,
+# from which the ETag is made
+ENTRY = struct.Struct("<qqQ16s")
+# Digest of the body of zero slots
+EMPTY_DIGEST = hashlib.blake2b(b"[]", digest_size=16).digest()
+# Per precompressed body: view, slot count, encoding, offset and length in the data section
+VARIANT = struct.Struct("<QQ8sQQ")
+
+SNAPSHOT_READS = Counter("slot_snapshot_reads_total", "Reads of the shared slot snapshot, by result", ["result"])
+
+
+def _view_name(fields):
+    return ",".join(fields or ()).encode('ascii')
+
+
+def _encode(views, counts):
+    """
+    Lay out the payload of a snapshot: the view, entry and variant tables,
+    then the data section. The records of each view start with '[' and are
+    joined by ',', so the body of its newest n slots is its first end[n-1]
+    bytes plus ']'. The digest of each of those bodies is the one
+    ResponseCache would give it.
+    """
+    view_table, entry_table, variant_table, data = [], [], [], []
+    size = 0
+    for number, (fields, records) in enumerate(views):
+        view_table.append(VIEW.pack(_view_name(fields), size))
+        chunks = [b"["]
+        end = 1
+        digest = hashlib.blake2b(b"[", digest_size=16)
+        for i, (slot, revision, record) in enumerate(records):
+            if i:
+                chunks.append(b",")
+                end += 1
+                digest.update(b",")
+            chunks.append(record)
+            end += len(record)
+            digest.update(record)
+            body_digest = digest.copy()
+            body_digest.update(b"]")
+            entry_table.append(ENTRY.pack(slot, revision, end, body_digest.digest()))
+        data.extend(chunks)
+        size += end
+        for count in sorted({min(count, len(records)) for count in counts} - {0}):
+            body = b"".join(chunks[:2 * count]) + b"]"
+            compressed = [(b"gzip", gzip.compress(body, compresslevel=6, mtime=0))]
+            if brotli is not None:
+                compressed.append((b"br", brotli.compress(body)))
+            for encoding, blob in compressed:
+                variant_table.append(VARIANT.pack(number, count, encoding, size, len(blob)))
+                data.append(blob)
+                size += len(blob)
+    payload = b"".join(view_table + entry_table + variant_table + data)
+    return payload, len(views[0][1]), len(variant_table), len(views)
+
+
+def _find_view(mapping, header, fields):
+    """
+    Return (number, entry table offset, records offset, data section offset)
+    of the view of `fields` in a mapped snapshot, or None if it has none.
+    """
+    _, _, _, _, entries, variants, views, _ = header
+    name = _view_name(fields)
+    data = HEADER_SIZE + views * (VIEW.size + entries * ENTRY.size) + variants * VARIANT.size
+    for number in range(views):
+        view_name, offset = VIEW.unpack_from(mapping, HEADER_SIZE + number * VIEW.size)
+        if view_name.rstrip(b"\0") == name:
+            table = HEADER_SIZE + views * VIEW.size + number * entries * ENTRY.size
+            return number, table, data + offset, data
+    return None
+
+
+class SnapshotWriter:
+    """
+    Publishes the newest slots of one network into a memory-mapped file that
+    every API worker maps read-only, so the latest-slots response is built
+    once by the ingest instead of once per worker. Every slot is published
+    with its revision, in full and in each of the field projections, so
+    projected and version-cursor polls are served from it as well.
+
+    Updates are guarded by a sequence lock: the generation in the header is
+    odd while the payload is being rewritten in place and even once it is
+    complete. A snapshot that does not fit is written to a new, larger file
+    that replaces the old one, and the old mapping is then marked retired so
+    readers switch over.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._map = None
+        self._last = None  # (payload, revision) of the previous publish
+        self._projections = {}  # (fields, record) -> projected record of the previous publish
+        self.generation = None
+
+    def _create(self, payload, counts, generation, revision):
+        size = max(SNAPSHOT_BYTES, len(self._map) * 2 if self._map is not None else 0)
+        while size < HEADER_SIZE + len(payload):
+            size *= 2
+        header = HEADER.pack(SNAPSHOT_MAGIC, generation, 0, len(payload), *counts, revision)
+        body = header.ljust(HEADER_SIZE, b"\0") + payload
+        write_file_atomic(self.path, body.ljust(size, b"\0"))
+        previous = self._map
+        with open(self.path, 'r+b') as f:
+            self._map = mmap.mmap(f.fileno(), size)
+        if previous is not None:
+            struct.pack_into("<Q", previous, RETIRED_OFFSET, 1)
+            previous.close()
+        logger.info(f"[SNAPSHOT] Created {self.path} ({size} bytes)")
+
+    def _open(self):
+        try:
+            with open(self.path, 'r+b') as f:
+                mapping = mmap.mmap(f.fileno(), 0)
+        except (FileNotFoundError, ValueError):
+            return
+        if len(mapping) < HEADER_SIZE or HEADER.unpack_from(mapping)[0] != SNAPSHOT_MAGIC:
+            mapping.close()
+            return
+        self._map = mapping
+        self.generation = HEADER.unpack_from(mapping)[1] & ~1
+
+    def _projected(self, views):
+        """
+        Return the records of every projection in `views`, projecting each
+        record only the first time it is published.
+        """
+        projected = {}
+        for fields, records in views:
+            for _, _, record in records:
+                key = (fields, record)
+                body = self._projections.get(key)
+                if body is None:
+                    body = dumps(project(json.loads(record), fields), JSON_MIMETYPE)
+                projected[key] = body
+        self._projections = projected
+        return [(fields, [(slot, revision, projected[(fields, record)]) for slot, revision, record in records])
+                for fields, records in views]
+
+    def publish(self, records, counts=SNAPSHOT_COUNTS, revision=0, projections=SNAPSHOT_PROJECTIONS):
+        """
+        Publish `records`, a list of (slot, revision, JSON bytes of {"slot", "data"})
+        tuples newest first, together with their `projections`. `revision` is
+        the highest revision of the store they come from, returned to version
+        cursors. Returns the new generation, or None if nothing changed.
+        """
+        views = [(None, records)] + self._projected([(fields, records) for fields in projections])
+        payload, *counts = _encode(views, counts)
+        if (payload, revision) == self._last:
+            return None
+        if self._map is not None and struct.unpack_from("<Q", self._map, RETIRED_OFFSET)[0]:
+            # Replaced by another writer (a backfill) in the meantime
+            self._map.close()
+            self._map = None
+        if self._map is None:
+            self._open()
+        if self.generation is None:
+            # Start from the clock so generations never repeat across a lost file
+            self.generation = time.time_ns() & ~1
+        if self._map is not None:
+            # Continue from the file in case another writer published since
+            self.generation = max(self.generation, HEADER.unpack_from(self._map)[1] & ~1)
+        generation = self.generation + 2
+        if self._map is None or HEADER_SIZE + len(payload) > len(self._map):
+            self._create(payload, counts, generation, revision)
+        else:
+            mapping = self._map
+            # Packed first and copied in: struct.pack_into zeroes its target before
+            # filling it, which would briefly show readers an even generation of 0
+            mapping[GENERATION_OFFSET:GENERATION_OFFSET + 8] = struct.pack("<Q", generation - 1)
+            mapping[HEADER_SIZE:HEADER_SIZE + len(payload)] = payload
+            mapping[:HEADER.size] = HEADER.pack(SNAPSHOT_MAGIC, generation - 1, 0, len(payload), *counts, revision)
+            mapping[GENERATION_OFFSET:GENERATION_OFFSET + 8] = struct.pack("<Q", generation)
+        self.generation = generation
+        self._last = (payload, revision)
+        return generation
+
+
+class SnapshotReader:
+    """
+    Read side of a SnapshotWriter's file, shared by all workers through the
+    page cache. A read takes no lock: it copies the requested body out of the
+    mapping and keeps it only if the generation was even and unchanged around
+    the copy, retrying otherwise.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._map = None
+        self._lock = threading.Lock()
+
+    def _mapping(self):
+        mapping = self._map
+        if mapping is not None and not struct.unpack_from("<Q", mapping, RETIRED_OFFSET)[0]:
+            return mapping
+        with self._lock:
+            if self._map is not mapping:
+                return self._map
+            try:
+                with open(self.path, 'rb') as f:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (FileNotFoundError, ValueError):
+                return None
+            if len(mapping) < HEADER_SIZE or HEADER.unpack_from(mapping)[0] != SNAPSHOT_MAGIC:
+                mapping.close()
+                return None
+            # The retired mapping is left to the garbage collector; a concurrent read may still use it
+            self._map = mapping
+            return mapping
+
+    def _consistent(self, extract):
+        """
+        Return `extract(mapping, header)` of a consistent snapshot, retrying
+        while the ingest is writing, or None if there is no snapshot to read
+        from or `extract` finds nothing to serve in it.
+        """
+        for _ in range(SNAPSHOT_READ_ATTEMPTS):
+            mapping = self._mapping()
+            if mapping is None:
+                SNAPSHOT_READS.labels("missing").inc()
+                return None
+            try:
+                header = HEADER.unpack_from(mapping)
+                if header[1] & 1:
+                    time.sleep(0)
+                    continue
+                result = extract(mapping, header)
+            except (struct.error, UnicodeDecodeError):
+                continue  # torn header; the generation check would reject it anyway
+            if struct.unpack_from("<Q", mapping, GENERATION_OFFSET)[0] == header[1]:
+                SNAPSHOT_READS.labels("hit" if result is not None else "unpublished").inc()
+                return result
+        SNAPSHOT_READS.labels("retry_exhausted").inc()
+        return None
+
+    def read(self, count, encodings=(), fields=None):
+        """
+        Return (body, etag, encoding) of the newest `count` slots as a JSON
+        array with only `fields` kept, precompressed in the first of
+        `encodings` that was published for this count, or None if there is
+        no consistent snapshot of those fields to serve.
+        The ETag is derived from the body, so it only changes with the slots
+        it covers, and matches the one ResponseCache gives the same body.
+        """
+        def extract(mapping, header):
+            view = _find_view(mapping, header, fields)
+            if view is None:
+                return None
+            number, table, records, data = view
+            _, _, _, _, entries, variants, views, _ = header
+            slots = min(max(count, 0), entries)
+            if slots:
+                _, _, end, digest = ENTRY.unpack_from(mapping, table + (slots - 1) * ENTRY.size)
+            else:
+                end, digest = 1, EMPTY_DIGEST
+            digest = digest.hex()
+            result = None
+            variant_table = HEADER_SIZE + views * (VIEW.size + entries * ENTRY.size)
+            for i in range(variants):
+                variant_view, variant_count, encoding, offset, size = VARIANT.unpack_from(
+                    mapping, variant_table + i * VARIANT.size)
+                encoding = encoding.rstrip(b"\0").decode('ascii')
+                if variant_view == number and variant_count == slots and encoding in encodings:
+                    if result is None or encodings.index(encoding) < encodings.index(result[2]):
+                        result = (mapping[data + offset:data + offset + size], f'"{digest}-{encoding}"', encoding)
+            if result is None:
+                result = (mapping[records:records + end] + b"]", f'"{digest}"', 'identity')
+            return result
+        return self._consistent(extract)
+
+    def changes(self, count, since_slot=None, since_version=None, fields=None):
+        """
+        Return (body, generation) of the response to a `since` and/or `version`
+        cursor, {"version": ..., "slots": [...]} with the slots among the newest
+        `count` that are newer than `since_slot` or whose revision is newer than
+        `since_version`, or None if there is no consistent snapshot of `fields`.
+        """
+        def extract(mapping, header):
+            view = _find_view(mapping, header, fields)
+            if view is None:
+                return None
+            _, table, records, _ = view
+            _, generation, _, _, entries, _, _, revision = header
+            slots = min(max(count, 0), entries)
+            chunks = []
+            start = 1
+            for slot, slot_revision, end, _ in ENTRY.iter_unpack(mapping[table:table + slots * ENTRY.size]):
+                if ((since_slot is not None and slot > since_slot)
+                        or (since_version is not None and slot_revision > since_version)):
+                    chunks.append(mapping[records + start:records + end])
+                start = end + 1
+            return b'{"version":%d,"slots":[' % revision + b",".join(chunks) + b"]}", generation
+        return self._consistent(extract)
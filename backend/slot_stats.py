@@ -0,0 +1,162 @@
+import logging
+import time
+
+import numpy as np
+
+try:
+    from backend.column_store import STATUSES
+except ImportError:  # Running as a script from inside the backend directory
+    from column_store import STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Rolling windows the statistics are kept for, in slots
+STATS_WINDOWS = {"epoch": 32, "hour": 300, "day": 7200}
+# Width of a seconds_in_slot histogram bin; values outside [0, 12 s) go to the first/last bin
+STATS_BIN_MS = 50
+STATS_BINS = 12000 // STATS_BIN_MS
+STATS_QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+STATS_FILE = "stats.json"
+
+
+class ClientAggregate:
+    """
+    Counts of one client within one window: a fixed histogram of the time into
+    the slot at which produced blocks were seen, plus the number of slots per status.
+    """
+
+    def __init__(self):
+        self.histogram = np.zeros(STATS_BINS, np.int64)
+        self.total_ms = 0
+        self.statuses = dict.fromkeys(STATUSES, 0)
+
+    def add(self, status, ms_in_slot, sign):
+        self.statuses[status] += sign
+        if status == "produced" and ms_in_slot is not None:
+            self.histogram[min(max(ms_in_slot // STATS_BIN_MS, 0), STATS_BINS - 1)] += sign
+            self.total_ms += sign * ms_in_slot
+
+    def quantile(self, q):
+        """
+        Return the q-quantile of seconds_in_slot, interpolated within its bin.
+        """
+        total = int(self.histogram.sum())
+        if total == 0:
+            return None
+        cumulative = np.cumsum(self.histogram)
+        rank = q * total
+        bin_index = int(np.searchsorted(cumulative, rank))
+        below = int(cumulative[bin_index - 1]) if bin_index > 0 else 0
+        fraction = (rank - below) / int(self.histogram[bin_index])
+        return round((bin_index + fraction) * STATS_BIN_MS / 1000, 3)
+
+    def summary(self):
+        slots = sum(self.statuses.values())
+        seen = int(self.histogram.sum())
+        seconds_in_slot = {name: self.quantile(q) for name, q in STATS_QUANTILES.items()}
+        seconds_in_slot["mean"] = round(self.total_ms / seen / 1000, 3) if seen else None
+        return {
+            "slots": slots,
+            **self.statuses,
+            "miss_rate": round(self.statuses["missed"] / slots, 4) if slots else None,
+            "reorg_rate": round(self.statuses["reorged"] / slots, 4) if slots else None,
+            "seconds_in_slot": seconds_in_slot,
+        }
+
+
+class RollingStats:
+    """
+    Per-client statistics of one network over rolling windows of the newest slots.
+
+    Every (slot, client) row contributes to the windows it falls in. A row that
+    is written again replaces its previous contribution, and rows leave a window
+    as newer slots arrive, so the aggregates always match a full recomputation
+    over the rows currently in each window. Updating costs O(rows written plus
+    rows leaving a window) and summarizing O(windows x clients x bins), both
+    independent of the history size.
+    """
+
+    def __init__(self, network, windows=STATS_WINDOWS):
+        self.network = network
+        self.windows = dict(windows)
+        self.span = max(self.windows.values())
+        self.newest = None
+        self._rows = {}        # slot -> { client: (status, ms_in_slot) }
+        self._aggregates = {name: {} for name in self.windows}  # window -> { client: ClientAggregate }
+
+    def _in_window(self, slot, size):
+        return slot > self.newest - size
+
+    def _apply(self, slot, client, row, sign):
+        status, ms_in_slot = row
+        for name, size in self.windows.items():
+            if self._in_window(slot, size):
+                aggregates = self._aggregates[name]
+                aggregate = aggregates.get(client)
+                if aggregate is None:
+                    aggregate = aggregates[client] = ClientAggregate()
+                aggregate.add(status, ms_in_slot, sign)
+
+    def _advance(self, newest):
+        """
+        Move the newest slot forward and take the rows that fell out of each
+        window out of its aggregates.
+        """
+        if self.newest is None:
+            self.newest = newest
+            return
+        if newest <= self.newest:
+            return
+        for name, size in self.windows.items():
+            aggregates = self._aggregates[name]
+            # Slots in (old newest - size, new newest - size] leave this window;
+            # none of them can be newer than the old newest slot
+            for slot in range(self.newest - size + 1, min(self.newest, newest - size) + 1):
+                for client, (status, ms_in_slot) in self._rows.get(slot, {}).items():
+                    aggregates[client].add(status, ms_in_slot, -1)
+        # Retained rows all lie in (old newest - span, old newest], so the ones
+        # leaving the longest window are a range of slots; no need to scan the rest
+        for slot in range(self.newest - self.span + 1, min(self.newest, newest - self.span) + 1):
+            self._rows.pop(slot, None)
+        self.newest = newest
+
+    def update(self, slots, clients, statuses, ms_in_slot, missing=None):
+        """
+        Add or replace one row per (slot, client); the arguments are sequences of
+        equal length. `ms_in_slot` values equal to `missing` count as unknown.
+        """
+        if len(slots) == 0:
+            return
+        self._advance(int(max(slots)))
+        for slot, client, status, ms in zip(slots, clients, statuses, ms_in_slot):
+            slot = int(slot)
+            if status not in STATUSES or not self._in_window(slot, self.span):
+                continue
+            row = (status, None if ms is None or ms == missing else int(ms))
+            rows = self._rows.setdefault(slot, {})
+            previous = rows.get(client)
+            if previous == row:
+                continue
+            if previous is not None:
+                self._apply(slot, client, previous, -1)
+            rows[client] = row
+            self._apply(slot, client, row, 1)
+
+    def summary(self):
+        """
+        Return the statistics of every window and client.
+        """
+        return {
+            "network": self.network,
+            "newest_slot": self.newest,
+            "generated_at": int(time.time() * 1000),
+            "bin_ms": STATS_BIN_MS,
+            "windows": {
+                name: {
+                    "slots": size,
+                    "clients": {client: aggregate.summary()
+                                for client, aggregate in sorted(self._aggregates[name].items())},
+                }
+                for name, size in self.windows.items()
+            },
+        }
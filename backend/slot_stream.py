@@ -0,0 +1,82 @@
+import collections
+import json
+import threading
+
+# Number of recent events kept for subscribers that are momentarily behind
+STREAM_HISTORY = 64
+# Seconds between keep-alive comments on an idle stream
+STREAM_KEEPALIVE = 15
+
+
+def sse_frame(event, body, event_id=None):
+    """
+    Build a Server-Sent Events frame from an already serialized (single-line)
+    JSON body.
+    """
+    frame = b""
+    if event_id is not None:
+        frame += f"id: {event_id}\n".encode("utf-8")
+    return frame + f"event: {event}\ndata: ".encode("utf-8") + body + b"\n\n"
+
+
+class SlotBroadcaster:
+    """
+    Fan-out of slot updates for one network.
+
+    Every update is serialized into an SSE frame exactly once and appended to a
+    short shared log. Subscribers only remember the sequence number of the last
+    frame they sent and wait on a shared condition, so a subscriber costs no
+    more than its own generator regardless of how many there are.
+    """
+
+    def __init__(self, history=STREAM_HISTORY):
+        self._cond = threading.Condition()
+        self._events = collections.deque(maxlen=history)  # (seq, frame)
+        self.seq = 0
+
+    def publish(self, event, payload):
+        """
+        Serialize `payload` and wake up all subscribers.
+        """
+        body = json.dumps(payload, separators=(',', ':')).encode("utf-8")
+        with self._cond:
+            self.seq += 1
+            self._events.append((self.seq, sse_frame(event, body, self.seq)))
+            self._cond.notify_all()
+
+    def wait(self, after, timeout=STREAM_KEEPALIVE):
+        """
+        Block until there are frames newer than sequence number `after` or
+        `timeout` expires.
+
+        Returns a list of (seq, frame) tuples (empty on timeout), or None if
+        the subscriber fell so far behind that frames were dropped from the
+        log and it has to start over from a snapshot.
+        """
+        with self._cond:
+            if self.seq == after:
+                self._cond.wait(timeout)
+            if self.seq == after:
+                return []
+            if not self._events or self._events[0][0] > after + 1:
+                return None
+            return [(seq, frame) for seq, frame in self._events if seq > after]
+
+    def subscribe(self, snapshot):
+        """
+        Generate the SSE stream of one subscriber: a snapshot frame produced
+        by `snapshot()` followed by every published frame. A fresh snapshot
+        is sent whenever the subscriber falls behind the shared log.
+        """
+        seq = self.seq
+        yield snapshot()
+        while True:
+            events = self.wait(seq)
+            if events is None:
+                seq = self.seq
+                yield snapshot()
+            elif not events:
+                yield b": keep-alive\n\n"
+            else:
+                seq = events[-1][0]
+                yield b"".join(frame for _, frame in events)
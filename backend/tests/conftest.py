@@ -0,0 +1,21 @@
+import os
+import tempfile
+
+import pytest
+
+# The backend reads its configuration when first imported, so point it at a
+# scratch data directory before any test module imports it
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ["NETWORKS"] = "mainnet"
+
+
+@pytest.fixture(scope="session")
+def app():
+    from backend import app as api
+    api.app.config["TESTING"] = True
+    return api.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
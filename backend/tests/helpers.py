@@ -0,0 +1,20 @@
+import json
+
+CLIENTS = ("lighthouse", "prysm", "teku")
+
+
+def slot_body(slot, status="produced", seconds_in_slot=1.5, clients=CLIENTS):
+    """
+    Return the stored JSON body of one slot, as the ingest writes it.
+    """
+    return json.dumps({
+        client: {
+            "slot": slot,
+            "client": client,
+            "status": status,
+            "seconds_in_slot": seconds_in_slot,
+            "hash": f"0x{slot:04x}",
+            "parent_hash": f"0x{slot - 1:04x}",
+        }
+        for client in clients
+    }, separators=(',', ':')).encode('utf-8')
@@ -0,0 +1,159 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from backend import app as api
+from backend import xatu_data_prep
+from backend.segment_store import SegmentStore
+from backend.slot_index import get_index
+from backend.slot_snapshot import SnapshotReader
+from backend.tests.helpers import slot_body
+
+
+@pytest.fixture(scope="module")
+def store(app):
+    store = SegmentStore(os.path.join(os.environ["DATA_DIR"], "mainnet"))
+    store.append({slot: slot_body(slot) for slot in range(1000, 1050)})
+    get_index("mainnet").refresh()
+    return store
+
+
+def append(store, bodies):
+    store.append(bodies)
+    get_index("mainnet").refresh()
+
+
+def test_latest_slots(client, store):
+    response = client.get("/api/slots/mainnet?count=5")
+    assert response.status_code == 200
+    slots = response.get_json()
+    assert [entry["slot"] for entry in slots] == [store.newest() - i for i in range(5)]
+    assert slots[0]["data"]["teku"]["status"] == "produced"
+
+
+def test_unknown_network_and_fields(client, store):
+    assert client.get("/api/slots/goerli").status_code == 400
+    assert client.get("/api/slots/mainnet?fields=status,bogus").status_code == 400
+
+
+def test_unchanged_response_is_not_modified(client, store):
+    response = client.get("/api/slots/mainnet?count=20", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    etag = response.headers["ETag"]
+    assert len(gzip.decompress(response.data)) > len(response.data)
+
+    again = client.get("/api/slots/mainnet?count=20",
+                       headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+
+    # Another encoding is another representation
+    identity = client.get("/api/slots/mainnet?count=20", headers={"If-None-Match": etag})
+    assert identity.status_code == 200
+
+
+def test_fields_projection(client, store):
+    response = client.get("/api/slots/mainnet?count=3&fields=status,seconds_in_slot")
+    slots = response.get_json()
+    assert len(slots) == 3
+    assert all(set(values) == {"status", "seconds_in_slot"}
+               for entry in slots for values in entry["data"].values())
+
+
+def test_since_returns_newer_slots(client, store):
+    newest = store.newest()
+    response = client.get(f"/api/slots/mainnet?count=20&since={newest - 2}")
+    payload = response.get_json()
+    assert [entry["slot"] for entry in payload["slots"]] == [newest, newest - 1]
+    assert payload["version"] == get_index("mainnet").revision
+
+
+def test_version_cursor_returns_changed_slots(client, store):
+    url = "/api/slots/mainnet?count=20&version={}&fields=status,seconds_in_slot"
+    cursor = client.get(url.format(0)).get_json()["version"]
+
+    unchanged = client.get(url.format(cursor), headers={"Accept-Encoding": "gzip"})
+    assert unchanged.headers["Content-Encoding"] == "gzip"
+    assert unchanged.status_code == 200
+    again = client.get(url.format(cursor),
+                       headers={"Accept-Encoding": "gzip", "If-None-Match": unchanged.headers["ETag"]})
+    assert again.status_code == 304
+
+    newest = store.newest()
+    append(store, {newest + 1: slot_body(newest + 1), newest - 3: slot_body(newest - 3, status="reorged")})
+    changed = client.get(url.format(cursor), headers={"If-None-Match": unchanged.headers["ETag"]})
+    assert changed.status_code == 200
+    payload = changed.get_json()
+    # The cursor is the store's commit sequence, which JavaScript numbers hold exactly
+    assert payload["version"] == store.highest_revision == cursor + 1
+    assert [entry["slot"] for entry in payload["slots"]] == [newest + 1, newest - 3]
+    assert payload["slots"][1]["data"]["teku"] == {"status": "reorged", "seconds_in_slot": 1.5}
+
+    assert client.get(url.format(payload["version"])).get_json()["slots"] == []
+
+
+def test_polls_are_served_from_the_shared_snapshot(client, store, monkeypatch):
+    monkeypatch.setattr(xatu_data_prep, "SNAPSHOT_FILE", "test-snapshot.bin")
+    monkeypatch.setattr(xatu_data_prep, "_snapshots", {})
+    monkeypatch.setitem(api.snapshots, "mainnet", SnapshotReader(os.path.join(store.directory, "test-snapshot.bin")))
+    url = "/api/slots/mainnet?count=20&version={}&fields=status,seconds_in_slot"
+    newest = store.newest()
+    cursor = store.revision(newest)
+    urls = [url.format(0), url.format(cursor - 1), "/api/slots/mainnet?count=5&fields=status,seconds_in_slot",
+            f"/api/slots/mainnet?count=20&since={newest - 2}"]
+    from_index = [client.get(u).data for u in urls]
+
+    xatu_data_prep.save_snapshot("mainnet")
+    # Workers answer the frontend's poll from the snapshot, without an index of their own
+    monkeypatch.setattr(api, "get_index", lambda network: None)
+    assert [client.get(u).data for u in urls] == from_index
+    polled = client.get(url.format(cursor), headers={"Accept-Encoding": "gzip"})
+    assert polled.headers["Content-Encoding"] == "gzip"
+    again = client.get(url.format(cursor), headers={"Accept-Encoding": "gzip", "If-None-Match": polled.headers["ETag"]})
+    assert again.status_code == 304
+
+    append(store, {newest - 1: slot_body(newest - 1, status="missed")})
+    xatu_data_prep.save_snapshot("mainnet")
+    payload = client.get(url.format(cursor)).get_json()
+    assert payload["version"] == store.highest_revision
+    assert [entry["slot"] for entry in payload["slots"]] == [newest - 1]
+    assert payload["slots"][0]["data"]["teku"]["status"] == "missed"
+
+
+def range_lines(response):
+    return [json.loads(line) for line in response.data.splitlines()]
+
+
+def test_range_streams_slots_in_ascending_order(client, store):
+    response = client.get("/api/slots/mainnet/range?from=1010&to=1014")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = range_lines(response)
+    assert [line["slot"] for line in lines] == list(range(1010, 1015))
+    assert lines[0]["data"] == json.loads(slot_body(1010))
+
+
+def test_range_filters_clients_and_fields(client, store):
+    lines = range_lines(client.get("/api/slots/mainnet/range?from=1010&to=1012&clients=Teku&fields=status"))
+    assert lines == [{"slot": slot, "data": {"teku": {"status": "produced"}}} for slot in range(1010, 1013)]
+    # Slots without any of the clients are left out
+    assert range_lines(client.get("/api/slots/mainnet/range?from=1010&to=1012&clients=grandine")) == []
+
+
+def test_range_is_sent_in_bounded_chunks(client, store, monkeypatch):
+    monkeypatch.setattr(api, "RANGE_BUFFER_BYTES", 1000)
+    response = client.get("/api/slots/mainnet/range?from=1000&to=1029", buffered=False)
+    chunks = list(response.response)
+    response.close()
+    assert len(chunks) > 1
+    assert all(len(chunk) < 1000 + len(slot_body(1000)) + 32 for chunk in chunks)
+    assert [json.loads(line)["slot"] for line in b"".join(chunks).splitlines()] == list(range(1000, 1030))
+
+
+def test_invalid_range(client, store):
+    assert client.get("/api/slots/mainnet/range?from=10").status_code == 400
+    assert client.get("/api/slots/mainnet/range?from=20&to=10").status_code == 400
+    assert client.get("/api/slots/mainnet/range?from=-1&to=10").status_code == 400
+    assert client.get("/api/slots/mainnet/range?from=1&to=2&fields=bogus").status_code == 400
@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from backend import backfill as backfill_module
+from backend import xatu_data_prep
+from backend.backfill import BACKFILL_FILE, backfill, chunk_ranges
+from backend.slot_stats import STATS_FILE
+from backend.xatu_source import SyntheticSource
+
+HEAD_SLOT = 10_000_000
+FIRST_SLOT = HEAD_SLOT - 599
+CHUNK_SLOTS = 100
+
+
+class ThreadSource(SyntheticSource):
+    """
+    Synthetic source that remembers the threads it was queried from and can
+    fail the queries of some chunks.
+    """
+
+    def __init__(self, failing=()):
+        super().__init__(["mainnet"], ["prysm", "teku"], head_slot=HEAD_SLOT)
+        self.failing = set(failing)
+        self.threads = set()
+        self.chunks = set()
+
+    def _fetch(self, table, network, window, since, first_slot, last_slot):
+        self.threads.add(threading.get_ident())
+        chunk_start = first_slot + backfill_module.BACKFILL_MARGIN_SLOTS
+        self.chunks.add(chunk_start)
+        if chunk_start in self.failing:
+            raise ConnectionError("query failed")
+        return super()._fetch(table, network, window, since, first_slot, last_slot)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(backfill_module.time, "sleep", lambda seconds: None)
+    return tmp_path
+
+
+def sources(failing=()):
+    opened = []
+
+    def create_source():
+        source = ThreadSource(failing)
+        opened.append(source)
+        return source
+    return create_source, opened
+
+
+def test_chunks_are_newest_first():
+    assert chunk_ranges(0, 249, 100) == [(200, 249), (100, 199), (0, 99)]
+
+
+def test_backfill_writes_every_store(data_dir):
+    create_source, opened = sources()
+    results = backfill(create_source, ["mainnet"], FIRST_SLOT, HEAD_SLOT, CHUNK_SLOTS, parallel=2)
+    assert results["mainnet"] == {"first_slot": FIRST_SLOT, "chunks": 6, "resumed": 0, "failed": 0,
+                                  "slots_written": 600}
+
+    # Every query thread opened its own source and only used that one
+    assert 1 <= len(opened) <= 2
+    assert all(len(source.threads) == 1 for source in opened)
+    assert len({thread for source in opened for thread in source.threads}) == len(opened)
+
+    network_dir = os.path.join(str(data_dir), "mainnet")
+    store = xatu_data_prep.get_segment_store(network_dir)
+    assert store.slots_between(FIRST_SLOT, HEAD_SLOT) == list(range(FIRST_SLOT, HEAD_SLOT + 1))
+    assert set(xatu_data_prep.get_column_store("mainnet").read(FIRST_SLOT, HEAD_SLOT)["slot"].tolist()) == \
+        set(range(FIRST_SLOT, HEAD_SLOT + 1))
+    with open(os.path.join(network_dir, STATS_FILE)) as f:
+        stats = json.load(f)
+    assert stats["newest_slot"] == HEAD_SLOT
+    assert stats["windows"]["hour"]["clients"]["teku"]["slots"] == 300
+    assert os.path.exists(os.path.join(network_dir, "rollups"))
+
+
+def test_interrupted_backfill_resumes(data_dir):
+    failing_chunk = FIRST_SLOT + 2 * CHUNK_SLOTS
+    create_source, _ = sources(failing=[failing_chunk])
+    results = backfill(create_source, ["mainnet"], FIRST_SLOT, HEAD_SLOT, CHUNK_SLOTS, parallel=2)
+    assert results["mainnet"]["failed"] == 1
+    assert results["mainnet"]["slots_written"] == 500
+    with open(os.path.join(str(data_dir), "mainnet", BACKFILL_FILE)) as f:
+        checkpoint = json.load(f)
+    assert failing_chunk not in checkpoint["completed"] and len(checkpoint["completed"]) == 5
+
+    # Running it again only fetches the chunk that failed
+    create_source, opened = sources()
+    results = backfill(create_source, ["mainnet"], FIRST_SLOT, HEAD_SLOT, CHUNK_SLOTS, parallel=2)
+    assert results["mainnet"]["resumed"] == 5
+    assert results["mainnet"]["slots_written"] == CHUNK_SLOTS
+    assert set().union(*(source.chunks for source in opened)) == {failing_chunk}
+
+    # Another range is another backfill
+    create_source, opened = sources()
+    results = backfill(create_source, ["mainnet"], FIRST_SLOT + 100, HEAD_SLOT, CHUNK_SLOTS, parallel=2)
+    assert results["mainnet"]["resumed"] == 0
+    # The slots are stored already, so none are written twice
+    assert results["mainnet"]["slots_written"] == 0
+
+
+def test_range_is_cut_to_the_column_retention(data_dir, monkeypatch):
+    monkeypatch.setattr(backfill_module, "COLUMN_RETENTION_SLOTS", 250)
+    create_source, opened = sources()
+    results = backfill(create_source, ["mainnet"], FIRST_SLOT, HEAD_SLOT, CHUNK_SLOTS, parallel=2)
+    assert results["mainnet"]["first_slot"] == HEAD_SLOT - 249
+    assert results["mainnet"]["chunks"] == 3
+    assert min(set().union(*(source.chunks for source in opened))) == HEAD_SLOT - 249
+
+
+def test_scheduler_rebuilds_its_statistics_after_a_backfill(data_dir):
+    rows = {"slot": np.array([HEAD_SLOT + 1]), "client": ["teku"], "status": ["produced"],
+            "ms_in_slot": np.array([1500], dtype=np.int32)}
+    xatu_data_prep.save_columns(dict(rows, hash=[None], parent_hash=[None]), "mainnet")
+    xatu_data_prep.save_stats(rows, "mainnet")
+    stats_path = os.path.join(str(data_dir), "mainnet", STATS_FILE)
+    with open(stats_path) as f:
+        assert json.load(f)["windows"]["hour"]["clients"]["teku"]["slots"] == 1
+
+    create_source, _ = sources()
+    backfill(create_source, ["mainnet"], HEAD_SLOT - 99, HEAD_SLOT, CHUNK_SLOTS)
+    # The scheduler's next run starts from the backfilled history instead of overwriting it
+    rows["slot"] = np.array([HEAD_SLOT + 2])
+    xatu_data_prep.save_columns(dict(rows, hash=[None], parent_hash=[None]), "mainnet")
+    xatu_data_prep.save_stats(rows, "mainnet")
+    with open(stats_path) as f:
+        assert json.load(f)["windows"]["hour"]["clients"]["teku"]["slots"] == 102
@@ -0,0 +1,92 @@
+from backend.block_dag import BlockDAG
+
+
+def view(root, parent_root, status="produced"):
+    return {"status": status, "hash": root, "parent_hash": parent_root}
+
+
+def test_head_follows_the_newest_majority_block():
+    dag = BlockDAG("mainnet")
+    dag.add_slot(1, {"teku": view("a1", "a0"), "prysm": view("a1", "a0")})
+    dag.add_slot(2, {"teku": view("a2", "a1"), "prysm": view("a2", "a1")})
+    summary = dag.summary(10)
+    assert summary["head"]["root"] == "a2"
+    assert summary["orphaned_blocks"] == []
+    assert summary["divergent_slots"] == []
+
+
+def test_head_switches_to_the_other_branch():
+    dag = BlockDAG("mainnet")
+    dag.add_slot(1, {"teku": view("a1", "a0"), "prysm": view("a1", "a0"), "nimbus": view("a1", "a0")})
+    dag.add_slot(2, {"teku": view("a2", "a1"), "prysm": view("a2", "a1"), "nimbus": view("a2", "a1")})
+    # Slot 3 builds on slot 1, so the block of slot 2 is reorged out
+    dag.add_slot(3, {"teku": view("b3", "a1"), "prysm": view("b3", "a1"), "nimbus": view("b3", "a1")})
+
+    summary = dag.summary(10)
+    assert summary["head"]["root"] == "b3"
+    assert [block["root"] for block in summary["orphaned_blocks"]] == ["a2"]
+
+
+def test_divergent_slot_and_majority_head():
+    dag = BlockDAG("mainnet")
+    dag.add_slot(1, {"teku": view("a1", "a0"), "prysm": view("a1", "a0"), "nimbus": view("a1", "a0")})
+    # Clients disagree on slot 2; the root most of them saw becomes the head
+    dag.add_slot(2, {"teku": view("a2", "a1"), "prysm": view("a2", "a1"), "nimbus": view("b2", "a1")})
+
+    summary = dag.summary(10)
+    assert summary["head"]["root"] == "a2"
+    assert summary["divergent_slots"] == [{
+        "slot": 2,
+        "roots": [
+            {"root": "b2", "canonical": False, "clients": ["nimbus"]},
+            {"root": "a2", "canonical": True, "clients": ["prysm", "teku"]},
+        ],
+    }]
+    assert [block["root"] for block in summary["orphaned_blocks"]] == ["b2"]
+
+    # Once the last client comes round, the slot is no longer divergent
+    dag.add_slot(2, {"nimbus": view("a2", "a1")})
+    assert dag.summary(10)["divergent_slots"] == []
+
+
+def test_missed_views_are_ignored():
+    dag = BlockDAG("mainnet")
+    assert not dag.add_slot(1, {"teku": view(None, None, "missed"), "prysm": {"status": "produced"}})
+    assert dag.summary(10)["head"] is None
+
+
+def test_prune_drops_blocks_behind_retention():
+    dag = BlockDAG("mainnet", retention_slots=4)
+    for slot in range(1, 11):
+        dag.add_slot(slot, {"teku": view(f"a{slot}", f"a{slot - 1}")})
+    summary = dag.summary(10)
+    assert summary["blocks"] == 4
+    assert summary["head"]["root"] == "a10"
+
+    # Views of pruned slots are not added back
+    assert not dag.add_slot(3, {"prysm": view("x3", "a2")})
+    assert dag.summary(10)["blocks"] == 4
+
+    # A reorg within retention still switches the head
+    dag.add_slot(11, {"teku": view("b11", "a9"), "prysm": view("b11", "a9")})
+    summary = dag.summary(10)
+    assert summary["head"]["root"] == "b11"
+    assert [block["root"] for block in summary["orphaned_blocks"]] == ["a10"]
+
+
+def test_unknown_parent_continues_with_the_nearest_majority_block():
+    dag = BlockDAG("mainnet")
+    dag.add_slot(1, {"teku": view("a1", "a0"), "prysm": view("a1", "a0"), "nimbus": view("a1", "a0")})
+    dag.add_slot(2, {"teku": view("a2", "a1"), "prysm": view("a2", "a1"), "nimbus": view("b2", "a1")})
+    # No root was stored for slots 3 and 4, so the parent of slot 5 is unknown
+    dag.add_slot(5, {"teku": view("a5", "x4"), "prysm": view("a5", "x4"), "nimbus": view("a5", "x4")})
+    summary = dag.summary(10)
+    assert summary["head"]["root"] == "a5"
+    assert [block["root"] for block in summary["orphaned_blocks"]] == ["b2"]
+
+    # Once the other clients follow nimbus, the majority of slot 2 changes
+    dag.add_slot(2, {"teku": view("b2", "a1"), "prysm": view("b2", "a1")})
+    dag.add_slot(6, {"teku": view("b6", "y5"), "prysm": view("b6", "y5"), "nimbus": view("b6", "y5")})
+    summary = dag.summary(10)
+    assert summary["head"]["root"] == "b6"
+    assert [block["root"] for block in summary["orphaned_blocks"]] == ["a2"]
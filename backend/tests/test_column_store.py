@@ -0,0 +1,143 @@
+import os
+import threading
+
+from backend import app as api
+from backend.column_store import CLIENT_LANES, NO_TIMESTAMP, ColumnStore, parse_chunk_filename
+
+
+def root(n):
+    return f"0x{n:064x}"
+
+
+def write(store, slots, clients, status="produced", ms=1500):
+    count = len(slots)
+    store.write(slots, clients, [status] * count, [ms] * count,
+                [root(slot) for slot in slots], [root(slot - 1) for slot in slots])
+
+
+def table(store, rows):
+    """
+    Return the rows as sorted (slot, client, status, ms_in_slot, hash, parent_hash)
+    tuples; codes are assigned in no particular order within a slot.
+    """
+    roots = rows["roots"]
+    return sorted(
+        (slot, store.clients[client - 1], status, ms, roots[h] if h >= 0 else None, roots[p] if p >= 0 else None)
+        for slot, client, status, ms, h, p in zip(*(rows[name].tolist() for name in (
+            "slot", "client", "status", "ms_in_slot", "hash", "parent_hash"))))
+
+
+def chunk_files(directory):
+    return sorted(slot for slot in map(parse_chunk_filename, os.listdir(directory)) if slot is not None)
+
+
+def test_write_and_read(tmp_path):
+    writer = ColumnStore(str(tmp_path), chunk_slots=10, writable=True)
+    write(writer, [8, 9, 10, 11], ["teku", "prysm", "teku", "prysm"])
+    writer.write([9], ["teku"], ["missed"], [NO_TIMESTAMP], [None], [None])
+    assert chunk_files(str(tmp_path)) == [0, 10]
+
+    reader = ColumnStore(str(tmp_path), chunk_slots=10)
+    rows = reader.read(9, 11)
+    assert rows["slot"].tolist() == [9, 9, 10, 11]
+    # Root indexes are re-encoded against one table across both chunks
+    assert table(reader, rows) == [
+        (9, "prysm", 1, 1500, root(9), root(8)),
+        (9, "teku", 2, NO_TIMESTAMP, None, None),
+        (10, "teku", 1, 1500, root(10), root(9)),
+        (11, "prysm", 1, 1500, root(11), root(10)),
+    ]
+
+    assert reader.read(9, 11, clients=["prysm"])["slot"].tolist() == [9, 11]
+    assert len(reader.read(20, 30)["slot"]) == 0
+
+
+def test_rewrite_in_place(tmp_path):
+    store = ColumnStore(str(tmp_path), chunk_slots=10, writable=True)
+    write(store, [5], ["teku"])
+    write(store, [5], ["teku"], status="reorged", ms=2500)
+    rows = store.read(0, 9)
+    assert rows["status"].tolist() == [3]
+    assert rows["ms_in_slot"].tolist() == [2500]
+
+
+def test_new_clients_widen_the_chunk(tmp_path):
+    writer = ColumnStore(str(tmp_path), chunk_slots=10, writable=True)
+    names = [f"client{i:02d}" for i in range(CLIENT_LANES + 2)]
+    write(writer, [3] * CLIENT_LANES, names[:CLIENT_LANES])
+    reader = ColumnStore(str(tmp_path), chunk_slots=10)
+    assert len(reader.read(0, 9)["slot"]) == CLIENT_LANES
+
+    write(writer, [4, 4], names[CLIENT_LANES:])
+    assert writer._chunk(0).lanes == 2 * CLIENT_LANES
+    # The reader maps the replaced file again and sees every row
+    rows = reader.read(0, 9)
+    assert rows["slot"].tolist() == [3] * CLIENT_LANES + [4, 4]
+    assert sorted(reader.clients[code - 1] for code in rows["client"]) == names
+    assert [row[:2] for row in table(reader, rows)][-2:] == [(4, name) for name in names[CLIENT_LANES:]]
+
+
+def test_read_waits_out_a_write_in_progress(tmp_path):
+    writer = ColumnStore(str(tmp_path), chunk_slots=10, writable=True)
+    write(writer, [1], ["teku"])
+    reader = ColumnStore(str(tmp_path), chunk_slots=10)
+    assert reader.read(0, 9)["status"].tolist() == [1]
+
+    # Hold the sequence lock as a writer would, and finish the write shortly after
+    chunk = writer._chunk(0)
+    chunk.header["generation"] = chunk.generation + 1
+    chunk.columns["status"][1 * chunk.lanes] = 3
+
+    def finish():
+        chunk.header["generation"] = chunk.generation + 1
+
+    timer = threading.Timer(0.02, finish)
+    timer.start()
+    rows = reader.read(0, 9)
+    timer.join()
+    assert chunk.generation % 2 == 0
+    assert rows["status"].tolist() == [3]
+
+
+def test_expired_chunks_are_deleted(tmp_path):
+    store = ColumnStore(str(tmp_path), chunk_slots=10, retention_slots=15, writable=True)
+    write(store, [5, 15, 25], ["teku"] * 3)
+    write(store, [31], ["teku"])
+    assert chunk_files(str(tmp_path)) == [10, 20, 30]
+    assert store.read(0, 40)["slot"].tolist() == [15, 25, 31]
+
+
+def test_history_api_defaults_to_the_latest_slots(client, monkeypatch, tmp_path):
+    store = ColumnStore(str(tmp_path), writable=True)
+    write(store, list(range(1, 31)), ["teku"] * 30)
+    monkeypatch.setitem(api.column_stores, "mainnet", ColumnStore(str(tmp_path)))
+    monkeypatch.setattr(api, "get_index", lambda network: FakeIndex(30))
+
+    payload = client.get("/api/history/mainnet").get_json()
+    assert (payload["from"], payload["to"]) == (11, 30)
+    assert payload["slot"] == list(range(11, 31))
+    assert payload["clients"] == ["teku"]
+
+    # The default range is clamped at slot 0
+    payload = client.get("/api/history/mainnet?to=10").get_json()
+    assert (payload["from"], payload["to"]) == (0, 10)
+    assert payload["slot"] == list(range(1, 11))
+
+    assert client.get("/api/history/mainnet?from=20&to=10").status_code == 400
+
+
+def test_history_api_without_stored_slots(client, monkeypatch, tmp_path):
+    monkeypatch.setitem(api.column_stores, "mainnet", ColumnStore(str(tmp_path)))
+    monkeypatch.setattr(api, "get_index", lambda network: FakeIndex(None))
+    response = client.get("/api/history/mainnet")
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload["slot"] == [] and payload["roots"] == []
+
+
+class FakeIndex:
+    def __init__(self, newest):
+        self.newest = newest
+
+    def latest(self, count):
+        return [] if self.newest is None else [{"slot": self.newest}]
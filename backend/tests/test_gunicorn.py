@@ -0,0 +1,44 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+pytest.importorskip("gunicorn")
+pytest.importorskip("eventlet")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BOOT_SECONDS = 30
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_eventlet_worker_boots_and_serves(tmp_path):
+    # Same command line as the Procfile, with one worker on a local port
+    port = free_port()
+    env = dict(os.environ, DATA_DIR=str(tmp_path), NETWORKS="mainnet")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--worker-class", "eventlet", "--workers", "1",
+         "--bind", f"127.0.0.1:{port}", "app:app"],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + BOOT_SECONDS
+        while True:
+            assert server.poll() is None, server.communicate()[0].decode(errors="replace")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/networks", timeout=2) as response:
+                    assert response.status == 200
+                    break
+            except OSError:
+                assert time.monotonic() < deadline, "gunicorn did not start serving in time"
+                time.sleep(0.2)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
@@ -0,0 +1,60 @@
+import pandas as pd
+
+from backend.ingest_state import IngestState
+
+
+def rows(network, slots, times):
+    return pd.DataFrame({
+        "network": network,
+        "slot": slots,
+        "updated_date_time": pd.to_datetime(times),
+    })
+
+
+def test_watermark_moves_to_the_newest_row_of_each_network():
+    state = IngestState()
+    assert state.watermark("mainnet", "block_events") is None
+    state.advance("block_events", pd.concat([
+        rows("mainnet", [100, 101], ["2024-05-01 00:00:00", "2024-05-01 00:00:12"]),
+        rows("sepolia", [50], ["2024-05-01 00:00:05"]),
+    ]), "updated_date_time")
+
+    assert state.watermark("mainnet", "block_events") == {"slot": 101, "time": "2024-05-01 00:00:12"}
+    assert state.watermark("sepolia", "block_events") == {"slot": 50, "time": "2024-05-01 00:00:05"}
+    assert state.watermark("mainnet", "reorgs") is None
+
+
+def test_late_rows_never_move_the_watermark_back():
+    state = IngestState()
+    state.advance("block_events", rows("mainnet", [101], ["2024-05-01 00:00:12"]), "updated_date_time")
+
+    # A late row of an older slot, updated before the watermark
+    state.advance("block_events", rows("mainnet", [90], ["2024-05-01 00:00:01"]), "updated_date_time")
+    assert state.watermark("mainnet", "block_events") == {"slot": 101, "time": "2024-05-01 00:00:12"}
+
+    # A late row of an older slot that was updated after it: the time moves on, the slot does not
+    state.advance("block_events", rows("mainnet", [95], ["2024-05-01 00:00:30"]), "updated_date_time")
+    assert state.watermark("mainnet", "block_events") == {"slot": 101, "time": "2024-05-01 00:00:30"}
+
+    state.advance("block_events", rows("mainnet", [], []), "updated_date_time")
+    assert state.watermark("mainnet", "block_events") == {"slot": 101, "time": "2024-05-01 00:00:30"}
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "state" / "ingest_state.json")
+    state = IngestState()
+    frame = rows("mainnet", [100, 101], ["2024-05-01 00:00:00", "2024-05-01 00:00:12"])
+    state.frames["block_events"] = frame
+    state.advance("block_events", frame, "updated_date_time")
+    state.save(path)
+
+    loaded = IngestState.load(path)
+    assert loaded.watermarks == state.watermarks
+    pd.testing.assert_frame_equal(loaded.frame("block_events"), frame)
+
+
+def test_unreadable_state_starts_cold(tmp_path):
+    path = tmp_path / "ingest_state.json"
+    path.write_text("{not json")
+    state = IngestState.load(str(path))
+    assert state.watermarks == {} and state.frames == {}
@@ -0,0 +1,60 @@
+import json
+import os
+
+from backend.manifest import MANIFEST_FILE, load_manifest, update_manifest
+from backend.segment_store import SegmentStore
+from backend.slot_files import write_file_atomic
+from backend.slot_index import SlotIndex, get_index
+from backend.tests.helpers import slot_body
+
+
+def test_update_keeps_the_newest_slot_each_client_saw_a_block_in(tmp_path):
+    store = SegmentStore(str(tmp_path))
+    store.append({slot: slot_body(slot) for slot in range(100, 104)})
+
+    manifest = update_manifest(None, "mainnet", store,
+                               ["teku", "teku", "prysm", "nimbus"],
+                               ["produced", "missed", "reorged", "missed"],
+                               [102, 103, 101, 103])
+    assert manifest["clients"] == {"nimbus": None, "prysm": 101, "teku": 102}
+    assert manifest["rows"] == {"produced": 1, "missed": 2, "reorged": 1}
+    assert (manifest["first_slot"], manifest["last_slot"], manifest["slots"]) == (100, 103, 4)
+
+    # Clients are carried over from the previous manifest; only newer blocks move them
+    manifest = update_manifest(manifest, "mainnet", store, ["teku", "nimbus"], ["produced", "produced"], [90, 104])
+    assert manifest["clients"] == {"nimbus": 104, "prysm": 101, "teku": 102}
+    assert manifest["rows"] == {"produced": 2}
+
+
+def test_load_missing_or_unreadable_manifest(tmp_path):
+    assert load_manifest(str(tmp_path)) == (None, None)
+    (tmp_path / MANIFEST_FILE).write_text("{not json")
+    assert load_manifest(str(tmp_path)) == (None, None)
+
+
+def test_index_reloads_a_republished_manifest(tmp_path):
+    index = SlotIndex("mainnet", str(tmp_path))
+    assert not index.refresh_manifest()
+    path = os.path.join(str(tmp_path), MANIFEST_FILE)
+    write_file_atomic(path, json.dumps({"network": "mainnet", "clients": {"teku": 5}}).encode())
+    assert index.refresh_manifest()
+    assert not index.refresh_manifest()
+    assert index.manifest["clients"] == {"teku": 5}
+
+    write_file_atomic(path, json.dumps({"network": "mainnet", "clients": {"teku": 6}}).encode())
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1))
+    assert index.refresh_manifest()
+    assert index.manifest["clients"] == {"teku": 6}
+
+
+def test_discovery_is_served_from_the_manifest(client, app):
+    index = get_index("mainnet")
+    manifest = {"network": "mainnet", "clients": {"grandine": None, "teku": 7}, "first_slot": 1,
+                "last_slot": 7, "slots": 7, "rows": {"produced": 1}, "updated_at": 0}
+    os.makedirs(index.network_dir, exist_ok=True)
+    write_file_atomic(os.path.join(index.network_dir, MANIFEST_FILE), json.dumps(manifest).encode())
+    index.refresh_manifest()
+
+    assert client.get("/api/networks").get_json() == ["mainnet"]
+    assert client.get("/api/networks?details=1").get_json() == {"networks": [manifest]}
+    assert client.get("/api/clients").get_json() == ["grandine", "teku"]
@@ -0,0 +1,84 @@
+import json
+import os
+
+from backend.segment_store import SEGMENT_SUFFIX, SegmentStore
+from backend.tests.helpers import slot_body
+
+
+def segment_files(directory):
+    return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+                  if name.endswith(SEGMENT_SUFFIX))
+
+
+def test_append_and_read(tmp_path):
+    store = SegmentStore(str(tmp_path), segment_slots=10, retention_slots=1000)
+    store.append({slot: slot_body(slot) for slot in range(100, 125)})
+
+    assert len(store) == 25
+    assert store.newest() == 124
+    assert store.oldest() == 100
+    assert store.latest_slots(3) == [124, 123, 122]
+    assert store.slots_between(108, 111) == [108, 109, 110, 111]
+    assert store.read(117) == json.loads(slot_body(117))
+    assert store.read(99) is None
+    assert segment_files(str(tmp_path)) == [100, 110, 120]
+
+
+def test_reader_sees_appends(tmp_path):
+    writer = SegmentStore(str(tmp_path), segment_slots=10)
+    writer.append({slot: slot_body(slot) for slot in range(100, 105)})
+    reader = SegmentStore(str(tmp_path), segment_slots=10)
+    assert reader.refresh() == ([100, 101, 102, 103, 104], [])
+    assert reader.refresh() == ([], [])
+
+    writer.append({105: slot_body(105), 102: slot_body(102, status="reorged")})
+    assert reader.refresh() == ([102, 105], [])
+    assert reader.read(102)["lighthouse"]["status"] == "reorged"
+    assert reader.revision(102) == reader.revision(105) > reader.revision(101)
+
+
+def test_compaction_keeps_newest_records(tmp_path):
+    writer = SegmentStore(str(tmp_path), segment_slots=10)
+    writer.append({slot: slot_body(slot) for slot in range(100, 115)})
+    reader = SegmentStore(str(tmp_path), segment_slots=10)
+    reader.refresh()
+    path = os.path.join(str(tmp_path), f"100{SEGMENT_SUFFIX}")
+
+    # Rewriting a slot of a segment that is no longer written to compacts it
+    writer.append({103: slot_body(103, status="reorged")})
+    with open(path, "rb") as f:
+        slots = [int(line.split(b"\t", 1)[0]) for line in f.read().splitlines()]
+    assert slots == list(range(100, 110))
+
+    # The reader follows the compacted file to its new inode
+    assert reader.refresh() == ([103], [])
+    assert reader.read(103)["lighthouse"]["status"] == "reorged"
+    assert [reader.read(slot) for slot in range(100, 115) if slot != 103] == \
+        [json.loads(slot_body(slot)) for slot in range(100, 115) if slot != 103]
+
+
+def test_retention_deletes_whole_segments(tmp_path):
+    writer = SegmentStore(str(tmp_path), segment_slots=10, retention_slots=20)
+    writer.append({slot: slot_body(slot) for slot in range(100, 130)})
+    reader = SegmentStore(str(tmp_path), segment_slots=10, retention_slots=20)
+    reader.refresh()
+
+    writer.append({slot: slot_body(slot) for slot in range(130, 141)})
+    # Segments ending at or before newest - retention are deleted
+    assert segment_files(str(tmp_path)) == [120, 130, 140]
+    updated, removed = reader.refresh()
+    assert removed == list(range(100, 120))
+    assert updated == list(range(130, 141))
+    assert reader.oldest() == 120
+    assert reader.read(115) is None
+
+
+def test_revisions_are_commit_sequences(tmp_path):
+    writer = SegmentStore(str(tmp_path), segment_slots=10)
+    assert writer.append({100: slot_body(100)}) == 1
+    assert writer.append({101: slot_body(101), 100: slot_body(100, status="reorged")}) == 2
+    assert (writer.revision(100), writer.revision(101)) == (2, 2)
+
+    # A new writer process continues from what is stored, even without the marker
+    os.remove(os.path.join(str(tmp_path), "_commit.json"))
+    assert SegmentStore(str(tmp_path), segment_slots=10).append({102: slot_body(102)}) == 3
@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+from werkzeug.datastructures import MIMEAccept
+
+from backend import slot_encoding
+from backend.segment_store import SegmentStore
+from backend.slot_encoding import (COLUMNAR_MIMETYPE, JSON_MIMETYPE, MSGPACK_MIMETYPE, dumps, negotiate,
+                                   parse_fields, project, slot_payload, to_columns)
+from backend.slot_index import get_index
+from backend.tests.helpers import slot_body
+
+
+def entries():
+    return [
+        {"slot": 11, "data": {"teku": {"slot": 11, "client": "teku", "status": "produced", "seconds_in_slot": 1.5}}},
+        {"slot": 10, "data": {
+            "prysm": {"slot": 10, "client": "prysm", "status": "missed", "seconds_in_slot": None},
+            "teku": {"slot": 10, "client": "teku", "status": "reorged", "seconds_in_slot": 2.0},
+        }},
+    ]
+
+
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields("") is None
+    assert parse_fields(" status, seconds_in_slot,status") == ("status", "seconds_in_slot")
+    with pytest.raises(ValueError):
+        parse_fields("status,bogus")
+
+
+def test_negotiate_prefers_json_on_ties():
+    assert negotiate(MIMEAccept()) == JSON_MIMETYPE
+    assert negotiate(MIMEAccept([("*/*", 1)])) == JSON_MIMETYPE
+    assert negotiate(MIMEAccept([(COLUMNAR_MIMETYPE, 1), (JSON_MIMETYPE, 0.5)])) == COLUMNAR_MIMETYPE
+    expected = MSGPACK_MIMETYPE if slot_encoding.msgpack is not None else JSON_MIMETYPE
+    assert negotiate(MIMEAccept([("application/x-msgpack", 1)])) == expected
+
+
+def test_projection_keeps_only_the_fields_asked_for():
+    entry = entries()[0]
+    assert project(entry, None) is entry
+    projected = slot_payload(entries(), ("status",), JSON_MIMETYPE)
+    assert projected[1] == {"slot": 10, "data": {"prysm": {"status": "missed"}, "teku": {"status": "reorged"}}}
+    # Fields a client has no value for are left out rather than sent as null
+    assert project(entries()[0], ("status", "hash"))["data"]["teku"] == {"status": "produced"}
+
+
+def test_columns_hold_one_value_per_slot_and_client():
+    columns = to_columns(entries(), ("status", "seconds_in_slot"))
+    assert columns == {
+        "slots": [11, 10],
+        "clients": ["prysm", "teku"],
+        "fields": {
+            "status": [[None, "produced"], ["missed", "reorged"]],
+            "seconds_in_slot": [[None, 1.5], [None, 2.0]],
+        },
+    }
+    # Without a projection every field but the implied ones is a column
+    implied = set(slot_encoding.IMPLIED_FIELDS)
+    assert set(to_columns(entries())["fields"]) == set(slot_encoding.SLOT_FIELDS) - implied
+    assert to_columns([], ("status",)) == {"slots": [], "clients": [], "fields": {"status": []}}
+    assert slot_payload(entries(), ("status",), COLUMNAR_MIMETYPE) == to_columns(entries(), ("status",))
+
+
+def test_json_is_compact():
+    assert dumps({"slot": 1, "data": {}}, JSON_MIMETYPE) == b'{"slot":1,"data":{}}'
+
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip("msgpack")
+    payload = slot_payload(entries(), None, MSGPACK_MIMETYPE)
+    assert msgpack.unpackb(dumps(payload, MSGPACK_MIMETYPE), raw=False) == payload
+
+
+@pytest.fixture
+def store(app):
+    store = SegmentStore(os.path.join(os.environ["DATA_DIR"], "mainnet"))
+    if store.newest() is None:
+        store.append({slot: slot_body(slot) for slot in range(2000, 2010)})
+        get_index("mainnet").refresh()
+    return store
+
+
+def test_columnar_response(client, store):
+    response = client.get("/api/slots/mainnet?count=3&fields=status,hash",
+                          headers={"Accept": COLUMNAR_MIMETYPE})
+    assert response.mimetype == COLUMNAR_MIMETYPE
+    assert "Accept" in response.headers["Vary"]
+    columns = json.loads(response.data)
+    assert columns["slots"] == sorted(columns["slots"], reverse=True) and len(columns["slots"]) == 3
+    assert set(columns["fields"]) == {"status", "hash"}
+    teku = columns["clients"].index("teku")
+    assert columns["fields"]["hash"][0][teku] == f"0x{columns['slots'][0]:04x}"
+
+    # Cursor responses carry the columns under "slots"
+    payload = json.loads(client.get("/api/slots/mainnet?count=3&version=0&fields=status",
+                                    headers={"Accept": COLUMNAR_MIMETYPE}).data)
+    assert payload["slots"]["slots"] == columns["slots"]
+    assert list(payload["slots"]["fields"]) == ["status"]
+
+
+def test_msgpack_response(client, store):
+    msgpack = pytest.importorskip("msgpack")
+    response = client.get("/api/slots/mainnet?count=2&fields=status", headers={"Accept": MSGPACK_MIMETYPE})
+    assert response.mimetype == MSGPACK_MIMETYPE
+    json_response = client.get("/api/slots/mainnet?count=2&fields=status")
+    assert msgpack.unpackb(response.data, raw=False) == json_response.get_json()
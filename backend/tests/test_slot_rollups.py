@@ -0,0 +1,95 @@
+from backend.column_store import ColumnStore
+from backend.slot_rollups import SlotRollups, aggregate_rows, load_rollups
+from backend.slot_stats import ClientAggregate
+
+TIERS = {"epoch": 4, "hour": 8}
+RETENTION = {"epoch": 3, "hour": 3}
+FINALITY = 4
+
+
+def write(store, slots, client="teku", status="produced", ms=1500):
+    count = len(slots)
+    store.write(slots, [client] * count, [status] * count, [ms] * count, [None] * count, [None] * count)
+
+
+def rollups(tmp_path):
+    return SlotRollups("mainnet", str(tmp_path), tiers=TIERS, retention=RETENTION, finality_slots=FINALITY)
+
+
+def starts(tier_document, final=None):
+    return [bucket["start_slot"] for bucket in tier_document["buckets"]
+            if final is None or bucket["final"] == final]
+
+
+def test_aggregate_rows_matches_the_per_row_aggregate(tmp_path):
+    store = ColumnStore(str(tmp_path / "columns"), writable=True)
+    write(store, [0, 1, 2], ms=900)
+    write(store, [3], status="missed", ms=-2 ** 31)
+    write(store, [1, 5], client="prysm", status="reorged")
+
+    expected = ClientAggregate()
+    for status, ms in [("produced", 900)] * 3 + [("missed", None)]:
+        expected.add(status, ms, 1)
+    summary = aggregate_rows(store.read(0, 7), store.clients, 4)
+    assert summary[0]["teku"] == expected.summary()
+    assert summary[0]["prysm"]["reorged"] == 1
+    assert summary[4] == {"prysm": summary[4]["prysm"]}
+
+
+def test_buckets_finalize_behind_the_newest_slots(tmp_path):
+    store = ColumnStore(str(tmp_path / "columns"), writable=True)
+    roll = rollups(tmp_path)
+    write(store, range(0, 14))
+    roll.update(store, 13)
+
+    # Buckets ending FINALITY slots behind slot 13 are final, the rest stay open
+    epochs = load_rollups(str(tmp_path), "epoch", 10)
+    assert starts(epochs, final=True) == [0, 4]
+    assert starts(epochs, final=False) == [8, 12]
+    assert epochs["buckets"][-1]["clients"]["teku"]["produced"] == 2
+    assert starts(load_rollups(str(tmp_path), "hour", 10), final=True) == [0]
+
+    # Only the newest buckets of each tier are kept, and served oldest first
+    write(store, range(14, 40))
+    roll.update(store, 39)
+    epochs = load_rollups(str(tmp_path), "epoch", 10)
+    assert starts(epochs, final=True) == [24, 28, 32]
+    assert starts(epochs) == [24, 28, 32, 36]
+    assert starts(load_rollups(str(tmp_path), "epoch", 2)) == [32, 36]
+
+
+def test_restart_catches_up_from_the_column_history(tmp_path):
+    store = ColumnStore(str(tmp_path / "columns"), writable=True)
+    write(store, range(0, 14))
+    rollups(tmp_path).update(store, 13)
+
+    write(store, range(14, 22))
+    restarted = rollups(tmp_path)
+    restarted.update(store, 21)
+    assert starts(load_rollups(str(tmp_path), "epoch", 10), final=True) == [4, 8, 12]
+
+
+def test_resummarize_after_rows_behind_final_buckets(tmp_path):
+    store = ColumnStore(str(tmp_path / "columns"), writable=True)
+    roll = rollups(tmp_path)
+    write(store, range(0, 14))
+    roll.update(store, 13)
+
+    # A backfill fills in prysm for slots that are already final
+    write(store, [1, 5], client="prysm", status="missed")
+    rollups(tmp_path).resummarize(store, 1, 5)
+    epochs = load_rollups(str(tmp_path), "epoch", 10)["buckets"]
+    assert [bucket["clients"].get("prysm", {}).get("missed") for bucket in epochs[:2]] == [1, 1]
+    assert epochs[0]["clients"]["teku"]["produced"] == 4
+
+    # The ingest's instance picks the rewritten file up instead of overwriting it
+    write(store, range(14, 18))
+    roll.update(store, 17)
+    epochs = load_rollups(str(tmp_path), "epoch", 10)["buckets"]
+    assert [bucket["start_slot"] for bucket in epochs if bucket["final"]] == [0, 4, 8]
+    assert epochs[0]["clients"]["prysm"]["missed"] == 1
+
+
+def test_rollups_api(client):
+    assert client.get("/api/rollups/mainnet?tier=minute").status_code == 400
+    assert client.get("/api/rollups/goerli").status_code == 400
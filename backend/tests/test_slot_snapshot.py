@@ -0,0 +1,150 @@
+import gzip
+import hashlib
+import json
+import multiprocessing
+import struct
+import time
+import types
+
+from backend import slot_snapshot
+from backend.slot_snapshot import GENERATION_OFFSET, SnapshotReader, SnapshotWriter
+
+
+def records(slots, status="produced", revision=1):
+    """
+    Return snapshot records of `slots`, newest first.
+    """
+    return [(slot, revision, json.dumps({"slot": slot, "data": {"teku": {"status": status, "hash": "0x01"}}},
+                                        separators=(',', ':')).encode('utf-8'))
+            for slot in sorted(slots, reverse=True)]
+
+
+def test_publish_and_read(tmp_path):
+    path = str(tmp_path / "snapshot.bin")
+    writer = SnapshotWriter(path)
+    reader = SnapshotReader(path)
+    assert reader.read(20) is None
+
+    first = writer.publish(records(range(100, 150)), counts=[20])
+    assert first is not None and first % 2 == 0
+    assert writer.publish(records(range(100, 150)), counts=[20]) is None
+
+    body, etag, encoding = reader.read(5)
+    assert encoding == "identity"
+    assert [entry["slot"] for entry in json.loads(body)] == [149, 148, 147, 146, 145]
+
+    compressed, compressed_etag, encoding = reader.read(20, ["gzip"])
+    assert encoding == "gzip"
+    assert compressed_etag.endswith('-gzip"')
+    assert json.loads(gzip.decompress(compressed)) == json.loads(reader.read(20)[0])
+
+    # More slots than were published return all of them
+    assert len(json.loads(reader.read(500)[0])) == 50
+
+
+def test_generation_and_etag(tmp_path):
+    path = str(tmp_path / "snapshot.bin")
+    writer = SnapshotWriter(path)
+    reader = SnapshotReader(path)
+    first = writer.publish(records(range(100, 150)), counts=[20])
+    etag_20 = reader.read(20)[1]
+    etag_50 = reader.read(50)[1]
+
+    # Rewriting a slot only changes the ETags of the bodies that include it
+    second = writer.publish(records(range(120, 150)) + records(range(100, 120), "reorged"), counts=[20])
+    assert second == first + 2
+    assert reader.read(20)[1] == etag_20
+    assert reader.read(50)[1] != etag_50
+
+
+def test_projections_and_cursors(tmp_path):
+    path = str(tmp_path / "snapshot.bin")
+    writer = SnapshotWriter(path)
+    reader = SnapshotReader(path)
+    writer.publish(records(range(100, 150), revision=3), counts=[20], revision=3,
+                   projections=[("status",)])
+    writer.publish(records(range(146, 150), revision=3) + records(range(140, 146), "reorged", revision=5)
+                   + records(range(100, 140), revision=3), counts=[20], revision=7, projections=[("status",)])
+
+    body, etag, _ = reader.read(20, fields=("status",))
+    slots = json.loads(body)
+    assert slots[0] == {"slot": 149, "data": {"teku": {"status": "produced"}}}
+    assert etag == f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    assert json.loads(gzip.decompress(reader.read(20, ["gzip"], ("status",))[0])) == slots
+    # Projections that were not published are left to the caller
+    assert reader.read(20, fields=("hash",)) is None
+    assert reader.changes(20, since_version=0, fields=("hash",)) is None
+
+    body, generation = reader.changes(20, since_version=3, fields=("status",))
+    assert generation == writer.generation
+    payload = json.loads(body)
+    assert payload["version"] == 7
+    assert [entry["slot"] for entry in payload["slots"]] == list(range(145, 139, -1))
+    assert payload["slots"][0]["data"]["teku"] == {"status": "reorged"}
+
+    # Slots newer than `since` come as well, within the newest `count`
+    payload = json.loads(reader.changes(8, since_slot=147, since_version=5)[0])
+    assert [entry["slot"] for entry in payload["slots"]] == [149, 148]
+    payload = json.loads(reader.changes(0, since_version=0)[0])
+    assert payload == {"version": 7, "slots": []}
+    payload = json.loads(reader.changes(3, since_version=0)[0])
+    assert payload["slots"][2]["data"]["teku"]["hash"] == "0x01"
+
+
+def test_snapshot_grows_into_larger_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(slot_snapshot, "SNAPSHOT_BYTES", 4096)
+    path = str(tmp_path / "snapshot.bin")
+    writer = SnapshotWriter(path)
+    reader = SnapshotReader(path)
+    writer.publish(records(range(100, 110)), counts=[])
+    assert len(json.loads(reader.read(128)[0])) == 10
+
+    writer.publish(records(range(100, 300)), counts=[])
+    assert len(json.loads(reader.read(128)[0])) == 128
+
+
+def test_read_retries_while_a_write_is_in_progress(tmp_path, monkeypatch):
+    path = str(tmp_path / "snapshot.bin")
+    writer = SnapshotWriter(path)
+    reader = SnapshotReader(path)
+    generation = writer.publish(records(range(100, 150)), counts=[20])
+    mapping = writer._map
+
+    # An odd generation marks a write in progress: reads retry, then give up
+    struct.pack_into("<Q", mapping, GENERATION_OFFSET, generation + 1)
+    assert reader.read(20) is None
+
+    # The writer finishes while the reader waits, and the retry succeeds
+    def finish_write(seconds):
+        struct.pack_into("<Q", mapping, GENERATION_OFFSET, generation + 2)
+    monkeypatch.setattr(slot_snapshot, "time", types.SimpleNamespace(sleep=finish_write, time_ns=time.time_ns))
+    body, _, _ = reader.read(20)
+    assert len(json.loads(body)) == 20
+
+
+def publish_alternately(path, rounds):
+    writer = SnapshotWriter(path)
+    for i in range(rounds):
+        writer.publish(records(range(100, 150), "reorged" if i % 2 else "produced"), counts=[20])
+
+
+def test_concurrent_reads_are_never_torn(tmp_path):
+    path = str(tmp_path / "snapshot.bin")
+    SnapshotWriter(path).publish(records(range(100, 150)), counts=[20])
+    expected = {json.dumps([json.loads(record) for _, _, record in records(range(130, 150), status)],
+                           separators=(',', ':')).encode('utf-8')
+                for status in ("produced", "reorged")}
+    reader = SnapshotReader(path)
+
+    writer = multiprocessing.get_context("fork").Process(target=publish_alternately, args=(path, 2000))
+    writer.start()
+    reads = 0
+    while writer.is_alive() or reads == 0:
+        result = reader.read(20)
+        if result is not None:
+            body, etag, _ = result
+            assert body in expected
+            assert etag == f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            reads += 1
+    writer.join()
+    assert writer.exitcode == 0
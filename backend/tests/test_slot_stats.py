@@ -0,0 +1,104 @@
+import random
+
+from backend.slot_stats import STATS_BIN_MS, RollingStats
+
+WINDOWS = {"short": 4, "long": 8}
+
+
+def statuses(stats, window, client):
+    summary = stats.summary()["windows"][window]["clients"][client]
+    return {status: summary[status] for status in ("produced", "missed", "reorged")}
+
+
+def test_rewritten_row_replaces_its_contribution():
+    stats = RollingStats("mainnet", WINDOWS)
+    stats.update([10, 11, 12], ["teku"] * 3, ["produced"] * 3, [1000, 2000, 3000])
+    assert statuses(stats, "short", "teku") == {"produced": 3, "missed": 0, "reorged": 0}
+
+    # The same row written again with the same values changes nothing
+    stats.update([12], ["teku"], ["produced"], [3000])
+    assert statuses(stats, "short", "teku") == {"produced": 3, "missed": 0, "reorged": 0}
+
+    stats.update([11], ["teku"], ["reorged"], [2000])
+    summary = stats.summary()["windows"]["short"]["clients"]["teku"]
+    assert statuses(stats, "short", "teku") == {"produced": 2, "missed": 0, "reorged": 1}
+    assert summary["slots"] == 3
+    assert summary["reorg_rate"] == round(1 / 3, 4)
+    # Only produced blocks count towards the timing
+    assert summary["seconds_in_slot"]["mean"] == 2.0
+
+
+def test_missing_timestamps_do_not_count():
+    stats = RollingStats("mainnet", WINDOWS)
+    stats.update([10, 11], ["teku", "teku"], ["produced", "produced"], [1000, -1], missing=-1)
+    summary = stats.summary()["windows"]["short"]["clients"]["teku"]
+    assert summary["produced"] == 2
+    assert summary["seconds_in_slot"]["mean"] == 1.0
+
+
+def test_advance_drops_rows_leaving_each_window():
+    stats = RollingStats("mainnet", WINDOWS)
+    stats.update(list(range(10, 16)), ["teku"] * 6, ["produced", "missed"] * 3, [1000] * 6)
+    assert statuses(stats, "short", "teku") == {"produced": 2, "missed": 2, "reorged": 0}
+    assert statuses(stats, "long", "teku") == {"produced": 3, "missed": 3, "reorged": 0}
+
+    # Slots 12 and 13 leave the short window, nothing leaves the long one yet
+    stats.update([17], ["teku"], ["produced"], [1000])
+    assert stats.newest == 17
+    assert statuses(stats, "short", "teku") == {"produced": 2, "missed": 1, "reorged": 0}
+    assert statuses(stats, "long", "teku") == {"produced": 4, "missed": 3, "reorged": 0}
+
+    # A jump past the longest window empties both
+    stats.update([40], ["prysm"], ["produced"], [1000])
+    assert statuses(stats, "long", "teku") == {"produced": 0, "missed": 0, "reorged": 0}
+    assert statuses(stats, "long", "prysm") == {"produced": 1, "missed": 0, "reorged": 0}
+
+
+def test_rows_older_than_the_windows_are_ignored():
+    stats = RollingStats("mainnet", WINDOWS)
+    stats.update([20], ["teku"], ["produced"], [1000])
+    stats.update([5], ["teku"], ["missed"], [None])
+    assert statuses(stats, "long", "teku") == {"produced": 1, "missed": 0, "reorged": 0}
+
+
+def test_quantiles_interpolate_within_bins():
+    stats = RollingStats("mainnet", WINDOWS)
+    stats.update([10, 11, 12, 13], ["teku"] * 4, ["produced"] * 4, [0, 0, STATS_BIN_MS, STATS_BIN_MS])
+    seconds_in_slot = stats.summary()["windows"]["short"]["clients"]["teku"]["seconds_in_slot"]
+    assert seconds_in_slot["p50"] == STATS_BIN_MS / 1000
+    assert seconds_in_slot["p99"] == round(1.98 * STATS_BIN_MS / 1000, 3)
+
+
+def test_only_rows_within_the_longest_window_are_retained():
+    stats = RollingStats("mainnet", WINDOWS)
+    stats.update(list(range(10, 20)), ["teku"] * 10, ["produced"] * 10, [1000] * 10)
+    assert sorted(stats._rows) == list(range(12, 20))
+    stats.update([25], ["teku"], ["produced"], [1000])
+    assert sorted(stats._rows) == [18, 19, 25]
+    stats.update([1000], ["teku"], ["produced"], [1000])
+    assert sorted(stats._rows) == [1000]
+
+
+def test_matches_a_full_recomputation():
+    rng = random.Random(7)
+    stats = RollingStats("mainnet", WINDOWS)
+    rows = {}
+    for step in range(200):
+        newest = 20 + step // 2
+        # New slots, rewrites around the head and late rows older than the windows
+        slots = [newest] + [rng.randint(newest - 10, newest) for _ in range(3)]
+        clients = [rng.choice(["teku", "prysm"]) for _ in slots]
+        written = [rng.choice(["produced", "missed", "reorged"]) for _ in slots]
+        ms = [rng.randrange(0, 12000) for _ in slots]
+        stats.update(slots, clients, written, ms)
+        for slot, client, status, value in zip(slots, clients, written, ms):
+            rows[(slot, client)] = (status, value)
+
+        for window, size in WINDOWS.items():
+            for client in ("teku", "prysm"):
+                expected = {"produced": 0, "missed": 0, "reorged": 0}
+                for (slot, name), (status, _) in rows.items():
+                    if name == client and newest - size < slot <= newest:
+                        expected[status] += 1
+                if any(expected.values()):
+                    assert statuses(stats, window, client) == expected
@@ -0,0 +1,202 @@
+import json
+import math
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from backend import xatu_data_prep as prep
+
+NETWORKS = ["mainnet", "sepolia"]
+CLIENTS = ["lighthouse", "prysm", "teku"]
+
+
+# The per-row computations the vectorized ones replaced, kept as the reference
+
+def reference_fill_missing_slots(df):
+    dfs = []
+    for (network, client), group in df.groupby(['network', 'client']):
+        full_slots = pd.DataFrame({'slot': range(group['slot'].min(), group['slot'].max() + 1)})
+        full_slots['network'] = network
+        full_slots['client'] = client
+        merged = pd.merge(full_slots, group, on=['slot', 'network', 'client'], how='left')
+        merged['timestamp'] = pd.to_datetime(merged['timestamp'])
+        merged['status'] = np.where(merged['timestamp'].isna(), 'missed', merged['status'])
+        dfs.append(merged)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def reference_update_status(df, reorg_dict):
+    for network, clients in reorg_dict.items():
+        for client, data in clients.items():
+            mask = (df['network'] == network) & (df['client'] == client) & (df['slot'].isin(data['reorgs']))
+            df.loc[mask, 'status'] = 'reorged'
+    return df
+
+
+def reference_fill_missing_timestamp(row):
+    if pd.notna(row['timestamp']):
+        return row['timestamp']
+    new_ts_ms = prep.SLOT_0_TIMESTAMP_MS + row['slot'] * prep.SLOT_DURATION_MS + 8000
+    return datetime.utcfromtimestamp(new_ts_ms / 1000).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+def reference_seconds_in_slot(first_seen_ts, slot):
+    time_in_slot_ms = (first_seen_ts - prep.SLOT_0_TIMESTAMP_MS - slot * prep.SLOT_DURATION_MS) % prep.SLOT_DURATION_MS
+    return round(time_in_slot_ms / 1000, 3)
+
+
+def reference_slots(df):
+    slots = {}
+    for slot, group in df.groupby('slot'):
+        slot_data = {}
+        for client, client_group in group.groupby('client'):
+            row = client_group.iloc[0]
+            produced = row['status'] == 'produced'
+            slot_data[client] = {
+                "attestation_count": 1 if produced else 0,
+                "attestation_percentage": 100.0 if produced else 0.0,
+                "head_vote": bool(produced),
+                "target_vote": bool(produced),
+                "source_vote": bool(produced),
+                "reorg": bool(row['status'] == 'reorged'),
+                "slot": int(row['slot']),
+                "network": row['network'],
+                "client": client,
+                "timestamp": str(row['timestamp']),
+                "status": row['status'],
+                "hash": row.get('hash', None),
+                "parent_hash": row.get('parent_hash', None),
+                "timestamp_seconds": float(row['timestamp_seconds']),
+                "seconds_in_slot": float(row['seconds_in_slot']),
+            }
+        slots[str(slot)] = slot_data
+    # The files were written with json.dump, which turned missing roots into NaN
+    return json.loads(json.dumps(slots))
+
+
+def reference_pipeline(events, reorgs, info):
+    df = reference_update_status(reference_fill_missing_slots(events), reorg_dict(reorgs))
+    df = df.sort_values(by=['network', 'client', 'slot']).reset_index(drop=True)
+    df = pd.merge(df, info, how="left", on=["slot", "network"])
+    df['timestamp'] = pd.Series(df.apply(reference_fill_missing_timestamp, axis=1), dtype='datetime64[ns]')
+    df["timestamp_seconds"] = df["timestamp"].apply(lambda ts: ts.replace(tzinfo=pytz.UTC).timestamp() * 1000)
+    df["seconds_in_slot"] = df.apply(lambda x: reference_seconds_in_slot(x["timestamp_seconds"], x["slot"]), axis=1)
+    return {network: reference_slots(df[df['network'] == network]) for network in NETWORKS}
+
+
+def pipeline(events, reorgs, info):
+    df = prep.update_status(prep.fill_missing_slots(events), reorgs)
+    df = df.sort_values(by=['network', 'client', 'slot']).reset_index(drop=True)
+    df = prep.add_roots_and_timings(df, info)
+    return {network: {str(slot): json.loads(body)
+                      for slot, body in prep.serialize_slots(df[df['network'] == network]).items()}
+            for network in NETWORKS}
+
+
+def without_nan(value):
+    if isinstance(value, dict):
+        return {key: without_nan(item) for key, item in value.items()}
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def test_fill_missing_timestamps_matches_the_reference():
+    df = pd.DataFrame({
+        "slot": [9_000_000, 9_000_001, 9_000_002],
+        "timestamp": pd.to_datetime(["2024-05-01 00:00:12.345", None, "2024-05-01 00:00:36.000001"]),
+    })
+    expected = pd.Series(df.apply(reference_fill_missing_timestamp, axis=1).map(pd.Timestamp),
+                         dtype='datetime64[ns]')
+    pd.testing.assert_series_equal(prep.fill_missing_timestamps(df), expected, check_names=False)
+
+
+def test_seconds_in_slot_matches_the_scalar_rounding():
+    slot = 9_000_000
+    slot_start = prep.SLOT_0_TIMESTAMP_MS + slot * prep.SLOT_DURATION_MS
+    # Half-millisecond ties and values around them
+    first_seen = slot_start + np.array([0, 1.0005, 1234.5, 2500.25, 11999.9995, 6000.0015, 12000, 24001])
+    expected = [reference_seconds_in_slot(ts, slot) for ts in first_seen.tolist()]
+    assert prep.get_seconds_in_slot(first_seen, np.full(len(first_seen), slot)).tolist() == expected
+    assert prep.get_seconds_in_slot(float(first_seen[3]), slot) == expected[3]
+
+
+def test_epoch_ms_matches_timestamp_method():
+    timestamps = pd.Series(pd.to_datetime([
+        "2024-05-01 00:00:12", "2024-05-01 00:00:12.345", "2024-05-01 00:00:12.345678",
+        "2024-05-01 00:00:12.000001", "2024-05-01 00:00:12.345678901",
+    ]))
+    expected_ms = [ts.replace(tzinfo=pytz.UTC).timestamp() * 1000 for ts in timestamps]
+    assert prep.to_epoch_ms(timestamps).tolist() == expected_ms
+
+
+def sample(seed, first_slot=9_000_000, slots=60):
+    rng = np.random.default_rng(seed)
+    events = []
+    for network in NETWORKS:
+        for client in CLIENTS:
+            # Each client sees a random subset of the slots, so the gaps differ per client
+            start = first_slot + int(rng.integers(0, 5))
+            seen = sorted(set(rng.choice(np.arange(start, first_slot + slots), size=slots // 2, replace=False).tolist()))
+            for slot in seen:
+                slot_start = prep.SLOT_0_TIMESTAMP_MS + slot * prep.SLOT_DURATION_MS
+                # Whole milliseconds mostly, whole seconds and microseconds now and then
+                offset_us = int(rng.integers(0, 12_000_000))
+                offset_us -= offset_us % rng.choice([1, 1000, 1000, 1_000_000])
+                timestamp = pd.Timestamp(slot_start * 1000 + offset_us, unit='us')
+                events.append({"slot": slot, "timestamp": timestamp, "network": network,
+                               "client": client, "status": "produced"})
+    events = pd.DataFrame(events)
+
+    reorgs = pd.DataFrame({
+        "network": ["mainnet", "mainnet", "sepolia"],
+        "client": ["teku", "prysm", "lighthouse"],
+        "slot": [first_slot + 10, first_slot + 10, first_slot + 20],
+    })
+    # Every client reporting a reorg on a network marks all reorged slots of that network
+    reorgs = prep.reorg_table(reorgs)
+
+    # Roots for most slots; the rest stay null
+    info = [{"slot": slot, "hash": f"0x{network[0]}{slot:x}", "parent_hash": f"0x{network[0]}{slot - 1:x}",
+             "network": network}
+            for network in NETWORKS for slot in range(first_slot, first_slot + slots) if rng.random() < 0.8]
+    return events, reorgs, pd.DataFrame(info)
+
+
+def reorg_dict(reorgs):
+    return {network: {client: {"reorgs": set(group['slot'].tolist())} for client in group['client'].unique()}
+            for network, group in reorgs.groupby('network')}
+
+
+def test_fill_missing_slots_and_reorgs_match_the_reference():
+    for seed in range(5):
+        events, reorgs, _ = sample(seed)
+        keys = ['network', 'client', 'slot']
+        expected = reference_update_status(reference_fill_missing_slots(events.copy()), reorg_dict(reorgs))
+        result = prep.update_status(prep.fill_missing_slots(events.copy()), reorgs)
+        pd.testing.assert_frame_equal(result.sort_values(keys).reset_index(drop=True),
+                                      expected.sort_values(keys).reset_index(drop=True), check_dtype=False)
+        assert set(result['status']) == {"produced", "missed", "reorged"}
+
+
+def test_duplicate_events_fill_once():
+    events, _, _ = sample(0)
+    filled = prep.fill_missing_slots(pd.concat([events, events.head(3)], ignore_index=True))
+    pd.testing.assert_frame_equal(filled, prep.fill_missing_slots(events))
+
+
+def test_vectorized_pipeline_matches_the_row_by_row_reference():
+    for seed in range(5):
+        events, reorgs, info = sample(seed)
+        expected = without_nan(reference_pipeline(events.copy(), reorgs, info))
+        assert pipeline(events.copy(), reorgs, info) == expected
+
+
+def test_timestamps_are_formatted_like_str():
+    timestamps = pd.Series(pd.to_datetime([
+        "2024-05-01 00:00:12", "2024-05-01 00:00:12.345", "2024-05-01 00:00:12.000001",
+        "2024-05-01 00:00:12.345678901",
+    ]))
+    assert prep.format_timestamps(timestamps).tolist() == [str(ts) for ts in timestamps]
@@ -0,0 +1,102 @@
+import pandas as pd
+import pytest
+
+from backend import xatu_data_prep
+from backend.ingest_state import IngestState
+from backend.xatu_source import (RecordingSource, ReplaySource, SlotSource, SyntheticSource, XatuSource,
+                                 slot_start)
+
+HEAD_SLOT = 10_000_000
+
+
+def synthetic(**kwargs):
+    return SyntheticSource(["mainnet", "sepolia"], ["prysm", "teku"], head_slot=HEAD_SLOT, **kwargs)
+
+
+class CapturingClient:
+    def __init__(self):
+        self.queries = []
+
+    def execute_query(self, query, columns):
+        self.queries.append((" ".join(query.split()), columns))
+        return None
+
+
+def test_sources_implement_every_fetch():
+    class Partial(SlotSource):
+        def fetch_reorgs(self, network, window=None, since=None, first_slot=None, last_slot=None):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_synthetic_fetch_honours_the_bounds():
+    source = synthetic(window_slots=50)
+    events = source.fetch_block_events("mainnet", window=pd.Timedelta(minutes=10))
+    assert set(events["network"]) == {"mainnet"}
+    assert events["slot"].max() == HEAD_SLOT
+    assert events["slot"].min() > HEAD_SLOT - 50
+
+    since = slot_start(HEAD_SLOT - 5)
+    newer = source.fetch_block_events("mainnet", window=pd.Timedelta(minutes=10), since=since, first_slot=HEAD_SLOT - 3)
+    assert (newer["updated_date_time"] > since).all()
+    assert newer["slot"].min() == HEAD_SLOT - 3
+
+    # Slot ranges reach back past the window, but never past the head
+    blocks = source.fetch_beacon_blocks("sepolia", first_slot=HEAD_SLOT - 500, last_slot=HEAD_SLOT + 10)
+    assert blocks["slot"].min() <= HEAD_SLOT - 499 and blocks["slot"].max() == HEAD_SLOT
+    assert len(source.fetch_reorgs("goerli", window=pd.Timedelta(minutes=10))) == 0
+
+
+def test_ingest_fetches_past_the_watermark_only():
+    source = synthetic()
+    state = IngestState()
+    first = xatu_data_prep.fetch_recent(source, state, "block_events", ["mainnet"])
+    state.advance("block_events", first, "updated_date_time")
+    source.advance(2)
+    second = xatu_data_prep.fetch_recent(source, state, "block_events", ["mainnet"])
+    assert second["slot"].max() == HEAD_SLOT + 2
+    # Only rows updated within the lookback before the watermark come again
+    assert second["slot"].min() >= HEAD_SLOT - xatu_data_prep.WATERMARK_LOOKBACK_SECONDS // 12 - 1
+
+
+def test_xatu_source_builds_the_conditions():
+    client = CapturingClient()
+    source = XatuSource(client)
+    source.fetch_block_events("mainnet", window=pd.Timedelta(minutes=10),
+                              since=pd.Timestamp("2024-05-01 00:00:12"), first_slot=100)
+    query, columns = client.queries[-1]
+    assert "FROM beacon_api_eth_v1_events_block" in query
+    assert ("WHERE meta_network_name = 'mainnet' AND slot >= 100 AND updated_date_time > "
+            "greatest(toDateTime('2024-05-01 00:00:12'), NOW() - INTERVAL 600 SECOND)") in query
+    assert columns == "slot, timestamp, network, client, hash, updated_date_time"
+
+    source.fetch_reorgs("sepolia", first_slot=0, last_slot=10)
+    query, _ = client.queries[-1]
+    assert ("meta_network_name = 'sepolia' AND slot >= 0 AND slot <= 10 AND slot_start_date_time BETWEEN "
+            f"toDateTime('{slot_start(0):%Y-%m-%d %H:%M:%S}') AND toDateTime('{slot_start(10):%Y-%m-%d %H:%M:%S}')"
+            ) in query
+
+    with pytest.raises(ValueError):
+        source.fetch_beacon_blocks("mainnet' OR 1=1 --", window=pd.Timedelta(minutes=20))
+
+
+def test_recorded_session_replays_the_same_rows(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    recorder = RecordingSource(synthetic(), path)
+    fetched = [recorder.fetch_block_events("mainnet", window=pd.Timedelta(minutes=10)),
+               recorder.fetch_reorgs("mainnet", window=pd.Timedelta(minutes=10)),
+               recorder.fetch_beacon_blocks("mainnet", window=pd.Timedelta(minutes=20))]
+    recorder.advance(1)
+    fetched.append(recorder.fetch_block_events("mainnet", window=pd.Timedelta(minutes=10)))
+
+    replay = ReplaySource(path)
+    assert replay.remaining("block_events") == 2
+    replayed = [replay.fetch_block_events("mainnet"), replay.fetch_reorgs("mainnet"),
+                replay.fetch_beacon_blocks("mainnet"), replay.fetch_block_events("mainnet")]
+    for expected, frame in zip(fetched, replayed):
+        pd.testing.assert_frame_equal(frame, expected.reset_index(drop=True),
+                                      check_dtype=False, check_index_type=False)
+    # Once a table's frames run out, fetches return no rows
+    assert len(replay.fetch_block_events("mainnet")) == 0
@@ -1,18 +1,51 @@
 import logging
-import pyxatu
-from datetime import datetime
-import pytz
 import pandas as pd
 import os, json
 import numpy as np
 import time  # Added for timestamp logging
-import sys
-import stat  # Add this import for file permissions
+import hashlib
 #from backend.pyxatu_config import get_pyxatu_config
 
-# Configure logging
+try:
+    from backend import config
+    from backend.ingest_state import IngestState
+    from backend.manifest import MANIFEST_FILE, load_manifest, update_manifest
+    from backend.metrics import INGEST_REGISTRY, STAGE_BUCKETS, Counter, Gauge, Histogram
+    from backend.segment_store import SegmentStore
+    from backend.column_store import ColumnStore, NO_TIMESTAMP, STATUSES
+    from backend.slot_files import file_version, write_file_atomic, writer_lock
+    from backend.slot_index import SLOT_INDEX_CAPACITY
+    from backend.slot_rollups import SlotRollups
+    from backend.slot_snapshot import SNAPSHOT_FILE, SnapshotWriter
+    from backend.slot_stats import STATS_FILE, RollingStats
+    from backend.xatu_source import TABLES, XatuSource, create_source
+except ImportError:  # Running as a script from inside the backend directory
+    import config
+    from ingest_state import IngestState
+    from manifest import MANIFEST_FILE, load_manifest, update_manifest
+    from metrics import INGEST_REGISTRY, STAGE_BUCKETS, Counter, Gauge, Histogram
+    from segment_store import SegmentStore
+    from column_store import ColumnStore, NO_TIMESTAMP, STATUSES
+    from slot_files import file_version, write_file_atomic, writer_lock
+    from slot_index import SLOT_INDEX_CAPACITY
+    from slot_rollups import SlotRollups
+    from slot_snapshot import SNAPSHOT_FILE, SnapshotWriter
+    from slot_stats import STATS_FILE, RollingStats
+    from xatu_source import TABLES, XatuSource, create_source
+
+try:
+    import orjson
+
+    def dumps(data):
+        # orjson writes NaN as null natively
+        return orjson.dumps(data)
+except ImportError:  # orjson is optional, fall back to the standard library
+    def dumps(data):
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+# Configure logging; LOG_LEVEL=DEBUG adds the per-stage and per-slot detail
 logging.basicConfig(
-    level=logging.INFO,
+    level=config.LOG_LEVEL,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler()
@@ -20,75 +53,225 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize pyxatu with environment variables (supported in version 1.8+)
-# Using PyXatu v1.9 with NO_GADGET flag to ensure correct usage with environment variables
-logger.info(f"Initializing PyXatu at {time.time()}")
-
-# Check if we're running locally and need to set environment variables from ~/.pyxatu_config.json
-if not os.environ.get('CLICKHOUSE_USER') and os.path.exists(os.path.expanduser('~/.pyxatu_config.json')):
-    logger.info("Running locally, loading PyXatu config from ~/.pyxatu_config.json")
-    try:
-        with open(os.path.expanduser('~/.pyxatu_config.json'), 'r') as f:
-            config = json.load(f)
-            os.environ['CLICKHOUSE_USER'] = config.get('CLICKHOUSE_USER', '')
-            os.environ['CLICKHOUSE_PASSWORD'] = config.get('CLICKHOUSE_PASSWORD', '')
-            os.environ['CLICKHOUSE_URL'] = config.get('CLICKHOUSE_URL', '')
-            logger.info(f"Loaded config: URL={os.environ['CLICKHOUSE_URL']}, User={os.environ['CLICKHOUSE_USER']}")
-    except Exception as e:
-        logger.error(f"Error loading PyXatu config: {e}")
-
-xatu = pyxatu.PyXatu(use_env_variables=True, NO_GADGET=True)
-
-def get_reorgs():
-    logger.info("Fetching reorg data")
-    potential_reorgs = xatu.execute_query("""
-    SELECT DISTINCT
-        slot-depth, meta_network_name, meta_consensus_implementation
-    FROM default.beacon_api_eth_v1_events_chain_reorg
-    WHERE
-        event_date_time > NOW() - INTERVAL '10 MINUTE'
-    """
-    , columns="slot, network, client")
-    print("potential_reorgs")
-    print(potential_reorgs)
-    if isinstance(potential_reorgs, pd.DataFrame):
-        networks = ["mainnet", "sepolia", "holesky"]
-        net_stats = {}
-        for net in networks:
-            net_reorgs = potential_reorgs[potential_reorgs["network"] == net]        
-            net_client = {}
-            for client in net_reorgs.client.unique():
-                net_client[client] = {"reorgs": set(net_reorgs["slot"].tolist())}
-                net_stats[net] = net_client
-        logger.info(f"Found reorg data: {net_stats}")
-        return net_stats
-    else:
-        logger.info("No reorg data found")
-        return {}
+SLOT_0_TIMESTAMP_MS = config.SLOT_0_TIMESTAMP_MS
+SLOT_DURATION_MS = config.SLOT_DURATION_MS
+NETWORKS = config.NETWORKS           # Configured through the NETWORKS environment variable
+RETAINED_SLOTS = 50                  # Slots kept per (network, client) behind the newest one
+STAGE_SECONDS = Histogram("ingest_stage_duration_seconds", "Duration of each ingest stage, by network and stage",
+                          ["network", "stage"], buckets=STAGE_BUCKETS, registry=INGEST_REGISTRY)
+STAGE_ROWS = Gauge("ingest_stage_rows", "Rows coming out of each ingest stage in the latest run, by network and stage",
+                   ["network", "stage"], registry=INGEST_REGISTRY)
+SLOTS_WRITTEN = Counter("ingest_slots_written_total", "Slots appended to the segment store, by network",
+                        ["network"], registry=INGEST_REGISTRY)
+# Rows updated up to this many seconds before a watermark are fetched again,
+# to pick up late inserts and re-orgs around the head
+WATERMARK_LOOKBACK_SECONDS = int(os.environ.get("XATU_WATERMARK_LOOKBACK", 60))
+# How far back each table is fetched for networks without a watermark
+FETCH_WINDOWS = {
+    "reorgs": pd.Timedelta(minutes=10),
+    "block_events": pd.Timedelta(minutes=10),
+    "beacon_blocks": pd.Timedelta(minutes=20),
+}
+
+def load_local_config():
+    """
+    Export the ClickHouse credentials from ~/.pyxatu_config.json as environment
+    variables when running locally without them.
+    """
+    if not os.environ.get('CLICKHOUSE_USER') and os.path.exists(os.path.expanduser('~/.pyxatu_config.json')):
+        logger.info("Running locally, loading PyXatu config from ~/.pyxatu_config.json")
+        try:
+            with open(os.path.expanduser('~/.pyxatu_config.json'), 'r') as f:
+                config = json.load(f)
+                os.environ['CLICKHOUSE_USER'] = config.get('CLICKHOUSE_USER', '')
+                os.environ['CLICKHOUSE_PASSWORD'] = config.get('CLICKHOUSE_PASSWORD', '')
+                os.environ['CLICKHOUSE_URL'] = config.get('CLICKHOUSE_URL', '')
+                logger.info(f"Loaded config: URL={os.environ['CLICKHOUSE_URL']}, User={os.environ['CLICKHOUSE_USER']}")
+        except Exception as e:
+            logger.error(f"Error loading PyXatu config: {e}")
 
-logger.info("Getting reorg data")
-reorg_dict = get_reorgs()
+def create_client():
+    """
+    Create the source the ingest fetches from: xatu through a PyXatu client.
+    The source can be reused across runs.
+    
+    With XATU_SOURCE set, a local stand-in is returned instead: 'synthetic'
+    for generated data, or the path of a recording to replay (see xatu_source.py).
+    """
+    if os.environ.get("XATU_SOURCE"):
+        logger.info(f"Using local source {os.environ['XATU_SOURCE']} instead of xatu")
+        return create_source(os.environ["XATU_SOURCE"])
+    import pyxatu  # Only needed for the live source
+    # Initialize pyxatu with environment variables (supported in version 1.8+)
+    # Using PyXatu v1.9 with NO_GADGET flag to ensure correct usage with environment variables
+    logger.info(f"Initializing PyXatu at {time.time()}")
+    load_local_config()
+    return XatuSource(pyxatu.PyXatu(use_env_variables=True, NO_GADGET=True))
+
+def as_frame(result, table):
+    """
+    Return fetched rows as a DataFrame with the columns of `table`: empty if the
+    source returned nothing, and with the datetime columns parsed so rows from
+    different runs can be compared.
+    """
+    columns, datetime_columns = TABLES[table]
+    names = columns.split(", ")
+    if not isinstance(result, pd.DataFrame):
+        result = pd.DataFrame(columns=names)
+    for column in names:
+        if column not in result.columns:  # e.g. recorded before the column was fetched
+            result[column] = None
+    for column in datetime_columns:
+        result[column] = pd.to_datetime(result[column])
+    return result
 
-logger.info("Executing query for block events")
-df = xatu.execute_query("""
-    SELECT slot, min(event_date_time) as event_date_time, meta_network_name, meta_consensus_implementation 
-    FROM beacon_api_eth_v1_events_block
-    WHERE updated_date_time > NOW() - INTERVAL 10 MINUTE
-    GROUP BY slot, meta_network_name, meta_consensus_implementation
-    ORDER BY slot DESC
-""", columns="slot, timestamp, network, client")
+def fetch_table(xatu, table, network, **bounds):
+    """
+    Fetch the rows of `table` ('reorgs', 'block_events' or 'beacon_blocks')
+    of one network within `bounds` (see xatu_source.SlotSource).
+    """
+    return as_frame(getattr(xatu, f"fetch_{table}")(network, **bounds), table)
 
-logger.info(f"Query returned {len(df)} rows")
+def fetch_recent(xatu, state, table, networks=None):
+    """
+    Fetch the recently updated rows of `table` of `networks`: networks with a
+    watermark only fetch rows updated after it (minus a short lookback), the
+    others fall back to the full window of the table.
+    
+    Parameters:
+        xatu (SlotSource): Source to fetch from.
+        state (IngestState): State holding the watermarks.
+        table (str): Table to fetch, also the name of its watermark.
+        networks (list): Networks to fetch; defaults to all configured networks.
+        
+    Returns:
+        pd.DataFrame: Rows of all networks.
+    """
+    if networks is None:
+        networks = NETWORKS
+    frames = []
+    for network in networks:
+        bounds = {"window": FETCH_WINDOWS[table]}
+        mark = state.watermark(network, table)
+        if mark is not None:
+            bounds["since"] = pd.Timestamp(mark['time']) - pd.Timedelta(seconds=WATERMARK_LOOKBACK_SECONDS)
+            bounds["first_slot"] = mark['slot'] - RETAINED_SLOTS
+        frames.append(fetch_table(xatu, table, network, **bounds))
+    frames = [frame for frame in frames if len(frame) > 0]
+    if not frames:
+        return as_frame(None, table)
+    return pd.concat(frames, ignore_index=True)
+
+def keep_recent_slots(df, by, slots=RETAINED_SLOTS):
+    """
+    Keep only rows within `slots` of the newest slot of their group.
+    """
+    if len(df) == 0:
+        return df
+    newest = df.groupby(by)['slot'].transform('max')
+    return df[df['slot'] >= newest - slots]
 
-grouped = df.groupby(['client', 'network'])['slot'].agg(['min', 'max']).reset_index()
+def reorg_table(potential_reorgs):
+    """
+    Expand reported reorgs into the rows to mark: every client that reported a
+    reorg on a network gets all reorged slots of that network marked.
+    
+    Returns:
+        pd.DataFrame: Reorg table with one row per ['network', 'client', 'slot'] to mark.
+    """
+    reorg_slots = potential_reorgs[["network", "slot"]].drop_duplicates()
+    reorg_clients = potential_reorgs[["network", "client"]].drop_duplicates()
+    reorgs = reorg_clients.merge(reorg_slots, on="network")[["network", "client", "slot"]]
+    if len(reorgs) > 0:
+        logger.info(f"Found {len(reorg_slots)} reorged slots reported by {len(reorg_clients)} (network, client) pairs")
+    else:
+        logger.debug("No reorg data found")
+    return reorgs
+
+def get_reorgs(xatu, state, networks=None):
+    """
+    Fetch recent chain reorgs of `networks` (default: all configured networks)
+    and merge them into the reorgs retained from previous runs.
+    
+    Returns:
+        pd.DataFrame: Reorg table with one row per ['network', 'client', 'slot'] to mark.
+    """
+    logger.debug("Fetching reorg data")
+    potential_reorgs = fetch_recent(xatu, state, "reorgs", networks)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"potential_reorgs: {potential_reorgs}")
+    new = potential_reorgs
+
+    # Merge with the reorgs seen in previous runs
+    retained = state.frame("reorgs")
+    if retained is not None:
+        potential_reorgs = pd.concat([retained, potential_reorgs], ignore_index=True)
+    potential_reorgs = (potential_reorgs
+                        .sort_values("event_date_time")
+                        .drop_duplicates(subset=["slot", "network", "client"], keep="last"))
+    # Forget reorgs of slots that have left the retained block window
+    newest = potential_reorgs["network"].map(
+        lambda network: (state.watermark(network, "block_events") or {"slot": 0})["slot"])
+    potential_reorgs = potential_reorgs[potential_reorgs["slot"] >= newest - RETAINED_SLOTS].reset_index(drop=True)
+    state.frames["reorgs"] = potential_reorgs
+    state.advance("reorgs", new, "event_date_time")
+
+    potential_reorgs = potential_reorgs[potential_reorgs["network"].isin(NETWORKS if networks is None else networks)]
+    return reorg_table(potential_reorgs)
+
+def get_block_events(xatu, state, networks=None):
+    """
+    Fetch the first time each client saw each recent slot of `networks` (default:
+    all configured networks), keeping only the last 50 slots of every
+    (network, client) pair. Only rows past the watermark are
+    queried; they are merged into the rows retained from previous runs.
+    """
+    logger.debug("Executing query for block events")
+    new = fetch_recent(xatu, state, "block_events", networks)
+
+    logger.debug(f"Query returned {len(new)} rows")
+
+    df = new
+    retained = state.frame("block_events")
+    if retained is not None and len(retained) > 0:
+        # A slot seen again keeps the earliest time any run saw it, and the root seen then
+        df = (pd.concat([retained, new], ignore_index=True)
+              .sort_values('timestamp', kind='mergesort')
+              .groupby(['slot', 'network', 'client'], as_index=False)
+              .agg(timestamp=('timestamp', 'min'), hash=('hash', 'first'),
+                   updated_date_time=('updated_date_time', 'max')))
+
+    df = keep_recent_slots(df, ['client', 'network']).reset_index(drop=True)
+    state.frames["block_events"] = df
+    state.advance("block_events", new, "updated_date_time")
+
+    df = df.drop(columns=['updated_date_time'])
+    df["status"] = "produced"
+    return df
 
-df = df.merge(grouped, on=['client', 'network'], how='left', suffixes=('', '_client_network'))
+def get_beacon_blocks(xatu, state, networks=None):
+    """
+    Fetch block and parent roots of recent slots of `networks` (default: all
+    configured networks), merged into the roots retained from previous runs.
+    """
+    logger.debug("Executing query for beacon blocks")
+    new = fetch_recent(xatu, state, "beacon_blocks", networks)
 
-df = df[df['slot'] >= df['max'] - 50]
+    logger.debug(f"Beacon block query returned {len(new)} rows")
 
-df = df.drop(columns=['min', 'max'])
+    info = new
+    retained = state.frame("beacon_blocks")
+    if retained is not None and len(retained) > 0:
+        info = (pd.concat([retained, new], ignore_index=True)
+                .sort_values("updated_date_time")
+                .drop_duplicates(subset=["slot", "hash", "parent_hash", "network"], keep="last"))
 
-df["status"] = "produced"
+    # Roots are looked up for the retained block events, which may trail the
+    # newest block by up to RETAINED_SLOTS slots per client
+    info = keep_recent_slots(info, "network", 2 * RETAINED_SLOTS).reset_index(drop=True)
+    state.frames["beacon_blocks"] = info
+    state.advance("beacon_blocks", new, "updated_date_time")
+    return info.drop(columns=['updated_date_time'])
 
 def fill_missing_slots(df):
     """
@@ -103,283 +286,573 @@ def fill_missing_slots(df):
     Returns:
         pd.DataFrame: DataFrame with continuous slot numbers for each (network, client) and a new 'status' column.
     """
-    logger.info("Filling missing slots")
-    dfs = []
-    # Group the data by network and client
-    for (network, client), group in df.groupby(['network', 'client']):
-        min_slot = group['slot'].min()
-        max_slot = group['slot'].max()
-        logger.info(f"Network: {network}, Client: {client}, Min slot: {min_slot}, Max slot: {max_slot}")
-        # Create a DataFrame with every slot between min and max (inclusive)
-        full_slots = pd.DataFrame({'slot': range(min_slot, max_slot + 1)})
-        full_slots['network'] = network
-        full_slots['client'] = client
-        # Merge the full slot range with the existing group data (left merge ensures all slots are present)
-        merged = pd.merge(full_slots, group, on=['slot', 'network', 'client'], how='left')
-        # Ensure the timestamp column is in datetime format
-        merged['timestamp'] = pd.to_datetime(merged['timestamp'])
-        # For slots with no existing row (i.e. missing timestamp), mark status as 'missed'
-        # Otherwise mark as 'produced'
-        merged['status'] = np.where(merged['timestamp'].isna(), 'missed', merged['status'])
-        dfs.append(merged)
-    result = pd.concat(dfs, ignore_index=True)
-    logger.info(f"After filling missing slots: {len(result)} rows")
+    logger.debug("Filling missing slots")
+    keys = ['network', 'client', 'slot']
+    df = df.drop_duplicates(subset=keys)
+    bounds = df.groupby(['network', 'client'])['slot'].agg(['min', 'max'])
+    lengths = (bounds['max'] - bounds['min'] + 1).to_numpy(dtype=np.int64)
+    # Every slot between min and max (inclusive) of each (network, client), as one index
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    full_index = pd.MultiIndex.from_arrays([
+        np.repeat(bounds.index.get_level_values('network'), lengths),
+        np.repeat(bounds.index.get_level_values('client'), lengths),
+        np.repeat(bounds['min'].to_numpy(), lengths) + offsets,
+    ], names=keys)
+    result = df.set_index(keys).reindex(full_index).reset_index()
+    result = result[['slot', 'network', 'client'] + [c for c in result.columns if c not in keys]]
+    # Ensure the timestamp column is in datetime format
+    result['timestamp'] = pd.to_datetime(result['timestamp'])
+    # For slots with no existing row (i.e. missing timestamp), mark status as 'missed'
+    # Otherwise keep 'produced'
+    result['status'] = np.where(result['timestamp'].isna(), 'missed', result['status'])
+    logger.debug(f"After filling missing slots: {len(result)} rows")
     return result
 
-def update_status(df, reorg_dict):
+def update_status(df, reorgs):
     """
-    Update the 'status' column based on the reorg dictionary. For each (network, client) pair, 
-    if a row's slot is in the provided reorgs set, its status is updated to 'reorged'.
+    Update the 'status' column based on the reorg table: every row whose
+    (network, client, slot) appears in it is set to 'reorged'.
     
     Parameters:
         df (pd.DataFrame): DataFrame with a continuous slot range and a 'status' column.
-        reorg_dict (dict): Dictionary structured as:
-                           { network: { client: { 'reorgs': set(slots) } } }
+        reorgs (pd.DataFrame): Reorg table with columns ['network', 'client', 'slot'].
                            
     Returns:
         pd.DataFrame: DataFrame with updated status values.
     """
-    logger.info("Updating status based on reorgs")
-    for network, clients in reorg_dict.items():
-        for client, data in clients.items():
-            reorgs = data.get('reorgs', set())
-            mask = (df['network'] == network) & (df['client'] == client) & (df['slot'].isin(reorgs))
-            df.loc[mask, 'status'] = 'reorged'
+    logger.debug("Updating status based on reorgs")
+    keys = ['network', 'client', 'slot']
+    if len(reorgs) == 0:
+        return df
+    reorg_index = pd.MultiIndex.from_frame(reorgs[keys].astype({'slot': np.int64}))
+    mask = pd.MultiIndex.from_frame(df[keys]).isin(reorg_index)
+    df.loc[mask, 'status'] = 'reorged'
     return df
 
-# Step 1: Fill in missing slots and mark them as 'missed'
-df_filled = fill_missing_slots(df)
-
-# Step 2: Update the status of rows corresponding to reorgs to 'reorged'
-df_updated = update_status(df_filled, reorg_dict)
-
-# Optionally, sort the DataFrame for clarity
-df_updated = df_updated.sort_values(by=['network', 'client', 'slot']).reset_index(drop=True)
-
-logger.info("Executing query for beacon blocks")
-info = xatu.execute_query("""
-    SELECT DISTINCT slot, block_root, parent_root, meta_network_name 
-    FROM beacon_api_eth_v2_beacon_block
-    WHERE updated_date_time > NOW() - INTERVAL 20 MINUTE
-    ORDER BY slot DESC
-""", columns="slot, hash, parent_hash, network")
-
-logger.info(f"Beacon block query returned {len(info)} rows")
-
-df = df_updated
-df = pd.merge(df, info, how="left", left_on=["slot", "network"], right_on=["slot", "network"])
-
-logger.info(f"After merging with beacon blocks: {len(df)} rows")
-
-SLOT_0_TIMESTAMP_MS = 1606824023000  # Slot 0 timestamp in milliseconds
-SLOT_DURATION_MS = 12000             # Slot duration in milliseconds
-
-def fill_missing_timestamp(row):
-    # If timestamp is not NaN, just return it
-    if pd.notna(row['timestamp']):
-        return row['timestamp']
-    # Compute the slot start time (in ms) and add 8 seconds (8000 ms)
-    new_ts_ms = SLOT_0_TIMESTAMP_MS + row['slot'] * SLOT_DURATION_MS + 8000
-    # Convert to a UTC datetime string with millisecond precision.
-    dt = datetime.utcfromtimestamp(new_ts_ms / 1000)
-    # Format to a string matching the formats used later (e.g. 'YYYY-MM-DD HH:MM:SS.%f')
-    # Then trim to 3 digits of milliseconds
-    return dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-
-# Apply the function to update the 'timestamp' column only where it's NaN.
-logger.info("Filling missing timestamps")
-df['timestamp'] = pd.Series(df.apply(fill_missing_timestamp, axis=1), dtype='datetime64[ns]')
-
-def parse_datetime(event_time):
-    # If the event_time is a Timestamp, no need to parse it
-    if isinstance(event_time, pd.Timestamp):
-        dt = event_time
-    else:
-        # If it's a string, parse it
-        try:
-            dt = datetime.strptime(event_time, '%Y-%m-%d %H:%M:%S.%f')
-        except ValueError:
-            dt = datetime.strptime(event_time, '%Y-%m-%d %H:%M:%S')
+def fill_missing_timestamps(df):
+    """
+    Return the 'timestamp' column with every missing value replaced by the slot
+    start time plus 8 seconds, computed on int64 epoch milliseconds.
     
-    return dt.replace(tzinfo=pytz.UTC).timestamp() * 1000  # Return in milliseconds
-
-def get_seconds_in_slot(first_seen_ts: int, slot: int) -> float:
-    slot_offset = slot * SLOT_DURATION_MS
-    time_in_slot_ms = (first_seen_ts - SLOT_0_TIMESTAMP_MS - slot_offset) % SLOT_DURATION_MS
-    return round(time_in_slot_ms / 1000, 3)
+    Parameters:
+        df (pd.DataFrame): DataFrame with 'slot' and 'timestamp' columns.
+        
+    Returns:
+        pd.Series: datetime64[ns] timestamps.
+    """
+    slot_ms = SLOT_0_TIMESTAMP_MS + df['slot'].to_numpy(dtype=np.int64) * SLOT_DURATION_MS + 8000
+    fallback = pd.Series(pd.to_datetime(slot_ms, unit='ms'), index=df.index)
+    return pd.to_datetime(df['timestamp']).fillna(fallback).astype('datetime64[ns]')
 
-# Apply the function directly on the timestamp column
-logger.info("Calculating timestamp seconds")
-df["timestamp_seconds"] = df["timestamp"].apply(parse_datetime)
-df["seconds_in_slot"] = df.apply(lambda x: get_seconds_in_slot(x["timestamp_seconds"], x["slot"]), axis=1)
+def add_roots_and_timings(df, info):
+    """
+    Join the block and parent roots onto the slot rows and derive their timings.
+    
+    Parameters:
+        df (pd.DataFrame): Rows with gaps filled and reorgs marked.
+        info (pd.DataFrame): Roots with columns ['slot', 'hash', 'parent_hash', 'network'].
+        
+    Returns:
+        pd.DataFrame: Rows with 'hash', 'parent_hash', a 'timestamp' for every
+                      row, 'timestamp_seconds' and 'seconds_in_slot'.
+    """
+    # Each client keeps the root it saw, so clients on different forks of a
+    # slot disagree; its parent is looked up by that root. Rows without a
+    # root of their own (missed slots) take the roots stored for the slot.
+    if 'hash' not in df.columns:
+        df = df.assign(hash=None)
+    seen = df['hash'].notna()
+    parents = info[['network', 'hash', 'parent_hash']].drop_duplicates(subset=['network', 'hash'])
+    df = pd.concat([
+        pd.merge(df[seen], parents, how="left", on=["network", "hash"]),
+        pd.merge(df[~seen].drop(columns=['hash']), info, how="left", on=["slot", "network"]),
+    ], ignore_index=True)
+
+    logger.debug(f"After merging with beacon blocks: {len(df)} rows")
+
+    # Update the 'timestamp' column only where it's NaN.
+    logger.debug("Filling missing timestamps")
+    df['timestamp'] = fill_missing_timestamps(df)
+
+    logger.debug("Calculating timestamp seconds")
+    df["timestamp_seconds"] = to_epoch_ms(df["timestamp"])
+    df["seconds_in_slot"] = get_seconds_in_slot(df["timestamp_seconds"].to_numpy(), df["slot"].to_numpy())
+    return df
 
-logger.info("Preparing to save data to files")
-try:
-    known = sorted(os.listdir("data"), key=lambda x: x.split(".")[0])
-    logger.info(f"Found {len(known)} existing data files")
-except:
-    logger.info("No existing data directory found, will create it")
-    known = list()
+def to_epoch_ms(timestamps):
+    """
+    Convert naive UTC timestamps to float epoch milliseconds.
+    
+    Matches `Timestamp.timestamp() * 1000`, which rounds to whole microseconds:
+    for microsecond-aligned values (all that ClickHouse returns) that rounding is
+    an exact integer division. Anything finer goes through the scalar path.
+    """
+    ns = timestamps.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    ms = (ns // 1000) / 1e6 * 1000
+    unaligned = ns % 1000 != 0
+    if unaligned.any():
+        ms[unaligned] = [round(value / 1e9, 6) * 1000 for value in ns[unaligned].tolist()]
+    return ms
+
+def round_half_even(values, decimals):
+    """
+    Round an array like Python's round(). np.round scales before rounding and can
+    land on the other side of a tie; the few values within float noise of one
+    are rounded one by one so results match the scalar code exactly.
+    """
+    scaled = values * 10 ** decimals
+    rounded = np.round(values, decimals)
+    ties = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if ties.any():
+        rounded[ties] = [round(value, decimals) for value in values[ties].tolist()]
+    return rounded
+
+def get_seconds_in_slot(first_seen_ts, slot):
+    """
+    Seconds between the start of `slot` and `first_seen_ts` (epoch ms), rounded
+    to milliseconds. Works on scalars and on NumPy arrays.
+    """
+    slot_offset = np.asarray(slot, dtype=np.int64) * SLOT_DURATION_MS
+    time_in_slot_ms = np.mod(np.asarray(first_seen_ts, dtype=np.float64) - SLOT_0_TIMESTAMP_MS - slot_offset,
+                             SLOT_DURATION_MS)
+    rounded = round_half_even(np.atleast_1d(time_in_slot_ms / 1000), 3)
+    return rounded if np.ndim(time_in_slot_ms) else float(rounded[0])
 
-def df_to_data(df):
+def format_timestamps(timestamps):
     """
-    Convert DataFrame to the format expected by save_data_to_files.
-    Returns a dictionary with slot numbers as keys and client data as values.
+    Format timestamps the way str(pd.Timestamp) does: microseconds are only
+    shown when they are not zero.
     """
-    logger.info("Converting DataFrame to slot data format")
-    slots_data = {}
-    
-    # Add logging to check the DataFrame
-    logger.info(f"DataFrame shape: {df.shape}")
-    logger.info(f"DataFrame columns: {df.columns.tolist()}")
-    logger.info(f"Networks in DataFrame: {df['network'].unique().tolist()}")
-    logger.info(f"Clients in DataFrame: {df['client'].unique().tolist()}")
-    logger.info(f"Sample of DataFrame: {df.head().to_dict('records')}")
+    formatted = timestamps.dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+    ns = timestamps.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    whole_seconds = ns % 1_000_000_000 == 0
+    formatted = formatted.where(~whole_seconds, formatted.str.slice(0, 19))
+    # Sub-microsecond values are never returned by ClickHouse; keep them exact anyway
+    sub_us = ns % 1000 != 0
+    if sub_us.any():
+        formatted[sub_us] = timestamps[sub_us].map(str)
+    return formatted
+
+def serialize_slots(df):
+    """
+    Serialize the final DataFrame of one network straight to per-slot JSON.
     
-    # Group by slot
-    for slot, group in df.groupby('slot'):
-        slot_data = {}
-        
-        # Process each client in the slot
-        for client, client_group in group.groupby('client'):
-            # Get the first row for this client (should be only one per slot/client)
-            row = client_group.iloc[0]
-            
-            # Add logging to check the row data
-            logger.info(f"Processing slot {slot}, client {client}, network {row['network']}")
-            
-            # Create client data with all fields expected by the frontend
-            client_data = {
-                "attestation_count": 1 if row['status'] == 'produced' else 0,
-                "attestation_percentage": 100.0 if row['status'] == 'produced' else 0.0,
-                "head_vote": row['status'] == 'produced',
-                "target_vote": row['status'] == 'produced',
-                "source_vote": row['status'] == 'produced',
-                "reorg": row['status'] == 'reorged',
-                # Add these fields for the SlotDetails component
-                "slot": int(row['slot']),
-                "network": row['network'],
-                "client": client,
-                "timestamp": str(row['timestamp']),
-                "status": row['status'],
-                "hash": row.get('hash', None),
-                "parent_hash": row.get('parent_hash', None),
-                "timestamp_seconds": float(row['timestamp_seconds']),
-                "seconds_in_slot": float(row['seconds_in_slot'])
-            }
-            
-            slot_data[client] = client_data
+    Parameters:
+        df (pd.DataFrame): Rows of one network with the columns produced by the pipeline.
         
-        slots_data[str(slot)] = slot_data
-    
-    return slots_data
-
-def save_data_to_files(slots_data, network):
+    Returns:
+        dict: { slot (int): JSON bytes of { client: client data } }, clients in
+              alphabetical order and one row per (slot, client), as the
+              frontend expects.
+    """
+    logger.debug(f"Serializing {len(df)} rows")
+    # Keep the first row of each (slot, client), in the original row order
+    df = (df.sort_values(['slot', 'client'], kind='mergesort')
+            .drop_duplicates(subset=['slot', 'client'], keep='first'))
+
+    status = df['status']
+    produced = (status == 'produced').tolist()
+    columns = zip(
+        df['slot'].tolist(),
+        df['network'].tolist(),
+        df['client'].tolist(),
+        format_timestamps(df['timestamp']).tolist(),
+        status.tolist(),
+        produced,
+        (status == 'reorged').tolist(),
+        # Missing roots become null
+        df['hash'].astype(object).where(df['hash'].notna(), None).tolist(),
+        df['parent_hash'].astype(object).where(df['parent_hash'].notna(), None).tolist(),
+        df['timestamp_seconds'].astype(float).tolist(),
+        df['seconds_in_slot'].astype(float).tolist(),
+    )
+
+    slots = {}
+    for slot, network, client, timestamp, status, produced, reorged, hash, parent_hash, ts_seconds, in_slot in columns:
+        # Create client data with all fields expected by the frontend
+        slots.setdefault(slot, {})[client] = {
+            "attestation_count": 1 if produced else 0,
+            "attestation_percentage": 100.0 if produced else 0.0,
+            "head_vote": produced,
+            "target_vote": produced,
+            "source_vote": produced,
+            "reorg": reorged,
+            # Add these fields for the SlotDetails component
+            "slot": slot,
+            "network": network,
+            "client": client,
+            "timestamp": timestamp,
+            "status": status,
+            "hash": hash,
+            "parent_hash": parent_hash,
+            "timestamp_seconds": ts_seconds,
+            "seconds_in_slot": in_slot,
+        }
+    return {slot: dumps(data) for slot, data in slots.items()}
+
+# Segment store of each network directory, kept open across runs by the scheduler
+_stores = {}
+
+def get_segment_store(output_dir):
     """
-    Save the data to JSON files
+    Return the segment store writing to `output_dir`, opening and indexing it
+    on first use.
     """
-    # Add logging to check the slots_data
-    logger.info(f"Saving data for network: {network}")
-    logger.info(f"Number of slots to save: {len(slots_data)}")
-    if len(slots_data) > 0:
-        sample_slot = next(iter(slots_data))
-        sample_client = next(iter(slots_data[sample_slot]))
-        logger.info(f"Sample slot: {sample_slot}, Sample client: {sample_client}")
-        logger.info(f"Sample data: {slots_data[sample_slot][sample_client]}")
+    store = _stores.get(output_dir)
+    if store is None:
+        store = _stores[output_dir] = SegmentStore(output_dir)
+    return store
+
+def save_data_to_files(slots_data, network, content_hashes=None):
+    """
+    Append serialized slots to the network's segment store, skipping slots whose
+    content has not changed since the previous run. The batch is published with
+    a single commit marker once every record is written.
     
+    Parameters:
+        slots_data (dict): { slot: JSON bytes } as returned by serialize_slots.
+        network (str): Network the slots belong to.
+        content_hashes (dict): { slot: digest } of the records written by previous
+                               runs; updated in place. Without it every slot is written.
+        
+    Returns:
+        int: Number of slots written.
+    """
     # Determine the output directory based on the environment
-    if os.environ.get('DYNO'):  # We're on Heroku
-        base_dir = "/app/data"
-        output_dir = f"{base_dir}/{network}"
-    else:  # We're running locally
-        # Use absolute path to avoid nested directories
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        parent_dir = os.path.dirname(current_dir)
-        base_dir = os.path.join(parent_dir, "data")
-        output_dir = os.path.join(base_dir, network)
+    base_dir = get_data_dir()
+    output_dir = os.path.join(base_dir, network)
     
-    logger.info(f"Saving data to directory: {output_dir}")
+    logger.debug(f"Saving {len(slots_data)} slots for network {network} to directory: {output_dir}")
     
     # Create the output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Make the parent directory readable by all users
-    try:
-        logger.info(f"Attempting to set permissions on directory {base_dir} to 0o755")
-        os.chmod(base_dir, 0o755)  # rwxr-xr-x
-        logger.info(f"Successfully set permissions on directory {base_dir}")
-    except Exception as e:
-        logger.error(f"Error setting permissions on directory {base_dir}: {e}")
+    # Make the parent and network directories readable by all users
+    for directory in (base_dir, output_dir):
+        try:
+            os.chmod(directory, 0o755)  # rwxr-xr-x
+        except Exception as e:
+            logger.error(f"Error setting permissions on directory {directory}: {e}")
+    
+    if content_hashes is None:
+        content_hashes = {}
+    store = get_segment_store(output_dir)
+    changed = {}
+    for slot, body in slots_data.items():
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        if content_hashes.get(slot) == digest and store.revision(slot) is not None:
+            continue
+        changed[slot] = body
+        content_hashes[slot] = digest
+    
+    # Forget slots that are no longer produced by the pipeline
+    for slot in set(content_hashes) - set(slots_data):
+        del content_hashes[slot]
     
-    # Make the network directory readable by all users
-    try:
-        logger.info(f"Attempting to set permissions on directory {output_dir} to 0o755")
-        os.chmod(output_dir, 0o755)  # rwxr-xr-x
-        logger.info(f"Successfully set permissions on directory {output_dir}")
-    except Exception as e:
-        logger.error(f"Error setting permissions on directory {output_dir}: {e}")
+    # Append the whole batch and publish it at once; the API picks up exactly these records
+    sequence = store.append(changed)
+    if sequence is not None:
+        logger.debug(f"Committed {len(changed)} slots for {network} as commit {sequence}")
     
-    saved_slots = []
-    for i, (slot, data) in enumerate(slots_data.items()):
-        logger.info(f"Processing slot {slot}/{list(slots_data.keys())[-1]}")
+    SLOTS_WRITTEN.labels(network).inc(len(changed))
+    logger.info(f"Saved {len(changed)} of {len(slots_data)} slots for {network}, "
+                f"{len(slots_data) - len(changed)} unchanged")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Saved slots of {network}: {sorted(changed)}")
+    return len(changed)
+
+# Shared snapshot of each network directory, kept mapped across runs by the scheduler
+_snapshots = {}
+
+def save_snapshot(network):
+    """
+    Publish the newest SLOT_INDEX_CAPACITY slots of a network and their
+    revisions to its shared snapshot, from which every API worker serves
+    /api/slots, including projected and version-cursor polls, without parsing,
+    serializing or compressing anything itself.
+    
+    Parameters:
+        network (str): Network whose segment store was just appended to.
+    """
+    output_dir = os.path.join(get_data_dir(), network)
+    store = get_segment_store(output_dir)
+    store.refresh()  # a backfill may have appended since this process last did
+    records = []
+    for slot in store.latest_slots(SLOT_INDEX_CAPACITY):
+        body = store.read_raw(slot)
+        if body is not None and body != b"{}":  # the index skips empty slots as well
+            records.append((slot, store.revision(slot), b'{"slot":%d,"data":' % slot + body + b'}'))
+    writer = _snapshots.get(output_dir)
+    if writer is None:
+        writer = _snapshots[output_dir] = SnapshotWriter(os.path.join(output_dir, SNAPSHOT_FILE))
+    generation = writer.publish(records, revision=store.highest_revision)
+    if generation is not None:
+        logger.debug(f"Published snapshot generation {generation} of {network} with {len(records)} slots")
+
+# Column store of each network directory, kept open across runs by the scheduler
+_column_stores = {}
+# Rolling statistics of each network directory and the version of the stats.json
+# they were last published to, kept across runs by the scheduler
+_stats = {}
+
+def column_rows(df):
+    """
+    Reduce the rows of one network to the columns of the history, with the
+    timestamp as whole milliseconds into the slot.
+    
+    Parameters:
+        df (pd.DataFrame): Rows of one network with the columns produced by the pipeline.
         
-        # Convert the data to JSON
-        json_data = {}
-        for client, values in data.items():
-            # Include all fields from the original data
-            json_data[client] = {
-                # Basic attestation data
-                "attestation_count": int(values["attestation_count"]),
-                "attestation_percentage": float(values["attestation_percentage"]),
-                "head_vote": bool(values["head_vote"]),
-                "target_vote": bool(values["target_vote"]),
-                "source_vote": bool(values["source_vote"]),
-                "reorg": bool(values["reorg"]) if "reorg" in values else False,
-                # Additional fields for SlotDetails component
-                "slot": int(values["slot"]),
-                "network": values["network"],
-                "client": values["client"],
-                "timestamp": values["timestamp"],
-                "status": values["status"],
-                "hash": values.get("hash", None),
-                "parent_hash": values.get("parent_hash", None),
-                "timestamp_seconds": float(values["timestamp_seconds"]),
-                "seconds_in_slot": float(values["seconds_in_slot"])
-            }
+    Returns:
+        dict: Equal-length 'slot', 'client', 'status', 'ms_in_slot', 'hash' and
+              'parent_hash' sequences, one entry per (slot, client).
+    """
+    # Same row per (slot, client) as serialize_slots keeps
+    df = (df.sort_values(['slot', 'client'], kind='mergesort')
+            .drop_duplicates(subset=['slot', 'client'], keep='first'))
+    slots = df['slot'].to_numpy(dtype=np.int64)
+    ms_in_slot = df['timestamp_seconds'].to_numpy(dtype=float) - (SLOT_0_TIMESTAMP_MS + slots * SLOT_DURATION_MS)
+    return {
+        'slot': slots,
+        'client': df['client'].tolist(),
+        'status': df['status'].tolist(),
+        'ms_in_slot': np.where(np.isnan(ms_in_slot), NO_TIMESTAMP, np.rint(ms_in_slot)).astype(np.int32),
+        'hash': df['hash'].astype(object).where(df['hash'].notna(), None).tolist(),
+        'parent_hash': df['parent_hash'].astype(object).where(df['parent_hash'].notna(), None).tolist(),
+    }
+
+def get_column_store(network):
+    """
+    Return the writable column store of a network, opening it on first use.
+    """
+    directory = os.path.join(get_data_dir(), network, "columns")
+    store = _column_stores.get(directory)
+    if store is None:
+        store = _column_stores[directory] = ColumnStore(directory, writable=True)
+    return store
+
+def save_columns(rows, network):
+    """
+    Write the rows of one network to its columnar history.
+    
+    Parameters:
+        rows (dict): Columns as returned by column_rows.
+        network (str): Network the rows belong to.
+    """
+    get_column_store(network).write(rows['slot'], rows['client'], rows['status'],
+                                    rows['ms_in_slot'], rows['hash'], rows['parent_hash'])
+    logger.debug(f"Stored {len(rows['slot'])} rows for {network} in the column history")
+
+def rebuild_stats(network, newest):
+    """
+    Build the rolling per-client statistics of a network from its column
+    history, as of slot `newest`.
+    
+    Parameters:
+        network (str): Network to build the statistics of.
+        newest (int): Newest slot of the statistics' windows.
         
-        # Save the data to a file
-        file_path = os.path.join(output_dir, f"{slot}.json")
-        logger.info(f"Saving data to file: {file_path}")
-        logger.info(f"JSON data to save: {json_data}")
-        with open(file_path, 'w') as f:
-            json.dump(json_data, f)
+    Returns:
+        RollingStats: Statistics over the rows stored within the windows.
+    """
+    stats = RollingStats(network)
+    store = get_column_store(network)
+    history = store.read(newest - stats.span + 1, newest)
+    clients = store.clients
+    stats.update(history['slot'],
+                 [clients[code - 1] for code in history['client'].tolist()],
+                 [STATUSES[code - 1] if code else None for code in history['status'].tolist()],
+                 history['ms_in_slot'].tolist(), missing=NO_TIMESTAMP)
+    logger.info(f"Rebuilt {network} statistics from {len(history['slot'])} rows of history")
+    return stats
+
+def publish_stats(stats, network):
+    """
+    Write the summary of a network's statistics to stats.json next to the
+    slot data. Returns the version of the written file.
+    """
+    path = os.path.join(get_data_dir(), network, STATS_FILE)
+    write_file_atomic(path, dumps(stats.summary()))
+    return file_version(path)
+
+def save_stats(rows, network):
+    """
+    Fold the rows of one network into its rolling per-client statistics and
+    publish them as stats.json next to the slot data. After a restart, or once
+    another process (a backfill) published stats.json, the statistics are
+    rebuilt from the column history first.
+    
+    Parameters:
+        rows (dict): Columns as returned by column_rows.
+        network (str): Network the rows belong to.
+    """
+    output_dir = os.path.join(get_data_dir(), network)
+    stats, version = _stats.get(output_dir, (None, None))
+    if stats is None or version != file_version(os.path.join(output_dir, STATS_FILE)):
+        newest = stats.newest if stats is not None else None
+        if len(rows['slot']):
+            newest = max(int(rows['slot'].max()), newest if newest is not None else 0)
+        stats = RollingStats(network) if newest is None else rebuild_stats(network, newest)
+    stats.update(rows['slot'], rows['client'], rows['status'], rows['ms_in_slot'].tolist(), missing=NO_TIMESTAMP)
+    _stats[output_dir] = (stats, publish_stats(stats, network))
+
+# Manifest of each network directory, kept across runs by the scheduler
+_manifests = {}
+
+def save_manifest(rows, network):
+    """
+    Publish the manifest of a network (clients ever seen, stored slot range,
+    row counts and update time) as manifest.json next to the slot data, for
+    the API to serve from memory. After a restart the clients are carried
+    over from the manifest on disk.
+    
+    Parameters:
+        rows (dict): Columns as returned by column_rows.
+        network (str): Network the rows belong to.
+    """
+    output_dir = os.path.join(get_data_dir(), network)
+    previous = _manifests.get(output_dir)
+    if previous is None:
+        previous = load_manifest(output_dir)[0]
+    manifest = _manifests[output_dir] = update_manifest(previous, network, get_segment_store(output_dir),
+                                                        rows['client'], rows['status'], rows['slot'].tolist())
+    write_file_atomic(os.path.join(output_dir, MANIFEST_FILE), dumps(manifest))
+
+# Epoch and hour rollups of each network directory, kept across runs by the scheduler
+_rollups = {}
+
+def save_rollups(rows, network):
+    """
+    Bring the epoch and hour rollups of a network up to date with its column
+    history and publish them under rollups/ next to the slot data. Buckets are
+    only summarized again while their slots can still change.
+    
+    Parameters:
+        rows (dict): Columns as returned by column_rows.
+        network (str): Network the rows belong to.
+    """
+    if len(rows['slot']) == 0:
+        return
+    output_dir = os.path.join(get_data_dir(), network)
+    rollups = _rollups.get(output_dir)
+    if rollups is None:
+        rollups = _rollups[output_dir] = SlotRollups(network, output_dir)
+    rollups.update(get_column_store(network), int(rows['slot'].max()))
+
+def get_data_dir():
+    """
+    Get the base directory the slot files are written to.
+    """
+    return config.get_data_dir()
+
+def get_state_path(network):
+    """
+    Get the file the ingest state of a network is persisted to between runs.
+    """
+    return os.path.join(get_data_dir(), network, "ingest_state.json")
+
+def run(xatu, state=None, networks=None):
+    """
+    Run the full pipeline once: query xatu, fill gaps, mark reorgs, compute
+    timings and write the slot files of every network.
+    
+    Parameters:
+        xatu (SlotSource): Source all rows are fetched from; reused across runs.
+                           See xatu_source.py for the live and stand-in sources.
+        state (IngestState): Watermarks and rows retained from previous runs; it is
+                             updated in place. Without it, full windows are queried.
+        networks (list): Networks to ingest; defaults to all configured networks.
         
-        # Make the file readable by all users (0644 permissions)
+    Returns:
+        dict: Duration in seconds of each stage of the run, plus 'total'.
+    """
+    if state is None:
+        state = IngestState()
+    if networks is None:
+        networks = NETWORKS
+    timings = {}
+    rows = {}
+    label = ",".join(networks)
+    started = time.perf_counter()
+    stage_started = started
+
+    def finish_stage(name, row_count):
+        nonlocal stage_started
+        now = time.perf_counter()
+        timings[name] = now - stage_started
+        rows[name] = row_count
+        STAGE_SECONDS.labels(label, name).observe(timings[name])
+        STAGE_ROWS.labels(label, name).set(row_count)
+        stage_started = now
+
+    logger.debug("Getting reorg data")
+    reorgs = get_reorgs(xatu, state, networks)
+    finish_stage("query_reorgs", len(reorgs))
+
+    df = get_block_events(xatu, state, networks)
+    finish_stage("query_block_events", len(df))
+
+    # Step 1: Fill in missing slots and mark them as 'missed'
+    df_filled = fill_missing_slots(df)
+    finish_stage("fill_missing_slots", len(df_filled))
+
+    # Step 2: Update the status of rows corresponding to reorgs to 'reorged'
+    df_updated = update_status(df_filled, reorgs)
+
+    # Optionally, sort the DataFrame for clarity
+    df_updated = df_updated.sort_values(by=['network', 'client', 'slot']).reset_index(drop=True)
+    finish_stage("update_status", len(df_updated))
+
+    info = get_beacon_blocks(xatu, state, networks)
+    finish_stage("query_beacon_blocks", len(info))
+
+    df = add_roots_and_timings(df_updated, info)
+    finish_stage("timestamps", len(df))
+
+    logger.debug("Saving data to files")
+    written = 0
+    # Filter data by network before saving
+    for network in networks:
+        logger.debug(f"Filtering and saving data for {network}")
+        # Filter the DataFrame to only include rows for this network
+        network_df = df[df['network'] == network]
+        
+        if len(network_df) > 0:
+            logger.debug(f"Found {len(network_df)} rows for network {network}")
+            network_data = serialize_slots(network_df)
+            # A backfill may be writing to the same network
+            with writer_lock(os.path.join(get_data_dir(), network)):
+                written += save_data_to_files(network_data, network, state.content_hashes.setdefault(network, {}))
+                save_snapshot(network)
+                columns = column_rows(network_df)
+                save_columns(columns, network)
+                save_stats(columns, network)
+                save_rollups(columns, network)
+                save_manifest(columns, network)
+        else:
+            logger.info(f"No data found for network {network}")
+    finish_stage("save", written)
+
+    logger.debug("Data saving complete")
+    timings["total"] = time.perf_counter() - started
+    STAGE_SECONDS.labels(label, "total").observe(timings["total"])
+    logger.debug(f"Ingest of {label} took {timings['total']:.2f}s, rows per stage: {rows}")
+    return timings
+
+def main():
+    """
+    Run the pipeline once for every network with a fresh client, continuing
+    from the persisted state of each network.
+    """
+    xatu = create_client()
+    for network in NETWORKS:
+        state = IngestState.load(get_state_path(network))
         try:
-            logger.info(f"Attempting to set permissions on file {file_path} to 0o644")
-            os.chmod(file_path, 0o644)  # This is equivalent to stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH
-            logger.info(f"Successfully set permissions on file {file_path}")
+            run(xatu, state, [network])
         except Exception as e:
-            logger.error(f"Error setting permissions on file {file_path}: {e}")
-        
-        logger.info(f"Saved slot {slot} for network {network} to {file_path}")
-        saved_slots.append(int(slot))
-    
-    logger.info(f"Saved {len(saved_slots)} slots: {saved_slots}")
-    logger.info("Data saving complete")
-
-logger.info("Saving data to files")
-# Filter data by network before saving
-for network in ["mainnet", "sepolia", "holesky"]:
-    logger.info(f"Filtering and saving data for {network}")
-    # Filter the DataFrame to only include rows for this network
-    network_df = df[df['network'] == network]
-    
-    if len(network_df) > 0:
-        logger.info(f"Found {len(network_df)} rows for network {network}")
-        network_data = df_to_data(network_df)
-        save_data_to_files(network_data, network)
-    else:
-        logger.info(f"No data found for network {network}")
+            logger.error(f"Error running ingest for {network}: {e}")
+            continue
+        state.save(get_state_path(network))
 
-logger.info("Data saving complete")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
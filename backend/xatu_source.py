@@ -0,0 +1,438 @@
+import abc
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    from backend.config import NETWORK_NAME, SLOT_0_TIMESTAMP_MS, SLOT_DURATION_MS
+except ImportError:  # Running as a script from inside the backend directory
+    from config import NETWORK_NAME, SLOT_0_TIMESTAMP_MS, SLOT_DURATION_MS
+
+logger = logging.getLogger(__name__)
+
+# Tables the ingest fetches, with the columns and datetime columns of their rows
+TABLES = {
+    "reorgs": ("slot, network, client, event_date_time", ["event_date_time"]),
+    "block_events": ("slot, timestamp, network, client, hash, updated_date_time", ["timestamp", "updated_date_time"]),
+    "beacon_blocks": ("slot, hash, parent_hash, network, updated_date_time", ["updated_date_time"]),
+}
+# Column each table is filtered on by `since` and `window`
+TIME_COLUMNS = {"reorgs": "event_date_time", "block_events": "updated_date_time", "beacon_blocks": "updated_date_time"}
+
+SYNTHETIC_CLIENTS = ["grandine", "lighthouse", "lodestar", "nimbus", "prysm", "teku"]
+
+
+def empty_frame(table):
+    return pd.DataFrame(columns=TABLES[table][0].split(", "))
+
+
+class SlotSource(abc.ABC):
+    """
+    The rows the ingest reads, one network and table at a time. XatuSource
+    is the live implementation; the others stand in for it so the pipeline
+    runs unchanged against recorded or synthetic data.
+
+    Every fetch takes the same bounds, all optional and combined:
+
+        window (pd.Timedelta): only rows updated within this long before now,
+                               on the source's clock
+        since (pd.Timestamp):  only rows updated after this time
+        first_slot, last_slot (int): only rows of slots in this range, inclusive
+
+    The ingest fetches with a window (and, once it has a watermark, since and
+    first_slot); the backfill fetches slot ranges. Each fetch returns a
+    DataFrame with the columns of the table in TABLES.
+    """
+
+    @abc.abstractmethod
+    def fetch_reorgs(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        """
+        Return the reorged slots, one row per (slot, network, client) that
+        reported a reorg, with the time of its latest report.
+        """
+
+    @abc.abstractmethod
+    def fetch_block_events(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        """
+        Return the first time each client saw each slot, with the root of the
+        block it saw first and the time the row was last updated.
+        """
+
+    @abc.abstractmethod
+    def fetch_beacon_blocks(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        """
+        Return the block and parent roots of each slot, with the time the row
+        was last updated.
+        """
+
+
+def slot_start(slot):
+    return pd.Timestamp(SLOT_0_TIMESTAMP_MS + slot * SLOT_DURATION_MS, unit='ms')
+
+
+class XatuSource(SlotSource):
+    """
+    Fetches from the xatu ClickHouse tables through a `pyxatu.PyXatu` client;
+    the only place the ingest's SQL lives.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def _condition(self, network, time_column, window, since, first_slot, last_slot):
+        # Network names end up in the query as literals
+        if not NETWORK_NAME.match(network):
+            raise ValueError(f"Invalid network name: {network!r}")
+        clauses = [f"meta_network_name = '{network}'"]
+        if first_slot is not None:
+            clauses.append(f"slot >= {int(first_slot)}")
+        if last_slot is not None:
+            clauses.append(f"slot <= {int(last_slot)}")
+        if first_slot is not None and last_slot is not None:
+            # The slot start times bound the partitions ClickHouse has to read
+            clauses.append(f"slot_start_date_time BETWEEN toDateTime('{slot_start(first_slot):%Y-%m-%d %H:%M:%S}')"
+                           f" AND toDateTime('{slot_start(last_slot):%Y-%m-%d %H:%M:%S}')")
+        lower = []
+        if since is not None:
+            lower.append(f"toDateTime('{pd.Timestamp(since):%Y-%m-%d %H:%M:%S}')")
+        if window is not None:
+            lower.append(f"NOW() - INTERVAL {int(pd.Timedelta(window).total_seconds())} SECOND")
+        if lower:
+            clauses.append(f"{time_column} > " + (f"greatest({', '.join(lower)})" if len(lower) > 1 else lower[0]))
+        return " AND ".join(clauses)
+
+    def fetch_reorgs(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        condition = self._condition(network, "event_date_time", window, since, first_slot, last_slot)
+        return self.client.execute_query(f"""
+        SELECT
+            slot-depth, meta_network_name, meta_consensus_implementation, max(event_date_time)
+        FROM default.beacon_api_eth_v1_events_chain_reorg
+        WHERE
+            {condition}
+        GROUP BY slot-depth, meta_network_name, meta_consensus_implementation
+        """
+        , columns=TABLES["reorgs"][0])
+
+    def fetch_block_events(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        condition = self._condition(network, "updated_date_time", window, since, first_slot, last_slot)
+        return self.client.execute_query(f"""
+            SELECT slot, min(event_date_time) as event_date_time, meta_network_name, meta_consensus_implementation,
+                argMin(block, event_date_time) as block_root, max(updated_date_time) as updated_date_time
+            FROM beacon_api_eth_v1_events_block
+            WHERE {condition}
+            GROUP BY slot, meta_network_name, meta_consensus_implementation
+            ORDER BY slot DESC
+        """, columns=TABLES["block_events"][0])
+
+    def fetch_beacon_blocks(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        condition = self._condition(network, "updated_date_time", window, since, first_slot, last_slot)
+        return self.client.execute_query(f"""
+            SELECT slot, block_root, parent_root, meta_network_name, max(updated_date_time)
+            FROM beacon_api_eth_v2_beacon_block
+            WHERE {condition}
+            GROUP BY slot, block_root, parent_root, meta_network_name
+            ORDER BY slot DESC
+        """, columns=TABLES["beacon_blocks"][0])
+
+
+class RecordingSource(SlotSource):
+    """
+    Wraps another source and appends every fetched frame to a JSON lines
+    file, so a session can be replayed later with ReplaySource.
+    """
+
+    def __init__(self, source, path):
+        self.source = source
+        self.path = path
+
+    def advance(self, slots=1):
+        """
+        Let `slots` slots pass: the wrapped source's clock if it has one,
+        otherwise real time.
+        """
+        if hasattr(self.source, "advance"):
+            self.source.advance(slots)
+        else:
+            time.sleep(slots * SLOT_DURATION_MS / 1000)
+
+    def _record(self, table, result):
+        frame = result if isinstance(result, pd.DataFrame) else empty_frame(table)
+        datetime_columns = [c for c in frame.columns if pd.api.types.is_datetime64_any_dtype(frame[c])]
+        out = frame.astype({c: str for c in datetime_columns})
+        with open(self.path, "a") as f:
+            f.write(json.dumps({
+                "table": table,
+                "columns": out.columns.tolist(),
+                "datetime_columns": datetime_columns,
+                "data": out.values.tolist(),
+            }, default=str) + "\n")
+        return result
+
+    def fetch_reorgs(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        return self._record("reorgs", self.source.fetch_reorgs(network, window, since, first_slot, last_slot))
+
+    def fetch_block_events(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        return self._record("block_events",
+                            self.source.fetch_block_events(network, window, since, first_slot, last_slot))
+
+    def fetch_beacon_blocks(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        return self._record("beacon_blocks",
+                            self.source.fetch_beacon_blocks(network, window, since, first_slot, last_slot))
+
+
+class ReplaySource(SlotSource):
+    """
+    Returns the frames recorded by RecordingSource, per table in recording
+    order, whatever the bounds of the fetch. Once the frames of a table run
+    out, its fetches return no rows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._frames = {table: [] for table in TABLES}
+        with open(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                recorded = json.loads(line)
+                self._frames[recorded["table"]].append(recorded)
+        for frames in self._frames.values():
+            frames.reverse()
+        logger.info(f"Loaded {sum(len(frames) for frames in self._frames.values())} recorded frames from {path}")
+
+    def remaining(self, table):
+        """
+        Return how many recorded frames of `table` have not been replayed yet.
+        """
+        return len(self._frames[table])
+
+    def _next(self, table):
+        frames = self._frames[table]
+        if not frames:
+            return empty_frame(table)
+        recorded = frames.pop()
+        df = pd.DataFrame(recorded["data"], columns=recorded["columns"])
+        for column in recorded["datetime_columns"]:
+            df[column] = pd.to_datetime(df[column])
+        return df
+
+    def fetch_reorgs(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        return self._next("reorgs")
+
+    def fetch_block_events(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        return self._next("block_events")
+
+    def fetch_beacon_blocks(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        return self._next("beacon_blocks")
+
+
+def _mix(*keys):
+    """
+    Hash integer keys (scalars or arrays) to uniform floats in [0, 1) with
+    splitmix64, so every synthetic value depends only on what it describes.
+    """
+    with np.errstate(over="ignore"):
+        x = np.uint64(0x9E3779B97F4A7C15)
+        for key in keys:
+            x = (x ^ np.asarray(key, dtype=np.int64).astype(np.uint64)) * np.uint64(0xBF58476D1CE4E5B9)
+            x = (x ^ (x >> np.uint64(31))) * np.uint64(0x94D049BB133111EB)
+            x = x ^ (x >> np.uint64(29))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+class SyntheticSource(SlotSource):
+    """
+    Generates the rows of any number of networks, clients and slots and
+    honours the bounds of each fetch, so runs fetch what they would fetch
+    live. Fetches with a window cover the newest `window_slots` slots; slot
+    range fetches, as the backfill runs them, any slots up to the head.
+
+    Every value is a pure function of (seed, network, client, slot): a slot
+    is missed with `miss_rate`, reorged with `reorg_rate`, and each client
+    sees each block 1-6 s into the slot unless it loses the event (`loss_rate`).
+    The clients that report a reorg saw a competing block for the slot, with
+    the same parent as the canonical one.
+    Rows only exist once their update time has passed on the source's clock,
+    which starts at `head_slot` and moves with `advance`; without a head slot
+    it follows the wall clock.
+    """
+
+    def __init__(self, networks=("mainnet",), clients=None, head_slot=None, window_slots=100,
+                 reorg_rate=0.01, miss_rate=0.01, loss_rate=0.02, seed=0):
+        self.networks = list(networks)
+        self.clients = list(clients) if clients is not None else list(SYNTHETIC_CLIENTS)
+        self.window_slots = window_slots
+        self.reorg_rate = reorg_rate
+        self.miss_rate = miss_rate
+        self.loss_rate = loss_rate
+        self.seed = seed
+        self.now_ms = None
+        if head_slot is not None:
+            self.now_ms = SLOT_0_TIMESTAMP_MS + (head_slot + 1) * SLOT_DURATION_MS
+        self.queries = 0
+
+    def now(self):
+        return self.now_ms if self.now_ms is not None else int(time.time() * 1000)
+
+    def head_slot(self):
+        return (self.now() - SLOT_0_TIMESTAMP_MS) // SLOT_DURATION_MS - 1
+
+    def advance(self, slots=1):
+        """
+        Move the clock forward by `slots` slots.
+        """
+        self.now_ms = self.now() + slots * SLOT_DURATION_MS
+
+    def _network_id(self, network):
+        return sum(ord(c) << (8 * (i % 7)) for i, c in enumerate(network))
+
+    def _missed(self, network_id, slots):
+        return _mix(self.seed, network_id, slots, 1) < self.miss_rate
+
+    def _root(self, network_id, slots, fork=0):
+        # The fork number goes into the top bits, so the canonical roots keep their layout
+        return ["0x%016x%048x" % (network_id & 0xFFFFFFFFFFFFFFFF, slot + (fork << 184)) for slot in slots.tolist()]
+
+    def _reorged(self, network_id, slots):
+        return slots[_mix(self.seed, network_id, slots, 2) < self.reorg_rate]
+
+    def _reports_reorg(self, network_id, slots, client_id):
+        return _mix(self.seed, network_id, slots, client_id, 3) < 0.5
+
+    def _parents(self, network_id, slots):
+        """
+        Return the slot of the block each slot's block builds on, skipping
+        missed slots.
+        """
+        if len(slots) == 0:
+            return slots
+        lookback = np.arange(slots[0] - 64, slots[-1] + 1, dtype=np.int64)
+        present = np.where(self._missed(network_id, lookback), -1, lookback)
+        latest = np.maximum.accumulate(present)
+        return latest[slots - lookback[0] - 1]
+
+    def _reorgs(self, network, network_id, slots):
+        reorged = self._reorged(network_id, slots)
+        frames = []
+        for client_id, client in enumerate(self.clients):
+            reported = reorged[self._reports_reorg(network_id, reorged, client_id)]
+            frames.append(pd.DataFrame({
+                "slot": reported,
+                "network": network,
+                "client": client,
+                "event_date_time": pd.to_datetime(SLOT_0_TIMESTAMP_MS + (reported + 1) * SLOT_DURATION_MS + 2000,
+                                                  unit="ms"),
+            }))
+        return pd.concat(frames, ignore_index=True)
+
+    def _block_events(self, network, network_id, slots):
+        slots = slots[~self._missed(network_id, slots)]
+        reorged = self._reorged(network_id, slots)
+        frames = []
+        for client_id, client in enumerate(self.clients):
+            seen = slots[_mix(self.seed, network_id, slots, client_id, 4) >= self.loss_rate]
+            on_fork = np.isin(seen, reorged) & self._reports_reorg(network_id, seen, client_id)
+            hashes = np.where(on_fork, self._root(network_id, seen, 1), self._root(network_id, seen))
+            # Most blocks arrive 1-4 s into the slot, with a tail up to 6 s
+            delay = 1000 + 3000 * _mix(self.seed, network_id, seen, client_id, 5) ** 2 \
+                + 2000 * (_mix(self.seed, network_id, seen, client_id, 6) < 0.05)
+            timestamp = pd.to_datetime(SLOT_0_TIMESTAMP_MS + seen * SLOT_DURATION_MS + np.rint(delay).astype(np.int64),
+                                       unit="ms")
+            frames.append(pd.DataFrame({
+                "slot": seen,
+                "timestamp": timestamp,
+                "network": network,
+                "client": client,
+                "hash": hashes.astype(object) if len(seen) else [],
+                "updated_date_time": timestamp + pd.Timedelta(seconds=1),
+            }))
+        return pd.concat(frames, ignore_index=True)
+
+    def _beacon_blocks(self, network, network_id, slots):
+        slots = slots[~self._missed(network_id, slots)]
+        parents = self._parents(network_id, slots)
+        forked = np.isin(slots, self._reorged(network_id, slots))
+        # Reorged slots also hold the competing block, built on the same parent
+        slots = np.concatenate([slots, slots[forked]])
+        return pd.DataFrame({
+            "slot": slots,
+            "hash": self._root(network_id, slots[:len(parents)]) + self._root(network_id, slots[len(parents):], 1),
+            "parent_hash": self._root(network_id, np.concatenate([parents, parents[forked]])),
+            "network": network,
+            "updated_date_time": pd.to_datetime(SLOT_0_TIMESTAMP_MS + slots * SLOT_DURATION_MS + 8000, unit="ms"),
+        })
+
+    def frame(self, table):
+        """
+        Return every row of `table` the source holds right now, over all
+        networks and the whole window, without counting as a fetch.
+        """
+        now = pd.Timestamp(self.now(), unit="ms")
+        head = self.head_slot()
+        slots = np.arange(max(head - self.window_slots + 1, 0), head + 1, dtype=np.int64)
+        frames = []
+        for network in self.networks:
+            df = getattr(self, f"_{table}")(network, self._network_id(network), slots)
+            frames.append(df[df[TIME_COLUMNS[table]] <= now])
+        return pd.concat(frames, ignore_index=True)
+
+    def _fetch(self, table, network, window, since, first_slot, last_slot):
+        self.queries += 1
+        if network not in self.networks:
+            return empty_frame(table)
+        now = pd.Timestamp(self.now(), unit="ms")
+        head = self.head_slot()
+        lowest = max(first_slot if first_slot is not None else 0, 0)
+        highest = head if last_slot is None else min(last_slot, head)
+        updated_after = since
+        if window is not None:
+            window = pd.Timedelta(window)
+            updated_after = now - window if since is None else max(since, now - window)
+            # Slots updated before the window cannot match
+            lowest = max(lowest, head - self.window_slots + 1,
+                         (self.now() - window.value // 10 ** 6 - SLOT_0_TIMESTAMP_MS) // SLOT_DURATION_MS - 1)
+        slots = np.arange(lowest, highest + 1, dtype=np.int64)
+        df = getattr(self, f"_{table}")(network, self._network_id(network), slots)
+        time_column = TIME_COLUMNS[table]
+        mask = df[time_column] <= now
+        if updated_after is not None:
+            mask &= df[time_column] > updated_after
+        return df[mask].reset_index(drop=True)
+
+    def fetch_reorgs(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        return self._fetch("reorgs", network, window, since, first_slot, last_slot)
+
+    def fetch_block_events(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        return self._fetch("block_events", network, window, since, first_slot, last_slot)
+
+    def fetch_beacon_blocks(self, network, window=None, since=None, first_slot=None, last_slot=None):
+        return self._fetch("beacon_blocks", network, window, since, first_slot, last_slot)
+
+
+def create_source(spec):
+    """
+    Create a stand-in source from a spec: 'synthetic' for SyntheticSource
+    configured through XATU_SYNTHETIC_* environment variables, or the path of
+    a recording made with RecordingSource.
+    """
+    if spec == "synthetic":
+        networks = os.environ.get("XATU_SYNTHETIC_NETWORKS")
+        clients = int(os.environ.get("XATU_SYNTHETIC_CLIENTS", len(SYNTHETIC_CLIENTS)))
+        return SyntheticSource(
+            networks=networks.split(",") if networks else ("mainnet", "sepolia", "holesky"),
+            clients=synthetic_clients(clients),
+            reorg_rate=float(os.environ.get("XATU_SYNTHETIC_REORG_RATE", 0.01)),
+            seed=int(os.environ.get("XATU_SYNTHETIC_SEED", 0)),
+        )
+    return ReplaySource(spec)
+
+
+def synthetic_clients(count):
+    """
+    Return `count` client names: the real ones first, then numbered extras.
+    """
+    return (SYNTHETIC_CLIENTS + [f"client{i}" for i in range(len(SYNTHETIC_CLIENTS), count)])[:count]
@@ -1,4 +1,4 @@
-import React from 'react';
+import React, { useState, useEffect } from 'react';
 import {
   Dialog,
   DialogTitle,
@@ -12,24 +12,28 @@ import {
   useTheme,
 } from '@mui/material';
 import CloseIcon from '@mui/icons-material/Close';
+import axios from 'axios';
 
 interface SlotData {
   slot: number;
   data: {
     [client: string]: {
-      slot: number;
-      network: string;
-      client: string;
-      timestamp: string;
+      // The list view only fetches status and seconds_in_slot; the rest is loaded by SlotDetails
+      slot?: number;
+      network?: string;
+      client?: string;
+      timestamp?: string;
       status: string;
       hash?: string;
       parent_hash?: string;
-      timestamp_seconds: number;
+      timestamp_seconds?: number;
       seconds_in_slot: number;
     };
   };
 }
 
+type ClientSlotData = SlotData['data'][string];
+
 interface SlotDetailsProps {
   slot: SlotData;
   client: string;
@@ -37,6 +41,19 @@ interface SlotDetailsProps {
   onClose: () => void;
 }
 
+// Get the API base URL based on environment
+const getApiBaseUrl = () => {
+  // In development, use the full URL
+  if (process.env.NODE_ENV === 'development') {
+    return 'http://localhost:5000/api';
+  }
+  // In production, use relative URLs
+  return '/api';
+};
+
+// Fields the list view leaves out, fetched when the details are opened
+const DETAIL_FIELDS = 'slot,timestamp,hash,parent_hash';
+
 const getNetworkColor = (network: string): string => {
   switch (network) {
     case 'mainnet':
@@ -65,7 +82,28 @@ const getStatusColor = (status: string): string => {
 
 const SlotDetails: React.FC<SlotDetailsProps> = ({ slot, client, network, onClose }) => {
   const theme = useTheme();
-  const slotData = slot.data[client];
+  const [details, setDetails] = useState<Partial<ClientSlotData>>({});
+
+  useEffect(() => {
+    let cancelled = false;
+    const apiUrl = `${getApiBaseUrl()}/slots/${network}/range?from=${slot.slot}&to=${slot.slot}` +
+      `&clients=${client}&fields=${DETAIL_FIELDS}`;
+    console.log(`[DETAILS] Fetching details of slot ${slot.slot} for ${client}`);
+    // The range endpoint answers with newline-delimited JSON, one line per slot
+    axios.get(apiUrl, { responseType: 'text', transformResponse: (data) => data })
+      .then((response) => {
+        const line = String(response.data).split('\n').find((l) => l.trim());
+        if (!cancelled && line) {
+          setDetails(JSON.parse(line).data[client] ?? {});
+        }
+      })
+      .catch((err) => console.error(`[DETAILS] Error fetching slot ${slot.slot}:`, err));
+    return () => {
+      cancelled = true;
+    };
+  }, [network, slot.slot, client]);
+
+  const slotData = slot.data[client] && { ...slot.data[client], ...details };
 
   if (!slotData) {
     return null;
@@ -144,7 +182,7 @@ const SlotDetails: React.FC<SlotDetailsProps> = ({ slot, client, network, onClos
               Slot Number
             </Typography>
             <Typography variant="body1" fontWeight="medium">
-              {slotData.slot}
+              {slotData.slot ?? slot.slot}
             </Typography>
           </Box>
 
@@ -153,7 +191,7 @@ const SlotDetails: React.FC<SlotDetailsProps> = ({ slot, client, network, onClos
               Timestamp
             </Typography>
             <Typography variant="body1" fontWeight="medium">
-              {slotData.timestamp}
+              {slotData.timestamp ?? '…'}
             </Typography>
           </Box>
 
@@ -6,14 +6,15 @@ interface SlotData {
   slot: number;
   data: {
     [client: string]: {
-      slot: number;
-      network: string;
-      client: string;
-      timestamp: string;
+      // The list view only fetches status and seconds_in_slot; the rest is loaded by SlotDetails
+      slot?: number;
+      network?: string;
+      client?: string;
+      timestamp?: string;
       status: string;
       hash?: string;
       parent_hash?: string;
-      timestamp_seconds: number;
+      timestamp_seconds?: number;
       seconds_in_slot: number;
     };
   };
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { Box, Paper, Typography, Slider, CircularProgress, Alert, useTheme, Switch, FormControlLabel } from '@mui/material';
 import axios from 'axios';
 import { useNetwork } from '../contexts/NetworkContext';
@@ -12,14 +12,15 @@ interface SlotData {
   slot: number;
   data: {
     [client: string]: {
-      slot: number;
-      network: string;
-      client: string;
-      timestamp: string;
+      // The list view only fetches status and seconds_in_slot; the rest is loaded by SlotDetails
+      slot?: number;
+      network?: string;
+      client?: string;
+      timestamp?: string;
       status: string;
       hash?: string;
       parent_hash?: string;
-      timestamp_seconds: number;
+      timestamp_seconds?: number;
       seconds_in_slot: number;
     };
   };
@@ -35,6 +36,20 @@ const getApiBaseUrl = () => {
   return '/api';
 };
 
+// Number of slots requested from the API and kept after merging pushed updates
+const MAX_SLOTS = 20;
+// Client fields the rows need; SlotDetails fetches the others when a slot is opened
+const LIST_FIELDS = 'status,seconds_in_slot';
+
+// Merge updated slots into the current list, newest slot first
+const mergeSlots = (current: SlotData[], updates: SlotData[]): SlotData[] => {
+  const bySlot = new Map(current.map((slot) => [slot.slot, slot]));
+  updates.forEach((slot) => bySlot.set(slot.slot, slot));
+  return Array.from(bySlot.values())
+    .sort((a, b) => b.slot - a.slot)
+    .slice(0, MAX_SLOTS);
+};
+
 const SlotVisualization: React.FC = () => {
   const theme = useTheme();
   const { currentNetwork } = useNetwork();
@@ -48,6 +63,11 @@ const SlotVisualization: React.FC = () => {
   const [refreshing, setRefreshing] = useState<boolean>(false);
   const [showDebug, setShowDebug] = useState<boolean>(true);
   const [minSlotCount, setMinSlotCount] = useState<number>(1);
+  // True while the push stream is connected; polling only runs when it is not
+  const streamingRef = useRef<boolean>(false);
+
+  // Version cursor of the last poll; null until the first full load of a network
+  const versionRef = useRef<number | null>(null);
 
   // Fetch slots data - simplified to avoid dependency loops
   const fetchSlots = useCallback(async () => {
@@ -55,31 +75,27 @@ const SlotVisualization: React.FC = () => {
       console.log(`[FETCH] Fetching slots for network: ${currentNetwork}`);
       setRefreshing(true);
       
-      // Request 20 slots to ensure we have enough data
-      const apiUrl = `${getApiBaseUrl()}/slots/${currentNetwork}?count=20`;
+      // Only ask for slots that changed since the last poll once we have a cursor
+      const cursor = versionRef.current;
+      const apiUrl = `${getApiBaseUrl()}/slots/${currentNetwork}?count=${MAX_SLOTS}&version=${cursor ?? 0}&fields=${LIST_FIELDS}`;
       console.log(`[FETCH] Making API request to ${apiUrl}`);
       const response = await axios.get(apiUrl);
-      console.log(`[FETCH] Received ${response.data.length} slots from API`);
+      const received: SlotData[] = response.data.slots;
+      versionRef.current = response.data.version;
+      console.log(`[FETCH] Received ${received.length} slots from API, version ${response.data.version}`);
       
-      if (response.data.length === 0) {
+      if (cursor !== null) {
+        // Incremental poll: merge the changed slots into what we already have
+        setSlots((prev) => mergeSlots(prev, received));
+      } else if (received.length === 0) {
         console.warn('[FETCH] No slots received from API');
         setSlots([]);
         setVisibleSlotCount(0);
       } else {
         // Sort slots by slot number (descending) to ensure highest slots first
-        const sortedSlots = [...response.data].sort((a, b) => b.slot - a.slot);
+        const sortedSlots = [...received].sort((a, b) => b.slot - a.slot);
         console.log(`[FETCH] Sorted slots, highest: ${sortedSlots[0]?.slot}, lowest: ${sortedSlots[sortedSlots.length-1]?.slot}`);
         
-        // Log all slot numbers for debugging
-        console.log(`[FETCH] All slot numbers: ${sortedSlots.map(s => s.slot).join(', ')}`);
-        
-        // Check if any slots have data for the current clients
-        const hasClientData = sortedSlots.some(slot => {
-          return Object.keys(slot.data || {}).length > 0;
-        });
-        
-        console.log(`[FETCH] Has client data: ${hasClientData}`);
-        
         setSlots(sortedSlots);
         
         // Always show 5 slots or all available if less than 5
@@ -94,6 +110,7 @@ const SlotVisualization: React.FC = () => {
       setError('Failed to fetch slot data');
       setSlots([]);
       setVisibleSlotCount(0);
+      versionRef.current = null;
     } finally {
       setLoading(false);
       setRefreshing(false);
@@ -104,16 +121,61 @@ const SlotVisualization: React.FC = () => {
   // Initial data fetch
   useEffect(() => {
     console.log(`[NETWORK] Network changed to: ${currentNetwork}, fetching new data`);
+    versionRef.current = null;
     fetchSlots();
   }, [currentNetwork, fetchSlots]);
 
+  // Subscribe to pushed slot updates for the current network
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') {
+      console.warn('[STREAM] EventSource not supported, using polling only');
+      return;
+    }
+
+    const source = new EventSource(`${getApiBaseUrl()}/stream/${currentNetwork}?count=${MAX_SLOTS}&fields=${LIST_FIELDS}`);
+
+    source.addEventListener('snapshot', (event) => {
+      const data: SlotData[] = JSON.parse((event as MessageEvent).data);
+      console.log(`[STREAM] Received snapshot with ${data.length} slots for ${currentNetwork}`);
+      const sortedSlots = [...data].sort((a, b) => b.slot - a.slot);
+      streamingRef.current = true;
+      // The snapshot replaces everything, so the next poll has to start over
+      versionRef.current = null;
+      setSlots(sortedSlots);
+      setVisibleSlotCount(Math.min(5, sortedSlots.length));
+      setError(null);
+      setLoading(false);
+      setCountdown(12);
+    });
+
+    source.addEventListener('slot', (event) => {
+      const update: SlotData = JSON.parse((event as MessageEvent).data);
+      console.log(`[STREAM] Received slot ${update.slot} for ${currentNetwork}`);
+      setSlots((prev) => mergeSlots(prev, [update]));
+      setCountdown(12);
+    });
+
+    // EventSource reconnects on its own; poll until the next snapshot arrives
+    source.onerror = () => {
+      console.warn('[STREAM] Stream interrupted, falling back to polling');
+      streamingRef.current = false;
+    };
+
+    return () => {
+      source.close();
+      streamingRef.current = false;
+    };
+  }, [currentNetwork]);
+
   // Countdown timer effect
   useEffect(() => {
     const timer = setInterval(() => {
       setCountdown((prev) => {
         if (prev <= 1) {
-          console.log('[TIMER] Countdown reached 0, fetching new data');
-          fetchSlots(); // Fetch new data when countdown reaches 0
+          if (!streamingRef.current) {
+            console.log('[TIMER] Countdown reached 0, fetching new data');
+            fetchSlots(); // Fetch new data when countdown reaches 0
+          }
           return 12; // Reset countdown
         }
         return prev - 1;
@@ -160,7 +222,7 @@ const SlotVisualization: React.FC = () => {
   }
 
   // Calculate the maximum value for the slider based on available slots
-  const maxSliderValue = Math.min(20, slots.length);
+  const maxSliderValue = Math.min(MAX_SLOTS, slots.length);
 
   return (
     <Box>